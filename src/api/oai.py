@@ -0,0 +1,299 @@
+__copyright__ = "Copyright 2017 Birkbeck, University of London"
+__author__ = "Martin Paul Eve & Andy Byers"
+__license__ = "AGPL v3"
+__maintainer__ = "Birkbeck Centre for Technology and Publishing"
+
+import itertools
+import re
+from datetime import datetime, timedelta
+from xml.sax.saxutils import escape, quoteattr
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import Min
+from django.utils import timezone
+
+from journal import models as journal_models
+from submission import models as submission_models
+
+OAI_DATE_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+OAI_DC = 'oai_dc'
+TOKEN_SALT = 'janeway.oai.resumption'
+IDENTIFIER_PATTERN = re.compile(r'^oai:[^:]+:article/(?P<pk>\d+)$')
+
+VERB_ARGUMENTS = {
+    'Identify': ((), ()),
+    'ListMetadataFormats': ((), ('identifier',)),
+    'ListSets': ((), ('resumptionToken',)),
+    'ListIdentifiers': (('metadataPrefix',), ('from', 'until', 'set', 'resumptionToken')),
+    'ListRecords': (('metadataPrefix',), ('from', 'until', 'set', 'resumptionToken')),
+    'GetRecord': (('identifier', 'metadataPrefix'), ()),
+}
+
+
+class OAIError(Exception):
+    def __init__(self, code, message):
+        super(OAIError, self).__init__(message)
+        self.code = code
+        self.message = message
+
+
+def page_size():
+    return getattr(settings, 'OAI_PAGE_SIZE', 100)
+
+
+def format_date(date):
+    return timezone.localtime(date, timezone.utc).strftime(OAI_DATE_FORMAT)
+
+
+def parse_date(value, end_of_day=False):
+    """ Parses an OAI-PMH from/until argument in day or second granularity.
+
+    :param value: the argument
+    :param end_of_day: whether a day granularity date should include the whole of that day
+    :return: an aware datetime in UTC
+    """
+    try:
+        if len(value) == 10:
+            date = datetime.strptime(value, '%Y-%m-%d')
+            if end_of_day:
+                date += timedelta(days=1, microseconds=-1)
+        else:
+            date = datetime.strptime(value, OAI_DATE_FORMAT)
+    except ValueError:
+        raise OAIError('badArgument', 'Dates must be in YYYY-MM-DD or YYYY-MM-DDThh:mm:ssZ format.')
+
+    return timezone.make_aware(date, timezone.utc)
+
+
+def record_identifier(request, article_pk):
+    return 'oai:{0}:article/{1}'.format(request.site.domain, article_pk)
+
+
+def published_articles(request):
+    articles = submission_models.Article.objects.filter(
+        stage=submission_models.STAGE_PUBLISHED,
+        date_published__isnull=False,
+    )
+
+    if request.journal:
+        articles = articles.filter(journal=request.journal)
+
+    return articles
+
+
+def respond(request, arguments, record_template):
+    """ Handles an OAI-PMH request.
+
+    Arguments are validated and the first page of results is fetched before anything is returned, so errors are
+    reported properly. Records are then rendered one at a time as the response is consumed.
+
+    :param request: the request object
+    :param arguments: a QueryDict of OAI-PMH arguments
+    :param record_template: a compiled template for a single record
+    :return: an iterator of XML strings
+    """
+    verb = arguments.get('verb')
+    request_attributes = {}
+
+    try:
+        if verb not in VERB_ARGUMENTS:
+            raise OAIError('badVerb', 'Illegal OAI verb.')
+
+        check_arguments(verb, arguments)
+        body = VERBS[verb](request, arguments, record_template)
+        request_attributes = {key: arguments.get(key) for key in arguments}
+    except OAIError as error:
+        body = ['<error code={0}>{1}</error>'.format(quoteattr(error.code), escape(error.message))]
+
+    return itertools.chain([envelope_start(request, request_attributes)], body, ['</OAI-PMH>'])
+
+
+def check_arguments(verb, arguments):
+    required, optional = VERB_ARGUMENTS[verb]
+    supplied = set(arguments.keys()) - {'verb'}
+
+    if any(len(arguments.getlist(key)) > 1 for key in supplied):
+        raise OAIError('badArgument', 'Arguments may not be repeated.')
+
+    if 'resumptionToken' in supplied and 'resumptionToken' in optional:
+        if supplied != {'resumptionToken'}:
+            raise OAIError('badArgument', 'resumptionToken is an exclusive argument.')
+        return
+
+    if supplied - set(required) - set(optional):
+        raise OAIError('badArgument', 'Illegal arguments for {0}.'.format(verb))
+
+    if set(required) - supplied:
+        raise OAIError('badArgument', 'Missing required arguments for {0}.'.format(verb))
+
+
+def envelope_start(request, request_attributes):
+    attributes = ''.join(' {0}={1}'.format(key, quoteattr(value)) for key, value in request_attributes.items())
+
+    return ('<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<OAI-PMH xmlns="http://www.openarchives.org/OAI/2.0/" '
+            'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+            'xsi:schemaLocation="http://www.openarchives.org/OAI/2.0/ '
+            'http://www.openarchives.org/OAI/2.0/OAI-PMH.xsd">\n'
+            '<responseDate>{0}</responseDate>\n'
+            '<request{1}>{2}</request>\n').format(
+        format_date(timezone.now()), attributes, escape(request.build_absolute_uri(request.path)))
+
+
+def identify(request, arguments, record_template):
+    earliest = published_articles(request).aggregate(earliest=Min('date_published'))['earliest']
+    name = request.journal.name if request.journal else request.press.name
+
+    return ['<Identify>',
+            '<repositoryName>{0}</repositoryName>'.format(escape(name or '')),
+            '<baseURL>{0}</baseURL>'.format(escape(request.build_absolute_uri(request.path))),
+            '<protocolVersion>2.0</protocolVersion>',
+            '<adminEmail>{0}</adminEmail>'.format(escape(request.press.main_contact or '')),
+            '<earliestDatestamp>{0}</earliestDatestamp>'.format(format_date(earliest or timezone.now())),
+            '<deletedRecord>no</deletedRecord>',
+            '<granularity>YYYY-MM-DDThh:mm:ssZ</granularity>',
+            '</Identify>']
+
+
+def list_metadata_formats(request, arguments, record_template):
+    if arguments.get('identifier'):
+        get_article(request, arguments.get('identifier'))
+
+    return ['<ListMetadataFormats><metadataFormat>',
+            '<metadataPrefix>oai_dc</metadataPrefix>',
+            '<schema>http://www.openarchives.org/OAI/2.0/oai_dc.xsd</schema>',
+            '<metadataNamespace>http://www.openarchives.org/OAI/2.0/oai_dc/</metadataNamespace>',
+            '</metadataFormat></ListMetadataFormats>']
+
+
+def list_sets(request, arguments, record_template):
+    if arguments.get('resumptionToken'):
+        raise OAIError('badResumptionToken', 'The set list is not paginated.')
+
+    journals = [request.journal] if request.journal else journal_models.Journal.objects.all()
+
+    return itertools.chain(
+        ['<ListSets>'],
+        ('<set><setSpec>{0}</setSpec><setName>{1}</setName></set>'.format(escape(journal.code),
+                                                                          escape(journal.name or journal.code))
+         for journal in journals),
+        ['</ListSets>'],
+    )
+
+
+def get_article(request, identifier):
+    match = IDENTIFIER_PATTERN.match(identifier or '')
+
+    if not match:
+        raise OAIError('idDoesNotExist', 'The identifier is not valid for this repository.')
+
+    try:
+        return with_record_data(published_articles(request)).get(pk=match.group('pk'))
+    except submission_models.Article.DoesNotExist:
+        raise OAIError('idDoesNotExist', 'No matching record was found.')
+
+
+def get_record(request, arguments, record_template):
+    if arguments.get('metadataPrefix') != OAI_DC:
+        raise OAIError('cannotDisseminateFormat', 'Only oai_dc is supported.')
+
+    article = get_article(request, arguments.get('identifier'))
+
+    return ['<GetRecord>', render_record(request, record_template, article, header_only=False), '</GetRecord>']
+
+
+def list_records(request, arguments, record_template):
+    return list_articles(request, arguments, record_template, 'ListRecords', header_only=False)
+
+
+def list_identifiers(request, arguments, record_template):
+    return list_articles(request, arguments, record_template, 'ListIdentifiers', header_only=True)
+
+
+def list_articles(request, arguments, record_template, verb, header_only):
+    """ Lists one page of articles using keyset pagination on pk.
+
+    The resumption token is signed and carries the original arguments, the last pk served and the cursor, so each
+    page is a single indexed range query no matter how deep into the list a harvester is.
+    """
+    if arguments.get('resumptionToken'):
+        try:
+            state = signing.loads(arguments.get('resumptionToken'), salt=TOKEN_SALT)
+        except signing.BadSignature:
+            raise OAIError('badResumptionToken', 'The resumption token is invalid.')
+    else:
+        state = {key: arguments.get(key) for key in ('metadataPrefix', 'from', 'until', 'set')}
+        state.update({'after': 0, 'cursor': 0})
+
+    if state.get('metadataPrefix') != OAI_DC:
+        raise OAIError('cannotDisseminateFormat', 'Only oai_dc is supported.')
+
+    articles = published_articles(request)
+
+    if state.get('from'):
+        articles = articles.filter(date_published__gte=parse_date(state['from']))
+
+    if state.get('until'):
+        articles = articles.filter(date_published__lte=parse_date(state['until'], end_of_day=True))
+
+    # both dates are valid by now, so their lengths tell their granularities apart
+    if state.get('from') and state.get('until') and len(state['from']) != len(state['until']):
+        raise OAIError('badArgument', 'The from and until arguments must have the same granularity.')
+
+    if state.get('set'):
+        articles = articles.filter(journal__code=state['set'])
+
+    size = page_size()
+    page = list(with_record_data(articles.filter(pk__gt=state['after']).order_by('pk'))[:size + 1])
+
+    if not page:
+        raise OAIError('noRecordsMatch', 'No records match the request.')
+
+    token = ''
+
+    if len(page) > size:
+        page = page[:size]
+        next_state = dict(state, after=page[-1].pk, cursor=state['cursor'] + size)
+        token = signing.dumps(next_state, salt=TOKEN_SALT)
+
+    def render_page():
+        yield '<{0}>'.format(verb)
+
+        for article in page:
+            yield render_record(request, record_template, article, header_only)
+
+        if token or state['cursor']:
+            yield '<resumptionToken cursor="{0}">{1}</resumptionToken>'.format(state['cursor'], token)
+
+        yield '</{0}>'.format(verb)
+
+    return render_page()
+
+
+def with_record_data(articles):
+    return articles.select_related('journal').prefetch_related('frozenauthor_set', 'keywords', 'identifier_set')
+
+
+def render_record(request, record_template, article, header_only):
+    dois = [identifier.identifier for identifier in article.identifier_set.all() if identifier.id_type == 'doi']
+
+    context = {
+        'identifier': record_identifier(request, article.pk),
+        'datestamp': format_date(article.date_published),
+        'article': article,
+        'doi': dois[0] if dois else None,
+        'header_only': header_only,
+    }
+
+    return record_template.render(context)
+
+
+VERBS = {
+    'Identify': identify,
+    'ListMetadataFormats': list_metadata_formats,
+    'ListSets': list_sets,
+    'ListIdentifiers': list_identifiers,
+    'ListRecords': list_records,
+    'GetRecord': get_record,
+}
@@ -1,15 +1,15 @@
 import json
 
-from django.http import HttpResponse
-from django.shortcuts import render
+from django.http import HttpResponse, StreamingHttpResponse
+from django.template import loader
+from django.views.decorators.csrf import csrf_exempt
 
 from rest_framework import viewsets
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework import permissions
 
-from api import serializers, permissions as api_permissions
+from api import oai as oai_pmh, serializers, permissions as api_permissions
 from core import models as core_models
-from submission import models as submission_models
 
 
 @api_view(['GET'])
@@ -35,12 +35,14 @@ class AccountRoleViewSet(viewsets.ModelViewSet):
     serializer_class = serializers.AccountRoleSerializer
 
 
+@csrf_exempt
 def oai(request):
-    articles = submission_models.Article.objects.filter(stage=submission_models.STAGE_PUBLISHED)
-
-    template = 'apis/OAI.xml'
-    context = {
-        'articles': articles,
-    }
+    """
+    An OAI-PMH 2.0 repository of published articles. On a journal site it lists that journal, on the press site every
+    journal, with one set per journal code. Lists are paged with resumption tokens and streamed.
+    """
+    arguments = request.POST if request.method == 'POST' else request.GET
+    record_template = loader.get_template('apis/OAI_record.xml')
 
-    return render(request, template, context, content_type="application/xml")
+    return StreamingHttpResponse(oai_pmh.respond(request, arguments, record_template),
+                                 content_type="application/xml")
@@ -9,6 +9,8 @@ from django.utils import timezone
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 
+from core import page_cache
+
 
 class Page(models.Model):
     content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, related_name='page_content', null=True)
@@ -26,6 +28,20 @@ class Page(models.Model):
     def __str__(self):
         return u'{0} - {1}'.format(self.content_type, self.display_name)
 
+    def save(self, *args, **kwargs):
+        super(Page, self).save(*args, **kwargs)
+
+        from journal import logic as journal_logic
+        journal_logic.invalidate_page_sitemap(self)
+        page_cache.bump_for_object(self.content_type, self.object_id)
+
+    def delete(self, *args, **kwargs):
+        from journal import logic as journal_logic
+        journal_logic.invalidate_page_sitemap(self)
+        page_cache.bump_for_object(self.content_type, self.object_id)
+
+        return super(Page, self).delete(*args, **kwargs)
+
 
 class NavigationItem(models.Model):
     content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, related_name='nav_content', null=True)
@@ -45,3 +61,11 @@ class NavigationItem(models.Model):
 
     def sub_nav_items(self):
         return NavigationItem.objects.filter(top_level_nav=self)
+
+    def save(self, *args, **kwargs):
+        super(NavigationItem, self).save(*args, **kwargs)
+        page_cache.bump_for_object(self.content_type, self.object_id)
+
+    def delete(self, *args, **kwargs):
+        page_cache.bump_for_object(self.content_type, self.object_id)
+        return super(NavigationItem, self).delete(*args, **kwargs)
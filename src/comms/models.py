@@ -5,7 +5,7 @@ from django.urls import reverse
 from django.utils import timezone
 from django.http import Http404
 
-from core import files
+from core import files, page_cache
 
 __copyright__ = "Copyright 2017 Birkbeck, University of London"
 __author__ = "Martin Paul Eve & Andy Byers"
@@ -49,6 +49,14 @@ class NewsItem(models.Model):
         )
         return base + path
 
+    def save(self, *args, **kwargs):
+        super(NewsItem, self).save(*args, **kwargs)
+        page_cache.bump_for_object(self.content_type, self.object_id)
+
+    def delete(self, *args, **kwargs):
+        page_cache.bump_for_object(self.content_type, self.object_id)
+        return super(NewsItem, self).delete(*args, **kwargs)
+
     @property
     def carousel_subtitle(self):
         return ""
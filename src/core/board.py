@@ -0,0 +1,105 @@
+__copyright__ = "Copyright 2017 Birkbeck, University of London"
+__author__ = "Martin Paul Eve & Andy Byers"
+__license__ = "AGPL v3"
+__maintainer__ = "Birkbeck Centre for Technology and Publishing"
+
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.db.models import Exists, OuterRef, Prefetch
+
+from copyediting import models as copyedit_models
+from production import models as production_models
+from proofing import models as proofing_models
+from review import models as review_models
+from submission import models as submission_models
+
+
+def has_production_assignment():
+    return Exists(production_models.ProductionAssignment.objects.filter(article=OuterRef('pk')))
+
+
+def has_proofing_assignment():
+    return Exists(proofing_models.ProofingAssignment.objects.filter(article=OuterRef('pk')))
+
+
+# Each column is keyed on its context name and gives the card type, the stages it covers and, where a stage is split
+# in two, an annotation and the value it must have.
+COLUMNS = OrderedDict([
+    ('unassigned_articles', ('unassigned', [submission_models.STAGE_UNASSIGNED], None, None)),
+    ('in_review', ('assigned', [submission_models.STAGE_ASSIGNED, submission_models.STAGE_UNDER_REVIEW,
+                                submission_models.STAGE_UNDER_REVISION], None, None)),
+    ('copyediting', ('copyedit', [submission_models.STAGE_ACCEPTED] + submission_models.COPYEDITING_STAGES,
+                     None, None)),
+    ('production', ('production_unassigned', [submission_models.STAGE_TYPESETTING], has_production_assignment, False)),
+    ('production_assigned', ('production_assigned', [submission_models.STAGE_TYPESETTING], has_production_assignment,
+                             True)),
+    ('proofing', ('proof_unassigned', [submission_models.STAGE_PROOFING], has_proofing_assignment, False)),
+    ('proofing_assigned', ('proof_assigned', [submission_models.STAGE_PROOFING], has_proofing_assignment, True)),
+    ('prepubs', ('prepublication', [submission_models.STAGE_READY_FOR_PUBLICATION], None, None)),
+])
+
+
+def page_size():
+    return getattr(settings, 'KANBAN_PAGE_SIZE', 25)
+
+
+def card_type(column):
+    return COLUMNS[column][0]
+
+
+def column_articles(journal, column):
+    """ Builds the queryset of a board column, with everything its cards show loaded alongside it.
+
+    Columns that split a stage by whether an assignment exists do so with an EXISTS subquery, and the authors, editors
+    and assignees shown on each card are joined or prefetched rather than fetched card by card.
+
+    :param journal: a Journal object
+    :param column: a key of COLUMNS
+    :return: a queryset of Articles
+    """
+    _, stages, condition, value = COLUMNS[column]
+
+    articles = submission_models.Article.objects.filter(journal=journal, stage__in=stages)
+
+    if condition:
+        articles = articles.annotate(has_assignment=condition()).filter(has_assignment=value)
+
+    return articles.select_related(
+        'correspondence_author',
+        'productionassignment__production_manager',
+    ).prefetch_related(
+        Prefetch('editorassignment_set', queryset=review_models.EditorAssignment.objects.select_related('editor')),
+        Prefetch('copyeditassignment_set',
+                 queryset=copyedit_models.CopyeditAssignment.objects.select_related('copyeditor')),
+        Prefetch('productionassignment__typesettask_set',
+                 queryset=production_models.TypesetTask.objects.select_related('typesetter')),
+    ).order_by('-date_submitted', '-pk')
+
+
+def column_page(journal, column, page=1):
+    """ Returns one page of a board column.
+
+    :param journal: a Journal object
+    :param column: a key of COLUMNS
+    :param page: a page number, out of range numbers giving the last page
+    :return: a Page of Articles
+    """
+    paginator = Paginator(column_articles(journal, column), page_size())
+
+    try:
+        return paginator.page(page)
+    except PageNotAnInteger:
+        return paginator.page(1)
+    except EmptyPage:
+        return paginator.page(paginator.num_pages)
+
+
+def board(journal):
+    """ Returns the first page of every board column.
+
+    :param journal: a Journal object
+    :return: a dictionary of column keys to Pages
+    """
+    return {column: column_page(journal, column) for column in COLUMNS}
@@ -0,0 +1,136 @@
+__copyright__ = "Copyright 2017 Birkbeck, University of London"
+__author__ = "Martin Paul Eve & Andy Byers"
+__license__ = "AGPL v3"
+__maintainer__ = "Birkbeck Centre for Technology and Publishing"
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, Count, Q, When
+
+from copyediting import models as copyedit_models
+from production import models as production_models
+from proofing import models as proofing_models
+from review import models as review_models
+from submission import models as submission_models
+
+JOURNAL_COUNTS_KEY = 'dashboard_journal_counts_{0}'
+
+ASSIGNED_STAGES = [
+    submission_models.STAGE_ASSIGNED,
+    submission_models.STAGE_UNDER_REVIEW,
+    submission_models.STAGE_UNDER_REVISION,
+]
+EDITING_STAGES = [
+    submission_models.STAGE_EDITOR_COPYEDITING,
+    submission_models.STAGE_AUTHOR_COPYEDITING,
+    submission_models.STAGE_FINAL_COPYEDITING,
+]
+
+
+def count_where(*args, **kwargs):
+    """ A conditional count, for use in aggregate, of the rows matching the given Q objects and lookups.
+
+    :return: a Count expression
+    """
+    return Count(Case(When(Q(*args, **kwargs), then=1)))
+
+
+def aggregate_counts(queryset, **counts):
+    """ Runs a set of conditional counts over a queryset in a single query.
+
+    :param queryset: the queryset to count over
+    :param counts: names mapped to count_where expressions
+    :return: a dictionary of names to integers
+    """
+    return {name: value or 0 for name, value in queryset.aggregate(**counts).items()}
+
+
+def journal_counts(journal):
+    """ Counts the articles in each editorial stage and the typesetting tasks of a journal.
+
+    The counts are cached until an article of the journal changes stage, or one of its typesetting tasks is saved.
+
+    :param journal: a Journal object
+    :return: a dictionary of dashboard context keys to integers
+    """
+    key = JOURNAL_COUNTS_KEY.format(journal.pk)
+    counts = cache.get(key)
+
+    if counts is None:
+        counts = aggregate_counts(
+            submission_models.Article.objects.filter(journal=journal),
+            unassigned_articles_count=count_where(stage=submission_models.STAGE_UNASSIGNED),
+            assigned_articles_count=count_where(stage__in=ASSIGNED_STAGES),
+            editing_articles_count=count_where(stage__in=EDITING_STAGES),
+            production_articles_count=count_where(stage=submission_models.STAGE_TYPESETTING),
+            proofing_articles_count=count_where(stage=submission_models.STAGE_PROOFING),
+            prepub_articles_count=count_where(stage=submission_models.STAGE_READY_FOR_PUBLICATION),
+        )
+        counts.update(aggregate_counts(
+            production_models.TypesetTask.objects.filter(assignment__article__journal=journal),
+            typeset_tasks=count_where(accepted__isnull=True, completed__isnull=True),
+            typeset_in_progress_tasks=count_where(accepted__isnull=False, completed__isnull=True),
+            typeset_completed_tasks=count_where(accepted__isnull=False, completed__isnull=False),
+        ))
+        cache.set(key, counts, getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 3600))
+
+    return counts
+
+
+def invalidate_journal_counts(journal_id):
+    """ Drops the cached stage counts of a journal.
+
+    :param journal_id: a Journal pk
+    :return: None
+    """
+    cache.delete(JOURNAL_COUNTS_KEY.format(journal_id))
+
+
+def user_counts(user, journal):
+    """ Counts a user's submissions, review, copyediting and proofing work, with one query per model.
+
+    :param user: an Account object
+    :param journal: a Journal object
+    :return: a dictionary of dashboard context keys to integers
+    """
+    counts = aggregate_counts(
+        submission_models.Article.objects.filter(owner=user, journal=journal),
+        active_submission_count=count_where(~Q(stage=submission_models.STAGE_UNSUBMITTED)),
+        in_progress_submission_count=count_where(stage=submission_models.STAGE_UNSUBMITTED),
+    )
+
+    counts.update(aggregate_counts(
+        review_models.ReviewAssignment.objects.filter(reviewer=user, article__journal=journal),
+        assigned_articles_for_user_review_count=count_where(
+            is_complete=False, article__stage=submission_models.STAGE_UNDER_REVIEW, date_accepted__isnull=True),
+        assigned_articles_for_user_review_accepted_count=count_where(
+            is_complete=False, article__stage=submission_models.STAGE_UNDER_REVIEW, date_accepted__isnull=False),
+        assigned_articles_for_user_review_completed_count=count_where(is_complete=True, date_declined__isnull=False),
+    ))
+
+    counts.update(aggregate_counts(
+        copyedit_models.CopyeditAssignment.objects.filter(copyeditor=user, article__journal=journal),
+        copyeditor_requests=count_where(decision__isnull=True, copyedit_reopened__isnull=True),
+        copyeditor_accepted_requests=count_where(
+            Q(copyeditor_completed__isnull=True) |
+            Q(copyeditor_completed__isnull=False, copyedit_reopened__isnull=False,
+              copyedit_reopened_complete__isnull=True),
+            decision='accept'),
+        copyeditor_completed_requests=count_where(copyeditor_completed__isnull=False),
+    ))
+
+    counts.update(aggregate_counts(
+        proofing_models.ProofingTask.objects.filter(proofreader=user, cancelled=False),
+        new_proofing=count_where(completed__isnull=True, accepted__isnull=True),
+        active_proofing=count_where(completed__isnull=True, accepted__isnull=False),
+        completed_proofing=count_where(completed__isnull=False),
+    ))
+
+    counts.update(aggregate_counts(
+        proofing_models.TypesetterProofingTask.objects.filter(typesetter=user, cancelled=False),
+        new_proofing_typesetting=count_where(completed__isnull=True, accepted__isnull=True),
+        active_proofing_typesetting=count_where(completed__isnull=True, accepted__isnull=False),
+        completed_proofing_typesetting=count_where(completed__isnull=False),
+    ))
+
+    return counts
@@ -88,6 +88,8 @@ INSTALLED_APPS += plugin_installed_apps.load_plugin_apps()
 INSTALLED_APPS += plugin_installed_apps.load_homepage_element_apps()
 
 MIDDLEWARE_CLASSES = (
+    'utils.middleware.LogEntryBufferMiddleware',
+    'utils.middleware.SettingsVersionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -99,7 +101,6 @@ MIDDLEWARE_CLASSES = (
     'core.middleware.SiteSettingsMiddleware',
     'utils.template_override_middleware.ThemeEngineMiddleware',
     'core.middleware.MaintenanceModeMiddleware',
-    'cron.middleware.CronMiddleware',
     'core.middleware.CounterCookieMiddleware',
     'django.middleware.locale.LocaleMiddleware',
     'core.middleware.GlobalRequestMiddleware',
@@ -335,9 +336,104 @@ S3_HOST = 's3.eu-west-2.amazonaws.com'  # eg. s3.eu-west-1.amazonaws.com
 BACKUP_TYPE = 'directory'  # s3 or directory
 BACKUP_DIR = '/path/to/backup/dir/'
 BACKUP_EMAIL = False  # If set to True, will send an email each time backup is run
+# Backups only store files changed since the last one. For S3-compatible services other than AWS, point S3_HOST at the
+# service and set S3_PORT and S3_SECURE as needed. Archives are uploaded in BACKUP_PART_SIZE parts (at least 5MB).
+S3_PORT = None
+S3_SECURE = True
+BACKUP_PART_SIZE = 8 * 1024 * 1024
+BACKUP_DB_CHUNK_SIZE = 1000  # rows serialized at a time by the database export
 
 URL_CONFIG = 'domain'  # path or domain
 
+# Journal and plugin settings are snapshotted per journal and language in each process. The snapshot version is kept
+# in the default cache and read once per request by SettingsVersionMiddleware. As a version bump in a process-local
+# cache cannot reach other workers, None turns snapshots on only when the default cache is shared (eg. memcached);
+# True or False forces them on or off.
+SETTINGS_SNAPSHOT_CACHE = None
+
+# When enabled, COUNTER reports read monthly totals from the access rollup maintained by the roll_up_accesses
+# management command (which should be added to cron) plus any accesses recorded since it last ran.
+METRICS_ACCESS_ROLLUP = False
+# Accesses from the last few minutes are left out of each rollup so that rows still being written are not skipped.
+# Keep this longer than METRICS_ACCESS_BUFFER_INTERVAL when buffering accesses.
+METRICS_ACCESS_ROLLUP_LAG = 10  # minutes
+
+# Article views and downloads can be buffered and written in batches instead of inside each request. Set to 'memory'
+# to hold them in each worker process or 'file' to spool them to METRICS_ACCESS_BUFFER_DIR, which the
+# flush_access_buffer command can recover after a crash. Either way the buffer is flushed on graceful shutdown.
+METRICS_ACCESS_BUFFER = None  # None, 'memory' or 'file'
+METRICS_ACCESS_BUFFER_SIZE = 500
+METRICS_ACCESS_BUFFER_INTERVAL = 10  # seconds
+METRICS_ACCESS_BUFFER_DIR = os.path.join(BASE_DIR, 'files', 'access_buffer')
+
+OAI_PAGE_SIZE = 100  # records per OAI-PMH ListRecords/ListIdentifiers response
+
+# Sitemaps are rendered once and stored on disk until an article or page they list changes. Articles are split into
+# sitemaps by pk range, SITEMAP_CHUNK_SIZE pks to a file.
+SITEMAP_CHUNK_SIZE = 1000
+SITEMAP_DIR = os.path.join(BASE_DIR, 'files', 'sitemaps')
+
+# Scheduled tasks are run by the run_cron_worker management command. A task that raises is retried after
+# CRON_TASK_RETRY_DELAY seconds, doubling each time, and is marked failed after CRON_TASK_MAX_ATTEMPTS attempts.
+# CRON_TASK_RATE limits the tasks per second each worker runs for a single journal (None for no limit).
+# Galley rendering and search index tasks are only ever run by the worker.
+# CRON_IN_REQUEST runs a few due tasks at the start of page views instead, for sites without a worker, and needs
+# cron.middleware.CronMiddleware in MIDDLEWARE_CLASSES.
+CRON_IN_REQUEST = False
+CRON_TASK_RATE = None
+CRON_TASK_LEASE = 300  # seconds a claimed task is reserved for the worker that claimed it
+CRON_TASK_MAX_ATTEMPTS = 5
+CRON_TASK_RETRY_DELAY = 60
+
+# When enabled, journal search uses a SQLite FTS5 index of published articles, which is updated as articles are
+# saved and rebuilt with the rebuild_search_index management command. Run that before enabling it. Rebuilds write
+# SEARCH_INDEX_CHUNK_SIZE articles per transaction; index updates that fail while an article is saved are retried by
+# the cron worker.
+SEARCH_INDEX = False
+SEARCH_INDEX_PATH = os.path.join(BASE_DIR, 'files', 'search', 'articles.sqlite3')
+SEARCH_INDEX_CHUNK_SIZE = 100
+
+# Issue tables of contents are cached for ISSUE_TOC_CACHE_TIMEOUT seconds, or until the issue's articles change. With
+# more than one worker process, configure a shared cache (CACHES) so that changes are seen by every process.
+ISSUE_TOC_CACHE_TIMEOUT = 3600
+
+# Public journal pages are cached for anonymous visitors for up to PAGE_CACHE_TIMEOUT seconds. Publishing and CMS,
+# news, homepage element and settings changes expire them sooner, while other changes, such as article view counts,
+# show once a page expires. Like the table of contents cache, this needs a shared cache with more than one worker
+# process.
+PAGE_CACHE = True
+PAGE_CACHE_TIMEOUT = 600
+
+# Journal-wide dashboard counts are cached for DASHBOARD_CACHE_TIMEOUT seconds, or until an article changes stage or a
+# typesetting task is saved.
+DASHBOARD_CACHE_TIMEOUT = 3600
+
+# The kanban board shows KANBAN_PAGE_SIZE cards per column and loads the rest on request.
+KANBAN_PAGE_SIZE = 25
+
+# Reviewer candidates and users who can be enrolled as reviewers are listed REVIEWER_CANDIDATES_PAGE_SIZE at a time.
+REVIEWER_CANDIDATES_PAGE_SIZE = 25
+
+# Log entries are buffered and written with bulk_create at the end of each request (LogEntryBufferMiddleware), when
+# LOG_ENTRY_BUFFER_SIZE are waiting, every LOG_ENTRY_BUFFER_INTERVAL seconds and at shutdown.
+LOG_ENTRY_BUFFER = True
+LOG_ENTRY_BUFFER_SIZE = 200
+LOG_ENTRY_BUFFER_INTERVAL = 5  # seconds
+
+# Webhook and Slack messages are posted by WEBHOOK_WORKERS background threads per process. At most WEBHOOK_QUEUE_SIZE
+# messages wait to be sent; when the queue is full, senders wait up to WEBHOOK_QUEUE_TIMEOUT seconds and then the
+# message is dropped. Failed posts are retried WEBHOOK_RETRIES times with exponential backoff.
+WEBHOOK_WORKERS = 4
+WEBHOOK_QUEUE_SIZE = 1000
+WEBHOOK_QUEUE_TIMEOUT = 5
+WEBHOOK_RETRIES = 3
+WEBHOOK_TIMEOUT = 10
+
+# OAI imports (scrape_oai) fetch up to OAI_IMPORT_QUEUE_SIZE pages ahead of the records being imported, and download
+# article pages, galleys and images IMPORT_FETCH_WORKERS at a time.
+OAI_IMPORT_QUEUE_SIZE = 2
+IMPORT_FETCH_WORKERS = 8
+
 # Captcha
 # You can get reCaptcha keys for your domain here: https://developers.google.com/recaptcha/intro
 # You can set either to use Google's reCaptcha or a basic math field with no external requirements
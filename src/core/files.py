@@ -3,8 +3,11 @@ __author__ = "Martin Paul Eve & Andy Byers"
 __license__ = "AGPL v3"
 __maintainer__ = "Birkbeck Centre for Technology and Publishing"
 
+import glob
 import mimetypes as mime
 import os
+import threading
+from hashlib import sha1
 from uuid import uuid4
 from wsgiref.util import FileWrapper
 from bs4 import BeautifulSoup
@@ -188,6 +191,9 @@ def get_file(file_to_get, article):
 def render_xml(file_to_render, article, galley=None):
     """Renders JATS and TEI XML into HTML for inline article display.
 
+    The result is stored alongside the article's files, keyed on the modification times of the XML file and the
+    stylesheet, so a file is only transformed again once one of them changes.
+
     :param file_to_render: the file object to retrieve and render
     :param article: the associated article
     :param galley: optional galley param, used to bastardise the graphics
@@ -212,17 +218,95 @@ def render_xml(file_to_render, article, galley=None):
                                        level='Error', actor=None, target=article)
         return ""
 
+    rendered_path = rendered_xml_path(file_to_render, article, path, xsl_path)
+
+    try:
+        with open(rendered_path, 'r') as rendered_file:
+            return rendered_file.read()
+    except FileNotFoundError:
+        pass
+
     with open(path, "rb") as xml_file_contents:
         xml = BeautifulSoup(xml_file_contents, "lxml-xml")
 
-        transform = etree.XSLT(etree.parse(xsl_path))
+        transform = get_xslt_transform(xsl_path)
 
         # remove the <?xml version="1.0" encoding="utf-8"?> line (or similar) if it exists
         regex = re.compile(r'<\?xml version="1.0" encoding=".+"\?>')
         xml_string = str(xml)
         xml_string = re.sub(regex, '', xml_string, count=1)
 
-        return transform(etree.XML(xml_string))
+        html = str(transform(etree.XML(xml_string)))
+
+    # write to a temporary name first so that a concurrent request never reads a partial rendition
+    temp_path = '{0}.{1}.tmp'.format(rendered_path, uuid4().hex)
+
+    with open(temp_path, 'w') as rendered_file:
+        rendered_file.write(html)
+
+    os.replace(temp_path, rendered_path)
+
+    return html
+
+
+def get_xslt_transform(xsl_path):
+    """ Returns a compiled XSLT for a stylesheet, compiling it again only if the file has changed.
+
+    Compiled stylesheets are held per thread as lxml XSLT objects should not be shared between threads.
+
+    :param xsl_path: the path to the stylesheet
+    :return: an etree.XSLT
+    """
+    if not hasattr(_xslt_cache, 'transforms'):
+        _xslt_cache.transforms = {}
+
+    version = _file_version(xsl_path)
+    cached = _xslt_cache.transforms.get(xsl_path)
+
+    if cached is None or cached[0] != version:
+        cached = (version, etree.XSLT(etree.parse(xsl_path)))
+        _xslt_cache.transforms[xsl_path] = cached
+
+    return cached[1]
+
+
+_xslt_cache = threading.local()
+
+
+def _file_version(path):
+    stat = os.stat(path)
+    return '{0}-{1}'.format(stat.st_mtime_ns, stat.st_size)
+
+
+def rendered_xml_directory(article):
+    return os.path.join(settings.BASE_DIR, 'files', 'articles', str(article.id), 'rendered')
+
+
+def rendered_xml_path(file_to_render, article, xml_path, xsl_path):
+    key = sha1('{0}:{1}:{2}:{3}'.format(
+        xml_path, _file_version(xml_path), xsl_path, _file_version(xsl_path),
+    ).encode('utf-8')).hexdigest()
+
+    directory = rendered_xml_directory(article)
+    os.makedirs(directory, exist_ok=True)
+
+    return os.path.join(directory, '{0}-{1}.html'.format(file_to_render.uuid_filename, key))
+
+
+def clear_rendered_xml(file_to_clear, article):
+    """ Removes stored renditions of an XML file. Renditions are keyed on file versions so this only saves space.
+
+    :param file_to_clear: the XML file object
+    :param article: the associated article
+    :return: None
+    """
+    filename = glob.escape(str(file_to_clear.uuid_filename))
+
+    for path in glob.glob(os.path.join(rendered_xml_directory(article), '{0}-*.html'.format(filename))):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
 
 
 def serve_file(request, file_to_serve, article):
@@ -284,7 +368,10 @@ def replace_file(article_to_replace, file_to_replace, new_file, copyedit=None, g
     :param copyedit: a CopyeditAssignment object
     :return: the new file model object
     """
-    from core import models
+    from core import models, page_cache
+    clear_rendered_xml(file_to_replace, article_to_replace)
+    page_cache.bump_content_version(article_to_replace.journal_id)
+
     if not copyedit:
         if file_to_replace in article_to_replace.manuscript_files.all():
             article_to_replace.manuscript_files.remove(file_to_replace)
@@ -345,7 +432,10 @@ def create_file_history_object(file_to_replace):
 
 def overwrite_file(uploaded_file, article, file_to_replace):
 
+    from core import page_cache
     create_file_history_object(file_to_replace)
+    clear_rendered_xml(file_to_replace, article)
+    page_cache.bump_content_version(article.journal_id)
     original_filename = str(uploaded_file.name)
 
     # N.B. os.path.splitext[1] always returns the final file extension, even in a multi-dotted (.txt.html etc.) input
@@ -261,6 +261,7 @@ class GeneratedPluginSettingForm(forms.Form):
             self.fields[field['name']].initial = object.processed_value
             self.fields[field['name']].help_text = object.setting.description
 
+    @setting_handler.deferred_invalidation()
     def save(self, journal, plugin, commit=True):
         for setting_name, setting_value in self.cleaned_data.items():
             setting_handler.save_plugin_setting(plugin, setting_name, setting_value, journal)
@@ -298,6 +299,7 @@ class GeneratedSettingForm(forms.Form):
             self.fields[field['name']].initial = object.processed_value
             self.fields[field['name']].help_text = object.setting.description
 
+    @setting_handler.deferred_invalidation()
     def save(self, journal, group, commit=True):
         for setting_name, setting_value in self.cleaned_data.items():
             setting_handler.save_setting('general', setting_name, journal, setting_value)
@@ -13,17 +13,12 @@ def yield_homepage_element_context(request, homepage_elements):
         issue_object = request.journal.current_issue
 
         if issue_object:
-            articles = issue_object.articles.all().order_by('section',
-                                                            'page_numbers').prefetch_related('authors',
-                                                                                             'manuscript_files').select_related(
-                'section')
-
             issue_objects = models.Issue.objects.filter(journal=request.journal)
 
             context = {
                 'issue': issue_object,
                 'issues': issue_objects,
-                'structure': issue_object.structure(articles),
+                'structure': issue_object.table_of_contents(),
                 'show_sidebar': False
             }
 
@@ -28,7 +28,7 @@ if settings.URL_CONFIG == 'path':
     urls.reverse = reverse
     urls.base.reverse = reverse
 
-from core import files
+from core import files, page_cache
 from review import models as review_models
 from copyediting import models as copyediting_models
 from submission import models as submission_models
@@ -211,6 +211,11 @@ class Account(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username']
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['last_name', 'first_name'], name='core_account_name_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         self.username = self.email.lower()
         self.email = self.email.lower()
@@ -269,14 +274,40 @@ class Account(AbstractBaseUser, PermissionsMixin):
 
     def add_account_role(self, role_slug, journal):
         role = Role.objects.get(slug=role_slug)
+        self.clear_role_cache()
         return AccountRole.objects.get_or_create(role=role, user=self, journal=journal)
 
     def remove_account_role(self, role_slug, journal):
         role = Role.objects.get(slug=role_slug)
+        self.clear_role_cache()
         AccountRole.objects.get(role=role, user=self, journal=journal).delete()
 
+    def journal_roles(self, journal):
+        """ Returns the slugs of the roles this account holds on a journal.
+
+        The slugs are loaded in one query the first time a journal is checked and kept on this instance, so role
+        checks against request.user are answered from memory for the rest of the request.
+
+        :param journal: a Journal object or None
+        :return: a set of role slugs
+        """
+        if not hasattr(self, '_journal_roles'):
+            self._journal_roles = {}
+
+        journal_pk = journal.pk if journal else None
+
+        if journal_pk not in self._journal_roles:
+            self._journal_roles[journal_pk] = set(
+                AccountRole.objects.filter(user=self, journal=journal).values_list('role__slug', flat=True)
+            )
+
+        return self._journal_roles[journal_pk]
+
+    def clear_role_cache(self):
+        self._journal_roles = {}
+
     def check_role(self, journal, role):
-        return AccountRole.objects.filter(user=self, journal=journal, role__slug=role).count() > 0 or self.is_staff
+        return self.is_staff or role in self.journal_roles(journal)
 
     def is_editor(self, request, journal=None):
         if not journal:
@@ -467,6 +498,17 @@ class Setting(models.Model):
     def __repr__(self):
         return u'%s' % self.name
 
+    def save(self, *args, **kwargs):
+        from utils import setting_handler
+        super(Setting, self).save(*args, **kwargs)
+        setting_handler.invalidate_settings_cache()
+
+    def delete(self, *args, **kwargs):
+        from utils import setting_handler
+        result = super(Setting, self).delete(*args, **kwargs)
+        setting_handler.invalidate_settings_cache()
+        return result
+
 
 class SettingValue(TranslatableModel):
     journal = models.ForeignKey('journal.Journal')
@@ -482,6 +524,17 @@ class SettingValue(TranslatableModel):
     def __str__(self):
         return "[{0}]: {1}".format(self.journal, self.setting.name)
 
+    def save(self, *args, **kwargs):
+        from utils import setting_handler
+        super(SettingValue, self).save(*args, **kwargs)
+        setting_handler.invalidate_settings_cache(self.journal_id)
+
+    def delete(self, *args, **kwargs):
+        from utils import setting_handler
+        result = super(SettingValue, self).delete(*args, **kwargs)
+        setting_handler.invalidate_settings_cache(self.journal_id)
+        return result
+
     @property
     def processed_value(self):
         return self.process_value()
@@ -900,6 +953,14 @@ class HomepageElement(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        super(HomepageElement, self).save(*args, **kwargs)
+        page_cache.bump_for_object(self.content_type, self.object_id)
+
+    def delete(self, *args, **kwargs):
+        page_cache.bump_for_object(self.content_type, self.object_id)
+        return super(HomepageElement, self).delete(*args, **kwargs)
+
 
 class LoginAttempt(models.Model):
     ip_address = models.GenericIPAddressField()
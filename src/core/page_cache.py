@@ -0,0 +1,194 @@
+__copyright__ = "Copyright 2017 Birkbeck, University of London"
+__author__ = "Martin Paul Eve & Andy Byers"
+__license__ = "AGPL v3"
+__maintainer__ = "Birkbeck Centre for Technology and Publishing"
+
+import pickle
+import re
+import time
+from functools import wraps
+from hashlib import sha1
+from uuid import uuid4
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from django.utils.translation import get_language
+
+VERSION_KEY = 'page_cache_version_{0}'
+CSRF_PLACEHOLDER = '__page_cache_csrf_token__'
+CSRF_TOKEN_PATTERN = re.compile(r'''(name=['"]csrfmiddlewaretoken['"] value=['"])[^'"]*(['"])''')
+
+
+def page_cache_enabled():
+    return getattr(settings, 'PAGE_CACHE', True)
+
+
+def _new_version():
+    return uuid4().hex
+
+
+def content_version(journal_id=None):
+    """ Returns the content version of a journal, or of the press when journal_id is None.
+
+    :param journal_id: a Journal pk or None
+    :return: a version string
+    """
+    key = VERSION_KEY.format(journal_id or 'press')
+    version = cache.get(key)
+
+    if version is None:
+        cache.add(key, _new_version(), None)
+        version = cache.get(key)
+
+    return version
+
+
+def bump_content_version(journal_id=None):
+    """ Marks the cached pages of a journal as stale, or those of every site when journal_id is None.
+
+    :param journal_id: a Journal pk or None
+    :return: None
+    """
+    cache.set(VERSION_KEY.format(journal_id or 'press'), _new_version(), None)
+
+
+def bump_for_object(content_type, object_id):
+    """ Bumps the content version of the site a content_type/object_id pair, as used by CMS pages, navigation, news
+    and homepage elements, belongs to.
+
+    :param content_type: a ContentType of journal or press
+    :param object_id: the pk of the journal or press
+    :return: None
+    """
+    if content_type and content_type.model == 'journal':
+        bump_content_version(object_id)
+    else:
+        bump_content_version()
+
+
+def request_versions(request):
+    versions = [content_version()]
+
+    if request.journal:
+        versions.append(content_version(request.journal.pk))
+
+    return versions
+
+
+def request_theme(request):
+    from utils import setting_handler
+
+    if request.journal:
+        return setting_handler.get_setting('general', 'journal_theme', request.journal).value
+
+    return request.press.theme
+
+
+def is_cacheable(request):
+    """ Pages are only cached for anonymous GET and HEAD requests without pending messages.
+
+    :param request: the request object
+    :return: a boolean
+    """
+    return (page_cache_enabled() and request.method in ('GET', 'HEAD') and not request.user.is_authenticated()
+            and not len(get_messages(request)))
+
+
+def cached_response(request, render_response, vary=None):
+    """ Serves a page from the cache for anonymous visitors, rendering and storing it on a miss.
+
+    Pages are keyed by host, path, language, theme and the content versions of the press and journal. Each stored page
+    keeps a weak ETag hashed from its content and the time it was rendered, which are used for conditional requests,
+    so parts of a page that change without a version bump, such as article metrics, are revalidated once the stored
+    page expires. CSRF tokens are stripped before a page is stored and each visitor's own token is put back when it is
+    served.
+
+    :param request: the request object
+    :param render_response: a callable returning the response for a miss
+    :param vary: a list of any further values the page depends on, eg. session state
+    :return: an HttpResponse
+    """
+    if not is_cacheable(request):
+        return render_response()
+
+    digest = sha1(repr([request.get_host(), request.get_full_path(), get_language(), request_theme(request),
+                        request_versions(request), vary]).encode('utf-8')).hexdigest()
+    key = 'page_content_{0}'.format(digest)
+    cached = cache.get(key)
+    response = None
+
+    if cached is None:
+        response = render_response()
+
+        if response.status_code != 200 or response.streaming or response.cookies:
+            return response
+
+        content = CSRF_TOKEN_PATTERN.sub(r'\g<1>{0}\g<2>'.format(CSRF_PLACEHOLDER),
+                                         response.content.decode(response.charset))
+        etag = 'W/"{0}"'.format(sha1(content.encode('utf-8')).hexdigest())
+        cached = (content, response['Content-Type'], etag, int(time.time()))
+        cache.set(key, cached, getattr(settings, 'PAGE_CACHE_TIMEOUT', 600))
+
+    content, content_type, etag, last_modified = cached
+    conditional_response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+
+    if conditional_response is not None:
+        response = conditional_response
+    elif response is None:
+        # get_token also flags the CSRF cookie to be set, as rendering the csrf_token tag would
+        response = HttpResponse(content.replace(CSRF_PLACEHOLDER, get_token(request)), content_type=content_type)
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, no_cache=True)
+
+    return response
+
+
+def cache_public_page(vary_on=None):
+    """ Decorates a view so that anonymous visitors are served from the page cache.
+
+    :param vary_on: a callable taking the request and returning further values the page depends on
+    :return: a view decorator
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            return cached_response(request, lambda: view(request, *args, **kwargs),
+                                   vary=vary_on(request) if vary_on else None)
+
+        return wrapper
+
+    return decorator
+
+
+def cached_fragment(request, name, build):
+    """ Caches part of a page's context for all visitors, keyed as pages are.
+
+    :param request: the request object
+    :param name: a name for the fragment
+    :param build: a callable returning the fragment, which must be picklable to be cached
+    :return: the fragment
+    """
+    if not page_cache_enabled():
+        return build()
+
+    key = 'page_fragment_{0}'.format(sha1(repr([name, request.get_host(), get_language(),
+                                                request_versions(request)]).encode('utf-8')).hexdigest())
+    fragment = cache.get(key)
+
+    if fragment is None:
+        fragment = build()
+
+        try:
+            cache.set(key, fragment, getattr(settings, 'PAGE_CACHE_TIMEOUT', 600))
+        except (pickle.PicklingError, TypeError, AttributeError):
+            # plugin contexts are not guaranteed to be picklable, in which case they are rebuilt each time
+            pass
+
+    return fragment
@@ -51,6 +51,7 @@ if settings.URL_CONFIG == 'domain':
         url(r'^$', press_views.index, name='website_index'),
         url(r'^journals/$', press_views.journals, name='press_journals'),
         url(r'^kanban/$', core_views.kanban, name='kanban'),
+        url(r'^kanban/column/(?P<column>\w+)/$', core_views.kanban_column, name='kanban_column'),
         url(r'^login/$', core_views.user_login, name='core_login'),
         url(r'^login/orcid/$', core_views.user_login_orcid, name='core_login_orcid'),
         url(r'^register/step/1/$', core_views.register, name='core_register'),
@@ -192,6 +193,8 @@ if settings.URL_CONFIG == 'domain':
             name='edit_identifiers_with_event'),
 
         url(r'^sitemap/$', journal_views.sitemap, name='journal_sitemap'),
+        url(r'^sitemap/articles/(?P<chunk>\d+)/$', journal_views.sitemap_articles, name='journal_sitemap_articles'),
+        url(r'^sitemap/pages/$', journal_views.sitemap_pages, name='journal_sitemap_pages'),
     ]
 
     # Allow Django to serve static content only in debug/dev mode
@@ -280,6 +283,8 @@ else:
         url(r'^(?P<journal_code>[-\w.]+)/$', press_views.index, name='website_index'),
         url(r'^(?P<journal_code>[-\w.]+)/journals/$', press_views.journals, name='press_journals'),
         url(r'^(?P<journal_code>[-\w.]+)/kanban/$', core_views.kanban, name='kanban'),
+        url(r'^(?P<journal_code>[-\w.]+)/kanban/column/(?P<column>\w+)/$', core_views.kanban_column,
+            name='kanban_column'),
         url(r'^(?P<journal_code>[-\w.]+)/login/$', core_views.user_login, name='core_login'),
         url(r'^(?P<journal_code>[-\w.]+)/login/orcid/$', core_views.user_login_orcid, name='core_login_orcid'),
         url(r'^(?P<journal_code>[-\w.]+)/register/step/1/$', core_views.register, name='core_register'),
@@ -456,6 +461,10 @@ else:
             name='edit_identifiers_with_event'),
 
         url(r'^(?P<journal_code>[-\w.]+)/sitemap/$', journal_views.sitemap, name='journal_sitemap'),
+        url(r'^(?P<journal_code>[-\w.]+)/sitemap/articles/(?P<chunk>\d+)/$', journal_views.sitemap_articles,
+            name='journal_sitemap_articles'),
+        url(r'^(?P<journal_code>[-\w.]+)/sitemap/pages/$', journal_views.sitemap_pages,
+            name='journal_sitemap_pages'),
     ]
 
     # Allow Django to serve static content only in debug/dev mode
@@ -4,6 +4,7 @@ __license__ = "AGPL v3"
 __maintainer__ = "Birkbeck Centre for Technology and Publishing"
 
 
+import json
 from importlib import import_module
 
 from django.contrib import messages
@@ -15,6 +16,7 @@ from django.urls import reverse
 from django.http import Http404
 from django.shortcuts import render, get_object_or_404, redirect
 from django.template.defaultfilters import linebreaksbr
+from django.template.loader import render_to_string
 from django.utils import timezone
 from django.http import HttpResponse
 from django.contrib.sessions.models import Session
@@ -22,19 +24,13 @@ from django.core.validators import validate_email
 from django.core.exceptions import ValidationError
 from django.conf import settings as django_settings
 
-from core import models, forms, files, logic
+from core import models, forms, files, logic, board, dashboard as dashboard_stats
 from security.decorators import editor_user_required, article_author_required
 from submission import models as submission_models
 from review import models as review_models
-from copyediting import models as copyedit_models
-from production import models as production_models
 from journal import models as journal_models
-from proofing import logic as proofing_logic
-from proofing import models as proofing_models
 from utils import models as util_models, setting_handler, orcid
 
-from django.db.models import Q
-
 
 def user_login(request):
     if request.user.is_authenticated():
@@ -295,90 +291,15 @@ def edit_profile(request):
 @login_required
 def dashboard(request):
     template = 'core/dashboard.html'
-    new_proofing, active_proofing, completed_proofing, new_proofing_typesetting, active_proofing_typesetting, \
-        completed_proofing_typesetting = proofing_logic.get_tasks(request)
     section_editor_articles = review_models.EditorAssignment.objects.filter(editor=request.user,
                                                                             editor_type='section-editor',
                                                                             article__journal=request.journal)
 
-    # TODO: Move most of this to model logic.
     context = {
-        'new_proofing': new_proofing.count(),
-        'active_proofing': active_proofing.count(),
-        'completed_proofing': completed_proofing.count(),
-        'new_proofing_typesetting': new_proofing_typesetting.count(),
-        'completed_proofing_typesetting': completed_proofing_typesetting.count(),
-        'active_proofing_typesetting': active_proofing_typesetting.count(),
-        'unassigned_articles_count': submission_models.Article.objects.filter(
-            stage=submission_models.STAGE_UNASSIGNED, journal=request.journal).count(),
-        'assigned_articles_count': submission_models.Article.objects.filter(
-            Q(stage=submission_models.STAGE_ASSIGNED) | Q(stage=submission_models.STAGE_UNDER_REVIEW) | Q(
-                stage=submission_models.STAGE_UNDER_REVISION), journal=request.journal).count(),
-        'editing_articles_count': submission_models.Article.objects.filter(
-            Q(stage=submission_models.STAGE_EDITOR_COPYEDITING) | Q(
-                stage=submission_models.STAGE_AUTHOR_COPYEDITING) | Q(
-                stage=submission_models.STAGE_FINAL_COPYEDITING), journal=request.journal).count(),
-        'production_articles_count': submission_models.Article.objects.filter(
-            Q(stage=submission_models.STAGE_TYPESETTING), journal=request.journal).count(),
-        'proofing_articles_count': submission_models.Article.objects.filter(
-            Q(stage=submission_models.STAGE_PROOFING), journal=request.journal).count(),
-        'prepub_articles_count': submission_models.Article.objects.filter(
-            Q(stage=submission_models.STAGE_READY_FOR_PUBLICATION), journal=request.journal).count(),
         'is_editor': request.user.is_editor(request),
         'is_author': request.user.is_author(request),
         'is_reviewer': request.user.is_reviewer(request),
         'section_editor_articles': section_editor_articles,
-        'active_submission_count': submission_models.Article.objects.filter(
-            owner=request.user,
-            journal=request.journal).exclude(
-            stage=submission_models.STAGE_UNSUBMITTED).count(),
-        'in_progress_submission_count': submission_models.Article.objects.filter(owner=request.user,
-                                                                                 journal=request.journal,
-                                                                                 stage=submission_models.
-                                                                                 STAGE_UNSUBMITTED).count(),
-        'assigned_articles_for_user_review_count': review_models.ReviewAssignment.objects.filter(
-            Q(is_complete=False) &
-            Q(reviewer=request.user) &
-            Q(article__stage=submission_models.STAGE_UNDER_REVIEW) &
-            Q(date_accepted__isnull=True), article__journal=request.journal).count(),
-        'assigned_articles_for_user_review_accepted_count': review_models.ReviewAssignment.objects.filter(
-            Q(is_complete=False) &
-            Q(reviewer=request.user) &
-            Q(article__stage=submission_models.STAGE_UNDER_REVIEW) &
-            Q(date_accepted__isnull=False), article__journal=request.journal).count(),
-        'assigned_articles_for_user_review_completed_count': review_models.ReviewAssignment.objects.filter(
-            Q(is_complete=True) &
-            Q(reviewer=request.user) &
-            Q(date_declined__isnull=False), article__journal=request.journal).count(),
-
-        'copyeditor_requests': copyedit_models.CopyeditAssignment.objects.filter(
-            Q(copyeditor=request.user) &
-            Q(decision__isnull=True) &
-            Q(copyedit_reopened__isnull=True), article__journal=request.journal).count(),
-        'copyeditor_accepted_requests': copyedit_models.CopyeditAssignment.objects.filter(
-            Q(copyeditor=request.user, decision='accept', copyeditor_completed__isnull=True,
-              article__journal=request.journal) |
-            Q(copyeditor=request.user, decision='accept', copyeditor_completed__isnull=False,
-              article__journal=request.journal, copyedit_reopened__isnull=False,
-              copyedit_reopened_complete__isnull=True)
-        ).count(),
-        'copyeditor_completed_requests': copyedit_models.CopyeditAssignment.objects.filter(
-            (Q(copyeditor=request.user) & Q(copyeditor_completed__isnull=False)) |
-            (Q(copyeditor=request.user) & Q(copyeditor_completed__isnull=False) &
-             Q(copyedit_reopened_complete__isnull=False)), article__journal=request.journal).count(),
-
-        'typeset_tasks': production_models.TypesetTask.objects.filter(
-            assignment__article__journal=request.journal,
-            accepted__isnull=True,
-            completed__isnull=True).count(),
-        'typeset_in_progress_tasks': production_models.TypesetTask.objects.filter(
-            assignment__article__journal=request.journal,
-            accepted__isnull=False,
-            completed__isnull=True).count(),
-        'typeset_completed_tasks': production_models.TypesetTask.objects.filter(
-            assignment__article__journal=request.journal,
-            accepted__isnull=False,
-            completed__isnull=False).count(),
         'active_submissions': submission_models.Article.objects.filter(owner=request.user,
                                                                        journal=request.journal).exclude(
             stage=submission_models.STAGE_UNSUBMITTED).order_by('-date_submitted'),
@@ -387,6 +308,8 @@ def dashboard(request):
             owner=request.user,
             stage=submission_models.STAGE_UNSUBMITTED).order_by('-date_started')
     }
+    context.update(dashboard_stats.journal_counts(request.journal))
+    context.update(dashboard_stats.user_counts(request.user, request.journal))
 
     return render(request, template, context)
 
@@ -438,10 +361,13 @@ def settings_index(request):
 def edit_setting(request, setting_group, setting_name):
     setting_value = setting_handler.get_setting(setting_group, setting_name, request.journal, create=True)
 
+    # the setting value may be shared with other requests through the settings snapshot, so it is not modified here
+    value = setting_value.value
+
     if setting_value.setting.types == 'rich-text':
-        setting_value.value = linebreaksbr(setting_value.value)
+        value = linebreaksbr(value)
 
-    edit_form = forms.EditKey(key_type=setting_value.setting.types, value=setting_value.value)
+    edit_form = forms.EditKey(key_type=setting_value.setting.types, value=value)
 
     if request.POST and 'delete' in request.POST:
         setting_value.value = ''
@@ -1049,61 +975,34 @@ def editorial_ordering(request, type_to_order, group_id=None):
 
 @editor_user_required
 def kanban(request):
-    unassigned_articles = submission_models.Article.objects.filter(Q(stage=submission_models.STAGE_UNASSIGNED),
-                                                                   journal=request.journal) \
-        .order_by('-date_submitted')
-
-    in_review = submission_models.Article.objects.filter(Q(stage=submission_models.STAGE_ASSIGNED) |
-                                                         Q(stage=submission_models.STAGE_UNDER_REVIEW) |
-                                                         Q(stage=submission_models.STAGE_UNDER_REVISION),
-                                                         journal=request.journal) \
-        .order_by('-date_submitted')
-
-    copyediting = submission_models.Article.objects.filter(Q(stage=submission_models.STAGE_ACCEPTED) |
-                                                           Q(stage__in=submission_models.COPYEDITING_STAGES),
-                                                           journal=request.journal) \
-        .order_by('-date_submitted')
-
-    assigned_table = production_models.ProductionAssignment.objects.filter(article__journal=request.journal)
-    assigned = [assignment.article.pk for assignment in assigned_table]
-
-    prod_unassigned_articles = submission_models.Article.objects.filter(
-        stage=submission_models.STAGE_TYPESETTING, journal=request.journal).exclude(
-        id__in=assigned)
-    assigned_articles = submission_models.Article.objects.filter(stage=submission_models.STAGE_TYPESETTING,
-                                                                 journal=request.journal).exclude(
-        id__in=unassigned_articles)
-
-    proofing_assigned_table = proofing_models.ProofingAssignment.objects.filter(article__journal=request.journal)
-    proofing_assigned = [assignment.article.pk for assignment in proofing_assigned_table]
-
-    proof_unassigned_articles = submission_models.Article.objects.filter(
-        stage=submission_models.STAGE_PROOFING, journal=request.journal).exclude(
-        id__in=proofing_assigned)
-    proof_assigned_articles = submission_models.Article.objects.filter(stage=submission_models.STAGE_PROOFING,
-                                                                       journal=request.journal).exclude(
-        id__in=proof_unassigned_articles)
-
-    prepub = submission_models.Article.objects.filter(Q(stage=submission_models.STAGE_READY_FOR_PUBLICATION),
-                                                      journal=request.journal) \
-        .order_by('-date_submitted')
-
-    context = {
-        'unassigned_articles': unassigned_articles,
-        'in_review': in_review,
-        'copyediting': copyediting,
-        'production': prod_unassigned_articles,
-        'production_assigned': assigned_articles,
-        'proofing': proof_unassigned_articles,
-        'proofing_assigned': proof_assigned_articles,
-        'prepubs': prepub,
-    }
+    context = board.board(request.journal)
 
     template = 'core/kanban.html'
 
     return render(request, template, context)
 
 
+@editor_user_required
+def kanban_column(request, column):
+    """ Returns a further page of a kanban column as JSON, for columns too long to render at once.
+
+    :param request: the request object
+    :param column: a key of core.board.COLUMNS
+    :return: a JSON HttpResponse with the rendered cards and a link to the next page
+    """
+    if column not in board.COLUMNS:
+        raise Http404
+
+    page = board.column_page(request.journal, column, request.GET.get('page', 1))
+    html = render_to_string('elements/core/kanban/column.html',
+                            {'page': page, 'column': column, 'type': board.card_type(column)},
+                            request=request)
+
+    return_dict = {'html': html, 'count': page.paginator.count, 'has_next': page.has_next()}
+
+    return HttpResponse(json.dumps(return_dict), content_type="application/json")
+
+
 @editor_user_required
 def delete_note(request, article_id, note_id):
     note = get_object_or_404(submission_models.Note, pk=note_id)
@@ -1173,10 +1072,13 @@ def edit_email_template(request, template_code, subject=False):
     else:
         template_value = setting_handler.get_setting('email', template_code, request.journal, create=True)
 
+    # the setting value may be shared with other requests through the settings snapshot, so it is not modified here
+    value = template_value.value
+
     if template_value.setting.types == 'rich-text':
-        template_value.value = linebreaksbr(template_value.value)
+        value = linebreaksbr(value)
 
-    edit_form = forms.EditKey(key_type=template_value.setting.types, value=template_value.value)
+    edit_form = forms.EditKey(key_type=template_value.setting.types, value=value)
 
     if request.POST:
         value = request.POST.get('value')
@@ -7,7 +7,15 @@ __maintainer__ = "Birkbeck Centre for Technology and Publishing"
 from django.contrib import admin
 from cron import models
 
+
+class CronTaskAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'task_type', 'email_journal', 'run_at', 'attempts', 'failed')
+    list_filter = ('task_type', 'failed', 'email_journal')
+    search_fields = ('email_to', 'email_subject', 'last_error')
+
+
 admin_list = [
+    (models.CronTask, CronTaskAdmin),
     (models.Reminder,),
     (models.SentReminder,),
 ]
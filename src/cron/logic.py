@@ -3,10 +3,13 @@ __author__ = "Martin Paul Eve & Andy Byers"
 __license__ = "AGPL v3"
 __maintainer__ = "Birkbeck Centre for Technology and Publishing"
 
+from collections import defaultdict
 
+from django.db.models import Q
 from django.utils import timezone
 
 from utils import notify, render_template
+from utils.notify_plugins import notify_email
 from submission import models as submission_models
 from review import models as review_models
 from proofing import models as proofing_models
@@ -17,6 +20,104 @@ def task_runner(task):
         pass
     elif task.task_type == 'email_message':
         notify.notification(**{'action': ['email'], 'task': task})
+    elif task.task_type == 'render_galleys':
+        from journal import logic as journal_logic, search
+        article = submission_models.Article.objects.filter(pk=task.task_data).first()
+
+        if article:
+            journal_logic.render_xml_galleys(article)
+
+            if search.search_enabled():
+                search.index_article(article, body=search.galley_text(article))
+    elif task.task_type == 'index_article':
+        from journal import search
+        article = submission_models.Article.objects.filter(pk=task.task_data).first()
+
+        if article:
+            search.index_article(article)
+        else:
+            search.remove_article(int(task.task_data))
+
+
+def reminder_query(reminder_type):
+    """ Returns the model and filter for objects of a reminder type that are still outstanding. """
+    if reminder_type == 'review':
+        return review_models.ReviewAssignment, (Q(date_declined__isnull=True) &
+                                                Q(date_complete__isnull=True)) | (Q(date_accepted__isnull=False) &
+                                                                                  Q(date_complete__isnull=True))
+    elif reminder_type == 'revisions':
+        return review_models.RevisionRequest, Q(date_completed__isnull=True)
+
+    return None, None
+
+
+def send_reminders(reminders, batch_size=100):
+    """ Sends every reminder that is due today.
+
+    Due objects are fetched with one query per reminder type for all journals and dates, reminders already sent today
+    are loaded into a set up front, and messages are sent over one mail connection in batches, recording each batch
+    with bulk_create.
+
+    :param reminders: an iterable of Reminder objects
+    :param batch_size: the number of messages to send before recording them as sent
+    :return: the number of reminders sent
+    """
+    from cron import models
+
+    today = timezone.now().date()
+    reminders_by_type = defaultdict(list)
+
+    for reminder in reminders:
+        reminders_by_type[reminder.type].append(reminder)
+
+    sent_count = 0
+
+    for reminder_type, type_reminders in reminders_by_type.items():
+        model, query = reminder_query(reminder_type)
+
+        if model is None:
+            continue
+
+        reminders_by_key = defaultdict(list)
+
+        for reminder in type_reminders:
+            reminders_by_key[(reminder.journal_id, reminder.target_date().date())].append(reminder)
+
+        items = model.objects.filter(
+            query,
+            date_due__in={date_due for _, date_due in reminders_by_key},
+            article__journal__in={journal_id for journal_id, _ in reminders_by_key},
+        ).select_related('article__journal', 'article__correspondence_author').order_by('pk')
+
+        already_sent = set(models.SentReminder.objects.filter(
+            type=reminder_type,
+            sent=today,
+            object_id__in=[item.pk for item in items],
+        ).values_list('object_id', flat=True))
+
+        pending = []
+
+        for item in items:
+            for reminder in reminders_by_key.get((item.article.journal_id, item.date_due), []):
+                if item.pk in already_sent:
+                    print('Reminder {0} for object {1} has already been sent'.format(reminder, item))
+                    continue
+
+                already_sent.add(item.pk)
+                context = {'object': item, 'journal': reminder.journal}
+                message = render_template.get_requestless_content(context, reminder.journal, reminder.template_name)
+                email = notify_email.prepare_email(reminder.subject, item.article.correspondence_author.email,
+                                                   message, reminder.journal, None)
+                pending.append((email, models.SentReminder(type=reminder_type, object_id=item.pk, sent=today)))
+
+        for start in range(0, len(pending), batch_size):
+            batch = dict(pending[start:start + batch_size])
+            sent = notify_email.send_prepared_emails(list(batch))
+            # Record what was sent so that we don't do this more than once by accident.
+            models.SentReminder.objects.bulk_create([batch[email] for email in sent])
+            sent_count += len(sent)
+
+    return sent_count
 
 
 def process_editor_digest(journal, user_role):
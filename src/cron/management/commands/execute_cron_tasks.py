@@ -18,3 +18,4 @@ class Command(BaseCommand):
         """
         print("Executing cron tasks now.")
         call_command('send_reminders')
+        call_command('run_cron_worker', once=True)
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+
+from cron import worker
+
+
+class Command(BaseCommand):
+    """
+    A management command that runs scheduled tasks, such as emails, on a pool of threads.
+    """
+
+    help = "Runs due cron tasks concurrently. Several workers may be run at once to drain the queue in parallel."
+
+    def add_arguments(self, parser):
+        """ Adds arguments to Django's management command-line parser.
+
+        :param parser: the parser to which the required arguments will be added
+        :return: None
+        """
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument('--batch_size', type=int, default=50)
+        parser.add_argument('--rate', type=float, default=None,
+                            help='Maximum tasks per second per journal, defaults to CRON_TASK_RATE.')
+        parser.add_argument('--poll_interval', type=int, default=5)
+        parser.add_argument('--once', action='store_true', default=False,
+                            help='Exit once no tasks are due instead of polling.')
+
+    def handle(self, *args, **options):
+        """Runs cron tasks until stopped, or until none are due if --once is passed.
+
+        :param args: None
+        :param options: threads, batch_size, rate, poll_interval and once
+        :return: None
+        """
+        succeeded, failed = worker.run_worker(
+            threads=options.get('threads'),
+            batch_size=options.get('batch_size'),
+            rate=options.get('rate'),
+            poll_interval=options.get('poll_interval'),
+            once=options.get('once'),
+        )
+
+        print('Ran {0} cron tasks, {1} failed and will be retried.'.format(succeeded, failed))
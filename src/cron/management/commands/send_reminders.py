@@ -1,7 +1,6 @@
 from django.core.management.base import BaseCommand
 
-from cron import models
-from journal import models as journal_models
+from cron import logic, models
 
 
 class Command(BaseCommand):
@@ -12,14 +11,11 @@ class Command(BaseCommand):
     help = "Sends review and revision reminder emails.."
 
     def handle(self, *args, **options):
+        reminders = models.Reminder.objects.select_related('journal')
 
-        journals = journal_models.Journal.objects.all()
+        for reminder in reminders:
+            print("Reminder {0}, target date: {1}".format(reminder, reminder.target_date()))
 
-        for journal in journals:
-            print("Processing reminders for journal {0}: {1}".format(journal.pk, journal.name))
+        sent = logic.send_reminders(reminders)
 
-            reminders = models.Reminder.objects.filter(journal=journal)
-
-            for reminder in reminders:
-                print("Reminder {0}, target date: {1}".format(reminder, reminder.target_date()))
-                reminder.send_reminder()
+        print("Sent {0} reminders.".format(sent))
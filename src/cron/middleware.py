@@ -4,19 +4,28 @@ __license__ = "AGPL v3"
 __maintainer__ = "Birkbeck Centre for Technology and Publishing"
 
 
+from django.conf import settings
+
 from cron import models
-from core import settings
 
 
 class CronMiddleware(object):
 
     @staticmethod
     def process_request(request):
-        """ This middleware class calls the Cron runner to process scheduled tasks (like emails)
+        """ This middleware class calls the Cron runner to process scheduled tasks (like emails) when CRON_IN_REQUEST is
+        on. It is off by default, as the run_cron_worker command runs tasks without holding up page views.
 
         :param request: the current request
         :return: None or an http 404 error in the event of catastrophic failure
         """
+        if not getattr(settings, 'CRON_IN_REQUEST', False):
+            return
+
+        # a plain read first, so that requests only take row locks when there is something to run
+        if not models.CronTask.due_tasks().exists():
+            return
+
         if not settings.DEBUG:
             try:
                 models.CronTask.run_tasks()
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cron', '0002_auto_20170711_1203'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='crontask',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='crontask',
+            name='failed',
+            field=models.BooleanField(default=False, help_text='Set once a task has used up its retries. Failed tasks are kept for inspection and are not run again.'),
+        ),
+        migrations.AddField(
+            model_name='crontask',
+            name='last_error',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='crontask',
+            name='run_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+    ]
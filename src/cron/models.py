@@ -4,21 +4,28 @@ __license__ = "AGPL v3"
 __maintainer__ = "Birkbeck Centre for Technology and Publishing"
 
 
-from django.db import models
+from django.conf import settings
+from django.db import connection, models, transaction
 from django.utils import timezone
-from django.db.models import Q
 from datetime import timedelta
 
 from cron import logic
 from journal import models as journal_models
-from utils import render_template, notify_helpers
+
+# Slow tasks that are only run by the run_cron_worker command, never by CronTask.run_tasks during a request.
+WORKER_ONLY_TASK_TYPES = ('render_galleys', 'index_article')
 
 
 class CronTask(models.Model):
     task_type = models.CharField(max_length=255)
     task_data = models.TextField(blank=True, null=True)
     added = models.DateTimeField(default=timezone.now)
-    run_at = models.DateTimeField(default=timezone.now)
+    run_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    attempts = models.PositiveIntegerField(default=0)
+    failed = models.BooleanField(default=False, help_text="Set once a task has used up its retries. Failed tasks are "
+                                                          "kept for inspection and are not run again.")
+    last_error = models.TextField(blank=True, null=True)
 
     email_to = models.EmailField(blank=True, null=True)
     email_subject = models.CharField(max_length=255, blank=True, null=True)
@@ -27,16 +34,101 @@ class CronTask(models.Model):
     email_cc = models.CharField(max_length=255, blank=True, null=True)
     email_bcc = models.CharField(max_length=255, blank=True, null=True)
 
+    def __str__(self):
+        return '{0} task {1} due {2}'.format(self.task_type, self.pk, self.run_at)
+
+    @staticmethod
+    def due_tasks():
+        return CronTask.objects.filter(run_at__lt=timezone.now(), failed=False)
+
     @staticmethod
     def run_tasks():
-        tasks = CronTask.objects.filter(run_at__lt=timezone.now())
+        """ Runs a few due tasks, such as emails, from within a request. Galley rendering and search indexing are left
+        to run_cron_worker.
+
+        :return: None
+        """
+        for task in CronTask.claim_tasks(5, exclude_types=WORKER_ONLY_TASK_TYPES):
+            task.run()
+
+    @staticmethod
+    def claim_tasks(batch_size, lease=None, exclude_types=None):
+        """ Claims up to batch_size due tasks for this process.
+
+        Due rows are locked with SELECT ... FOR UPDATE, skipping rows another worker has locked where the database
+        supports it, and their run_at is pushed back by the lease before the transaction commits. Other workers will
+        not see them again unless the lease runs out before the task is run and deleted, eg. if this process dies.
 
-        if tasks.exists():
-            # run five cron items
-            for task in tasks[0:5]:
-                logic.task_runner(task)
+        :param batch_size: the maximum number of tasks to claim
+        :param lease: seconds for which the claimed tasks are reserved, defaults to CRON_TASK_LEASE
+        :param exclude_types: a list of task types not to claim
+        :return: a list of CronTask objects
+        """
+        if lease is None:
+            lease = getattr(settings, 'CRON_TASK_LEASE', 300)
+
+        now = timezone.now()
+
+        with transaction.atomic():
+            tasks = CronTask.due_tasks().order_by('run_at', 'pk')
+
+            if exclude_types:
+                tasks = tasks.exclude(task_type__in=exclude_types)
+
+            if connection.features.has_select_for_update_skip_locked:
+                tasks = tasks.select_for_update(skip_locked=True)
+            else:
+                tasks = tasks.select_for_update()
+
+            pks = list(tasks.values_list('pk', flat=True)[:batch_size])
+            CronTask.objects.filter(pk__in=pks).update(run_at=now + timedelta(seconds=lease))
+
+        return list(CronTask.objects.filter(pk__in=pks).select_related('email_journal').order_by('pk'))
+
+    def run(self):
+        """ Runs a claimed task, deleting it if it succeeds and scheduling a retry with backoff if it raises.
+
+        :return: True if the task ran successfully
+        """
+        try:
+            logic.task_runner(self)
+        except Exception as e:
+            self.retry_later(e)
+            return False
 
-                task.delete()
+        self.delete()
+        return True
+
+    def retry_later(self, error):
+        max_attempts = getattr(settings, 'CRON_TASK_MAX_ATTEMPTS', 5)
+        delay = getattr(settings, 'CRON_TASK_RETRY_DELAY', 60) * 2 ** self.attempts
+
+        self.attempts += 1
+        self.last_error = '{0}: {1}'.format(type(error).__name__, error)
+        self.failed = self.attempts >= max_attempts
+        self.run_at = timezone.now() + timedelta(seconds=min(delay, 86400))
+        CronTask.objects.filter(pk=self.pk).update(attempts=self.attempts, last_error=self.last_error,
+                                                   failed=self.failed, run_at=self.run_at)
+
+    @staticmethod
+    def add_galley_render_task(article):
+        """ Queues the article's XML galleys to be rendered by run_cron_worker, so that the transform runs outside of
+        any request.
+
+        :param article: the Article whose galleys to render
+        :return: the CronTask
+        """
+        return CronTask.objects.create(task_type='render_galleys', task_data=str(article.pk))
+
+    @staticmethod
+    def add_search_index_task(article_pk):
+        """ Queues an article's search index entry to be updated by run_cron_worker, eg. after the index was locked when
+        it was saved.
+
+        :param article_pk: the pk of the Article
+        :return: the CronTask
+        """
+        return CronTask.objects.create(task_type='index_article', task_data=str(article_pk))
 
     @staticmethod
     def add_email_task(to, subject, html, request, run_at=timezone.now(), cc=None, bcc=None):
@@ -99,49 +191,12 @@ class Reminder(models.Model):
             return None
 
     def items_for_reminder(self):
-        model, objects, query = None, None, None
-        from review import models as review_models
-
-        if self.type == 'review':
-            model = review_models.ReviewAssignment
-            query = (Q(date_declined__isnull=True) &
-                     Q(date_complete__isnull=True)) | (Q(date_accepted__isnull=False) &
-                                                       Q(date_complete__isnull=True))
-        elif self.type == 'revisions':
-            model = review_models.RevisionRequest
-            query = Q(date_completed__isnull=True)
+        model, query = logic.reminder_query(self.type)
 
-        if self.run_type == 'before':
-            date_time = timezone.now() - timedelta(days=self.days)
-        elif self.run_type == 'after':
-            date_time = timezone.now() + timedelta(days=self.days)
-
-        objects = model.objects.filter(date_due=date_time).filter(query)
-
-        return objects
+        return model.objects.filter(date_due=self.target_date().date(), article__journal=self.journal).filter(query)
 
     def send_reminder(self):
-        objects = self.items_for_reminder()
-        request = Request()
-        request.journal = self.journal
-
-        for item in objects:
-            sent_check = SentReminder.objects.filter(type=self.type, object_id=item.pk, sent=timezone.now().date())
-
-            if not sent_check:
-                context = {'object': item, 'journal': self.journal}
-                message = render_template.get_requestless_content(context, self.journal, self.template_name)
-
-                notify_helpers.send_email_with_body_from_user(request,
-                                                              self.subject,
-                                                              item.article.correspondence_author.email,
-                                                              message)
-
-                # Create a SentReminder object to ensure we don't do this more than once by accident.
-                SentReminder.objects.create(type=self.type, object_id=item.pk)
-                print('Reminder sent for {0}'.format(object))
-            else:
-                print('Reminder {0} for object {1} has already been sent'.format(self, item))
+        return logic.send_reminders([self])
 
 
 class Request(object):
@@ -0,0 +1,63 @@
+__copyright__ = "Copyright 2017 Birkbeck, University of London"
+__author__ = "Martin Paul Eve & Andy Byers"
+__license__ = "AGPL v3"
+__maintainer__ = "Birkbeck Centre for Technology and Publishing"
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection
+
+from cron import models
+from utils.shared import RateLimiter
+
+
+def run_task(limiter, task):
+    try:
+        limiter.wait(task.email_journal_id)
+        return task.run()
+    finally:
+        # each pool thread has its own connection, which would otherwise be left open
+        connection.close()
+
+
+def run_worker(threads=4, batch_size=50, rate=None, poll_interval=5, once=False):
+    """ Claims due CronTasks in batches and runs them on a thread pool until stopped.
+
+    Claiming locks rows with skip_locked, so any number of workers can share the queue without running a task twice.
+
+    :param threads: the number of tasks to run at once
+    :param batch_size: the number of tasks to claim at a time
+    :param rate: the maximum tasks per second per journal, defaults to CRON_TASK_RATE
+    :param poll_interval: seconds to wait before checking again when nothing is due
+    :param once: stop when nothing is due instead of polling
+    :return: a tuple of the number of tasks that succeeded and the number that failed
+    """
+    if rate is None:
+        rate = getattr(settings, 'CRON_TASK_RATE', None)
+
+    # the limit applies per worker process, so each journal may see up to `rate` tasks per second per worker
+    limiter = RateLimiter(rate)
+    # a whole batch from a single journal must be able to run before its lease runs out
+    lease = max(getattr(settings, 'CRON_TASK_LEASE', 300), 2 * batch_size / rate if rate else 0)
+    succeeded, failed = 0, 0
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        while True:
+            tasks = models.CronTask.claim_tasks(batch_size, lease=lease)
+
+            if not tasks:
+                if once:
+                    break
+
+                time.sleep(poll_interval)
+                continue
+
+            for result in executor.map(lambda task: run_task(limiter, task), tasks):
+                if result:
+                    succeeded += 1
+                else:
+                    failed += 1
+
+    return succeeded, failed
@@ -12,9 +12,17 @@ class DOIAdmin(admin.ModelAdmin):
     list_display = ('identifier', 'resolves_to', 'expected_to_resolve_to', 'checked')
 
 
+class CrossrefDepositAdmin(admin.ModelAdmin):
+    list_display = ('batch_id', 'journal', 'deposit_id', 'status', 'test_mode', 'date_time')
+    list_filter = ('journal', 'status', 'test_mode')
+    raw_id_fields = ('identifiers',)
+
+
 admin_list = [
     (models.Identifier,),
     (models.BrokenDOI, DOIAdmin),
+    (models.CrossrefDeposit, CrossrefDepositAdmin),
+    (models.DOICheck,),
 ]
 
 [admin.site.register(*t) for t in admin_list]
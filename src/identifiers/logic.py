@@ -5,8 +5,11 @@ __maintainer__ = "Birkbeck Centre for Technology and Publishing"
 
 
 import datetime
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from uuid import uuid4
 import requests
+from requests.adapters import HTTPAdapter
 
 from django.urls import reverse
 from django.template.loader import render_to_string
@@ -14,6 +17,9 @@ from django.utils.http import urlencode
 import sys
 from utils import models as util_models
 
+CROSSREF_SETTINGS = ('use_crossref', 'crossref_test', 'crossref_username', 'crossref_password', 'crossref_email',
+                     'crossref_name', 'crossref_registrant')
+
 
 def register_crossref_doi(identifier):
     from utils import setting_handler
@@ -114,6 +120,175 @@ def send_crossref_deposit(server, identifier):
         print("Status of {} in {}: {}".format(token, identifier.identifier, status))
 
 
+def get_crossref_settings(journal):
+    """ Resolves all of a journal's Crossref settings at once.
+
+    :param journal: the Journal
+    :return: a dictionary of processed setting values keyed by setting name
+    """
+    from utils import setting_handler
+
+    return {name: setting_handler.get_setting('Identifiers', name, journal).processed_value
+            for name in CROSSREF_SETTINGS}
+
+
+def crossref_deposit_url(journal, test_mode):
+    pingback_url = urlencode({'pingback': 'http://{0}{1}'.format(journal.domain, reverse('crossref_pingback'))})
+
+    return 'https://api.crossref.org/deposits?{0}{1}'.format('test=true&' if test_mode else '', pingback_url)
+
+
+def crossref_article_context(identifier):
+    article = identifier.article
+    pdfs = [galley for galley in article.galley_set.all() if galley.type == 'pdf']
+
+    return {
+        'article_title': '{0}{1}{2}'.format(
+            article.title,
+            ' ' if article.subtitle is not None else '',
+            article.subtitle if article.subtitle is not None else ''),
+        'authors': article.authors.all(),
+        'article_month': article.date_published.month,
+        'article_day': article.date_published.day,
+        'article_year': article.date_published.year,
+        'doi': identifier.identifier,
+        'article_url': article.url,
+        'pdf_url': article.pdf_url if pdfs else None,
+    }
+
+
+def build_crossref_batch(journal, identifiers, crossref_settings, batch_id):
+    """ Renders a single Crossref deposit document for several of a journal's articles.
+
+    Articles are grouped by issue, with one journal element per issue, as the schema allows.
+
+    :param journal: the Journal the identifiers belong to
+    :param identifiers: a list of DOI Identifiers with their articles
+    :param crossref_settings: the journal's settings from get_crossref_settings
+    :param batch_id: the doi_batch_id for the document
+    :return: the XML document as a string
+    """
+    issues = OrderedDict()
+
+    for identifier in identifiers:
+        article = identifier.article
+        issue = article.issue
+        key = issue.pk if issue else None
+
+        if key not in issues:
+            issues[key] = {
+                'journal_month': article.date_published.month,
+                'journal_day': article.date_published.day,
+                'journal_year': article.date_published.year,
+                'journal_volume': issue.volume if issue else None,
+                'journal_issue': issue.issue if issue else None,
+                'articles': [],
+            }
+
+        issues[key]['articles'].append(crossref_article_context(identifier))
+
+    template_context = {
+        'batch_id': batch_id,
+        'timestamp': int(round((datetime.datetime.now() - datetime.datetime(1970, 1, 1)).total_seconds())),
+        'depositor_name': crossref_settings['crossref_name'],
+        'depositor_email': crossref_settings['crossref_email'],
+        'registrant': crossref_settings['crossref_registrant'],
+        'journal_title': journal.name,
+        'journal_issn': journal.issn,
+        'issues': issues.values(),
+    }
+
+    return render_to_string('identifiers/crossref_batch.xml', template_context)
+
+
+def post_crossref_deposit(session, server, document, crossref_settings):
+    return session.post(server, data=document.encode('utf-8'),
+                        auth=(crossref_settings['crossref_username'], crossref_settings['crossref_password']),
+                        headers={"Content-Type": "application/vnd.crossref.deposit+xml"},
+                        timeout=60)
+
+
+def register_crossref_batch(journal, identifiers, chunk_size=100, max_workers=4, server=None):
+    """ Registers many DOIs with Crossref using one deposit document per chunk of articles.
+
+    Settings are resolved once for the journal. Documents are rendered up front and posted over a shared, pooled
+    session by at most max_workers threads. Each deposit is recorded as a CrossrefDeposit so its status can be
+    polled later.
+
+    :param journal: the Journal the identifiers belong to
+    :param identifiers: a queryset of DOI Identifiers for published articles
+    :param chunk_size: the number of articles in each deposit
+    :param max_workers: the number of deposits to send at once
+    :param server: a deposit URL to use instead of Crossref's, eg. a local stub server in tests
+    :return: a list of CrossrefDeposit objects
+    """
+    from identifiers import models as identifier_models
+
+    crossref_settings = get_crossref_settings(journal)
+
+    if not crossref_settings['use_crossref']:
+        print("[DOI] Not using Crossref DOIs on this journal. Aborting registration.")
+        return []
+
+    test_mode = crossref_settings['crossref_test']
+    server = server or crossref_deposit_url(journal, test_mode)
+    identifiers = list(identifiers.select_related('article__journal', 'article__primary_issue').prefetch_related(
+        'article__authors', 'article__galley_set'))
+
+    batches = []
+
+    for start in range(0, len(identifiers), chunk_size):
+        chunk = identifiers[start:start + chunk_size]
+        deposit = identifier_models.CrossrefDeposit.objects.create(journal=journal, batch_id=str(uuid4()),
+                                                                   test_mode=test_mode)
+        deposit.identifiers.add(*chunk)
+        batches.append((deposit, len(chunk), build_crossref_batch(journal, chunk, crossref_settings, deposit.batch_id)))
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    def send(batch):
+        try:
+            return post_crossref_deposit(session, server, batch[2], crossref_settings), None
+        except requests.RequestException as e:
+            return None, e
+
+    with session, ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for (deposit, count, _), (response, error) in zip(batches, executor.map(send, batches)):
+            deposit.record_response(response, error)
+            util_models.LogEntry.add_entry('Submission', "Crossref deposit {0} of {1} DOIs: {2}".format(
+                deposit.batch_id, count, deposit.status), 'Info', target=journal)
+
+    deposits = [deposit for deposit, _, _ in batches]
+
+    return deposits
+
+
+def poll_crossref_deposit(deposit, session=None):
+    """ Fetches the current status of a deposit from Crossref and records it.
+
+    :param deposit: a CrossrefDeposit that was accepted by Crossref
+    :param session: an optional requests Session to reuse
+    :return: the deposit status
+    """
+    crossref_settings = get_crossref_settings(deposit.journal)
+    url = 'https://api.crossref.org/deposits/{0}{1}'.format(deposit.deposit_id, '?test=true' if deposit.test_mode else '')
+    response = (session or requests).get(
+        url,
+        auth=(crossref_settings['crossref_username'], crossref_settings['crossref_password']),
+        timeout=60,
+    )
+
+    if response.status_code != 200:
+        print("Error polling deposit {0}: {1}".format(deposit.batch_id, response.status_code), file=sys.stderr)
+    else:
+        deposit.record_response(response)
+
+    return deposit.status
+
+
 def create_crossref_doi_identifier(article, doi_suffix=None):
     """ Creates (but does not register remotely) a Crossref DOI
 
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0001_initial'),
+        ('identifiers', '0002_auto_20170711_1203'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CrossrefDeposit',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('batch_id', models.CharField(help_text='The doi_batch_id sent in the deposit document.', max_length=255)),
+                ('deposit_id', models.CharField(blank=True, help_text='The batch ID given by Crossref.', max_length=255, null=True)),
+                ('status', models.CharField(default='pending', max_length=255)),
+                ('test_mode', models.BooleanField(default=False)),
+                ('response', models.TextField(blank=True, null=True)),
+                ('date_time', models.DateTimeField(auto_now_add=True)),
+                ('date_updated', models.DateTimeField(auto_now=True)),
+                ('identifiers', models.ManyToManyField(to='identifiers.Identifier')),
+                ('journal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='journal.Journal')),
+            ],
+            options={
+                'ordering': ('-date_time',),
+            },
+        ),
+    ]
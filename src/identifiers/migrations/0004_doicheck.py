@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('identifiers', '0003_crossrefdeposit'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DOICheck',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('checked', models.DateTimeField()),
+                ('expected_url', models.URLField(max_length=500)),
+                ('resolves_to', models.URLField(blank=True, max_length=500, null=True)),
+                ('status_code', models.PositiveIntegerField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('ok', models.BooleanField(default=False)),
+                ('identifier', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='identifiers.Identifier')),
+            ],
+        ),
+    ]
@@ -63,3 +63,61 @@ class BrokenDOI(models.Model):
     checked = models.DateTimeField()
     resolves_to = models.URLField()
     expected_to_resolve_to = models.URLField()
+
+
+class CrossrefDeposit(models.Model):
+    journal = models.ForeignKey('journal.Journal')
+    identifiers = models.ManyToManyField(Identifier)
+    batch_id = models.CharField(max_length=255, help_text='The doi_batch_id sent in the deposit document.')
+    deposit_id = models.CharField(max_length=255, blank=True, null=True, help_text='The batch ID given by Crossref.')
+    status = models.CharField(max_length=255, default='pending')
+    test_mode = models.BooleanField(default=False)
+    response = models.TextField(blank=True, null=True)
+    date_time = models.DateTimeField(auto_now_add=True)
+    date_updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ('-date_time',)
+
+    def __str__(self):
+        return 'Crossref deposit {0}: {1}'.format(self.batch_id, self.status)
+
+    def record_response(self, response, error=None):
+        """ Records the outcome of a deposit or status request to Crossref.
+
+        :param response: a requests Response, or None if the request failed
+        :param error: the exception raised when the request failed
+        :return: None
+        """
+        if response is None:
+            self.status = 'error'
+            self.response = str(error)
+        elif response.status_code != 200:
+            self.status = 'error'
+            self.response = '{0}: {1}'.format(response.status_code, response.text)
+        else:
+            self.response = response.text
+
+            try:
+                message = response.json()['message']
+                self.deposit_id = message.get('batch-id', self.deposit_id)
+                self.status = message.get('status', self.status)
+            except (ValueError, KeyError, TypeError, AttributeError):
+                # an accepted request with a body we cannot read is kept, raw, for inspection
+                self.status = 'error'
+
+        self.save()
+
+
+class DOICheck(models.Model):
+    """ The latest resolution check of a DOI, used to skip DOIs that resolved correctly recently. """
+    identifier = models.OneToOneField(Identifier, on_delete=models.CASCADE)
+    checked = models.DateTimeField()
+    expected_url = models.URLField(max_length=500)
+    resolves_to = models.URLField(max_length=500, blank=True, null=True)
+    status_code = models.PositiveIntegerField(blank=True, null=True)
+    error = models.TextField(blank=True, null=True)
+    ok = models.BooleanField(default=False)
+
+    def __str__(self):
+        return '{0}: {1}'.format(self.identifier.identifier, 'ok' if self.ok else 'broken')
@@ -0,0 +1,161 @@
+__copyright__ = "Copyright 2017 Birkbeck, University of London"
+__author__ = "Martin Paul Eve & Andy Byers"
+__license__ = "AGPL v3"
+__maintainer__ = "Birkbeck Centre for Technology and Publishing"
+
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from urllib.parse import urljoin, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from django.utils import timezone
+
+from cron import models as cron_models
+from identifiers import models as ident_models
+from utils import setting_handler
+from utils.shared import RateLimiter
+
+DOI_RESOLVER = 'https://doi.org/'
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+# servers that refuse HEAD requests are asked again with GET
+HEAD_REFUSED_CODES = (403, 405, 501)
+
+Resolution = namedtuple('Resolution', ['url', 'status_code', 'error'])
+
+
+def resolve(session, limiter, url, max_redirects=10, timeout=30):
+    """ Follows a URL's redirects one hop at a time, waiting on the rate limiter for each host visited.
+
+    HEAD requests are used where the server accepts them so that no page bodies are downloaded.
+
+    :param session: a requests Session, whose connections are reused between calls
+    :param limiter: a RateLimiter keyed on host name
+    :param url: the URL to resolve
+    :param max_redirects: the number of redirects to follow before giving up
+    :param timeout: seconds to wait for each response
+    :return: a Resolution of the final URL, its status code and any error
+    """
+    for _ in range(max_redirects + 1):
+        limiter.wait(urlparse(url).netloc)
+
+        try:
+            response = session.head(url, allow_redirects=False, timeout=timeout)
+
+            if response.status_code in HEAD_REFUSED_CODES:
+                response = session.get(url, allow_redirects=False, timeout=timeout, stream=True)
+                response.close()
+        except requests.RequestException as e:
+            return Resolution(url, None, str(e))
+
+        if response.status_code in REDIRECT_CODES and response.headers.get('Location'):
+            url = urljoin(url, response.headers['Location'])
+        else:
+            return Resolution(url, response.status_code, None)
+
+    return Resolution(url, None, 'Too many redirects')
+
+
+def expected_urls(identifiers):
+    """ Works out where each DOI should resolve to.
+
+    :param identifiers: a queryset of DOI Identifiers
+    :return: a list of (Identifier, expected URL) tuples
+    """
+    request = cron_models.Request()
+    secure = {}
+    urls = []
+
+    for identifier in identifiers.select_related('article__journal'):
+        journal = identifier.article.journal
+
+        if journal.pk not in secure:
+            secure[journal.pk] = setting_handler.get_setting('general', 'is_secure', journal).processed_value
+
+        request.secure = secure[journal.pk]
+        urls.append((identifier, "{0}{1}".format(journal.full_url(request), identifier.article.local_url)))
+
+    return urls
+
+
+def check_dois(identifiers, resolver=DOI_RESOLVER, workers=8, rate=5, ttl=timedelta(days=7), force=False):
+    """ Checks that DOIs resolve to their articles, recording the results and any BrokenDOIs.
+
+    DOIs that resolved correctly within the ttl, and whose expected URL has not changed since, are skipped unless force
+    is set. The rest are resolved concurrently over a shared session, with at most `rate` requests per second sent to
+    any one host.
+
+    :param identifiers: a queryset of DOI Identifiers
+    :param resolver: the base URL of the DOI resolver, eg. a local fake resolver in tests
+    :param workers: the number of DOIs to resolve at once
+    :param rate: requests per second per host
+    :param ttl: a timedelta for which a successful check is trusted
+    :param force: check every DOI regardless of previous results
+    :return: a report dictionary
+    """
+    to_check = expected_urls(identifiers)
+    previous = {check.identifier_id: check for check in ident_models.DOICheck.objects.filter(
+        identifier__in=[identifier for identifier, _ in to_check])}
+    now = timezone.now()
+
+    report = {'checked': 0, 'skipped': 0, 'ok': 0, 'broken': [], 'errors': []}
+
+    if not force:
+        pending = []
+
+        for identifier, expected in to_check:
+            check = previous.get(identifier.pk)
+
+            if check and check.ok and check.expected_url == expected and check.checked >= now - ttl:
+                report['skipped'] += 1
+            else:
+                pending.append((identifier, expected))
+
+        to_check = pending
+
+    limiter = RateLimiter(rate)
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    def check(item):
+        return resolve(session, limiter, urljoin(resolver, item[0].identifier))
+
+    with session, ThreadPoolExecutor(max_workers=workers) as executor:
+        for (identifier, expected), resolution in zip(to_check, executor.map(check, to_check)):
+            report['checked'] += 1
+            ok = resolution.error is None and resolution.url == expected
+
+            ident_models.DOICheck.objects.update_or_create(identifier=identifier, defaults={
+                'checked': timezone.now(),
+                'expected_url': expected,
+                'resolves_to': resolution.url,
+                'status_code': resolution.status_code,
+                'error': resolution.error,
+                'ok': ok,
+            })
+
+            result = {'article': identifier.article_id, 'doi': identifier.identifier, 'expected': expected,
+                      'resolves_to': resolution.url, 'status_code': resolution.status_code}
+
+            if resolution.error:
+                # a network failure says nothing about where the DOI points, so BrokenDOI records are left alone
+                result['error'] = resolution.error
+                report['errors'].append(result)
+            elif ok:
+                report['ok'] += 1
+                ident_models.BrokenDOI.objects.filter(identifier=identifier).delete()
+            else:
+                broken, created = ident_models.BrokenDOI.objects.get_or_create(
+                    identifier=identifier,
+                    defaults={'checked': timezone.now(),
+                              'resolves_to': resolution.url,
+                              'expected_to_resolve_to': expected}
+                )
+                result['new'] = created
+                report['broken'].append(result)
+
+    return report
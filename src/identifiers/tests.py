@@ -0,0 +1,195 @@
+__copyright__ = "Copyright 2017 Birkbeck, University of London"
+__author__ = "Martin Paul Eve & Andy Byers"
+__license__ = "AGPL v3"
+__maintainer__ = "Birkbeck Centre for Technology and Publishing"
+import json
+import re
+import threading
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+import requests
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from mock import patch
+
+from core import models as core_models
+from identifiers import logic, models, resolver
+from journal import models as journal_models
+from submission import models as submission_models
+from utils.shared import RateLimiter
+
+
+class FakeResolverHandler(BaseHTTPRequestHandler):
+    """ Redirects /10.1234/redirect to an article and refuses HEAD requests for /10.1234/get-only. """
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        if self.path == '/10.1234/redirect':
+            self.send_response(302)
+            self.send_header('Location', '/article/1/')
+        elif self.path == '/10.1234/get-only':
+            self.send_response(405)
+        else:
+            self.send_response(200)
+
+        self.end_headers()
+
+    def do_GET(self):
+        self.send_response(302)
+        self.send_header('Location', '/article/2/')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+
+class DOIResolverTests(SimpleTestCase):
+
+    def setUp(self):
+        self.server = HTTPServer(('127.0.0.1', 0), FakeResolverHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = 'http://127.0.0.1:{0}'.format(self.server.server_port)
+        self.session = requests.Session()
+
+    def tearDown(self):
+        self.session.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_resolve_follows_redirects_with_head(self):
+        resolution = resolver.resolve(self.session, RateLimiter(), self.base_url + '/10.1234/redirect')
+
+        self.assertEqual(resolution, resolver.Resolution(self.base_url + '/article/1/', 200, None))
+
+    def test_resolve_falls_back_to_get_when_head_is_refused(self):
+        resolution = resolver.resolve(self.session, RateLimiter(), self.base_url + '/10.1234/get-only')
+
+        self.assertEqual(resolution.url, self.base_url + '/article/2/')
+        self.assertIsNone(resolution.error)
+
+    def test_resolve_reports_connection_errors(self):
+        self.server.shutdown()
+        self.server.server_close()
+        resolution = resolver.resolve(self.session, RateLimiter(), self.base_url + '/10.1234/redirect', timeout=1)
+
+        self.assertIsNotNone(resolution.error)
+
+
+class FakeCrossrefHandler(BaseHTTPRequestHandler):
+    """ Accepts deposits, except those holding a bad-json DOI, which get an unreadable body, and those holding a
+    server-error DOI, which get a 500. """
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        document = self.rfile.read(int(self.headers['Content-Length'])).decode('utf-8')
+        batch_id = re.search('<doi_batch_id>(.*)</doi_batch_id>', document).group(1)
+        self.server.deposits.append((batch_id, re.findall('<doi>(.*?)</doi>', document)))
+
+        if 'bad-json' in document:
+            status, body = 200, 'Deposit received'
+        elif 'server-error' in document:
+            status, body = 500, 'Internal Server Error'
+        else:
+            status, body = 200, json.dumps({'message': {'batch-id': 'crossref-' + batch_id, 'status': 'submitted'}})
+
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body.encode('utf-8'))
+
+
+def fake_crossref_batch(journal, identifiers, crossref_settings, batch_id):
+    return '<doi_batch_id>{0}</doi_batch_id>{1}'.format(
+        batch_id, ''.join('<doi>{0}</doi>'.format(identifier.identifier) for identifier in identifiers))
+
+
+@override_settings(LOG_ENTRY_BUFFER=False)
+@patch('identifiers.logic.build_crossref_batch', fake_crossref_batch)
+@patch('identifiers.logic.get_crossref_settings', lambda journal: {
+    'use_crossref': True, 'crossref_test': True, 'crossref_username': 'user', 'crossref_password': 'pass'})
+class CrossrefBatchTests(TestCase):
+
+    def setUp(self):
+        self.server = HTTPServer(('127.0.0.1', 0), FakeCrossrefHandler)
+        self.server.deposits = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = 'http://127.0.0.1:{0}/deposits'.format(self.server.server_port)
+
+        self.journal = journal_models.Journal(code="TST", domain="testserver")
+        self.journal.save()
+
+        user = core_models.Account.objects.create_user(email="crossrefuser@martineve.com",
+                                                       username="crossrefuser@martineve.com")
+
+        for doi in ['10.1234/ok-1', '10.1234/ok-2', '10.1234/bad-json-1', '10.1234/bad-json-2',
+                    '10.1234/server-error-1', '10.1234/server-error-2', '10.1234/ok-3']:
+            article = submission_models.Article(owner=user, title="A Test Article", abstract="An abstract",
+                                                stage=submission_models.STAGE_PUBLISHED,
+                                                date_published=timezone.now(), journal=self.journal)
+            article.save()
+            models.Identifier.objects.create(id_type='doi', identifier=doi, article=article)
+
+        self.identifiers = models.Identifier.objects.filter(article__journal=self.journal).order_by('pk')
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def register(self):
+        deposits = logic.register_crossref_batch(self.journal, self.identifiers, chunk_size=2, max_workers=2,
+                                                 server=self.url)
+
+        return {deposit.batch_id: models.CrossrefDeposit.objects.get(pk=deposit.pk) for deposit in deposits}
+
+    def test_deposits_are_chunked(self):
+        deposits = self.register()
+        received = dict(self.server.deposits)
+
+        self.assertEqual(len(deposits), 4)
+        self.assertEqual(len(self.server.deposits), 4)
+        self.assertEqual(set(received), set(deposits))
+
+        for batch_id, deposit in deposits.items():
+            self.assertEqual(sorted(deposit.identifiers.values_list('identifier', flat=True)),
+                             sorted(received[batch_id]))
+
+        self.assertEqual(sorted(len(dois) for dois in received.values()), [1, 2, 2, 2])
+
+    def test_accepted_deposits_record_the_crossref_batch_id(self):
+        accepted = [deposit for deposit in self.register().values() if deposit.identifiers.filter(
+            identifier__contains='ok').exists()]
+
+        self.assertEqual(len(accepted), 2)
+
+        for deposit in accepted:
+            self.assertEqual(deposit.deposit_id, 'crossref-' + deposit.batch_id)
+            self.assertEqual(deposit.status, 'submitted')
+
+    def test_unreadable_and_failed_responses_are_recorded_as_errors(self):
+        deposits = self.register().values()
+        unreadable = [deposit for deposit in deposits if deposit.identifiers.filter(
+            identifier__contains='bad-json').exists()]
+        failed = [deposit for deposit in deposits if deposit.identifiers.filter(
+            identifier__contains='server-error').exists()]
+
+        self.assertEqual(len(unreadable), 1)
+        self.assertEqual(unreadable[0].status, 'error')
+        self.assertEqual(unreadable[0].response, 'Deposit received')
+        self.assertIsNone(unreadable[0].deposit_id)
+
+        self.assertEqual(len(failed), 1)
+        self.assertEqual(failed[0].status, 'error')
+        self.assertEqual(failed[0].response, '500: Internal Server Error')
+
+    def test_connection_errors_are_recorded(self):
+        self.server.shutdown()
+        self.server.server_close()
+        deposits = self.register().values()
+
+        self.assertEqual(len(deposits), 4)
+
+        for deposit in deposits:
+            self.assertEqual(deposit.status, 'error')
+            self.assertTrue(deposit.response)
@@ -3,8 +3,11 @@ __author__ = "Martin Paul Eve & Andy Byers"
 __license__ = "AGPL v3"
 __maintainer__ = "Birkbeck Centre for Technology and Publishing"
 
+import os
+import time
 from os import listdir, makedirs
 from os.path import isfile, join
+from uuid import uuid4
 import requests
 from dateutil import parser as dateparser
 
@@ -12,11 +15,14 @@ from django.contrib import messages
 from django.conf import settings
 from django.shortcuts import redirect, get_object_or_404
 from django.urls import reverse
-from django.template.loader import get_template
+from django.template.loader import get_template, render_to_string
+from django.utils import timezone
 
+from cms import models as cms_models
 from core import models as core_models, files
 from journal import models as journal_models, issue_forms
 from identifiers import models as identifier_models
+from submission import models as submission_models
 from utils import render_template, notify_helpers
 from utils.notify_plugins import notify_email
 from events import logic as event_logic
@@ -90,6 +96,23 @@ def list_galleys(article, galleys):
     return ''
 
 
+def render_xml_galleys(article):
+    """ Renders an article's XML galleys so that the stored HTML is ready before anyone views the article.
+
+    :param article: the article to handle
+    :return: the number of galleys rendered
+    """
+    galleys = core_models.Galley.objects.filter(
+        article=article,
+        file__mime_type__in=['application/xml', 'text/xml'],
+    ).select_related('file', 'article__journal')
+
+    for galley in galleys:
+        galley.file_content()
+
+    return len(galleys)
+
+
 def get_doi_data(article):
     try:
         doi = identifier_models.Identifier.objects.get(id_type='doi', article=article)
@@ -282,6 +305,15 @@ def handle_article_controls(request, sections):
         return page, show, filters, sort, None, active_filters
 
 
+def article_session_variables(request):
+    """ Returns the article list controls stored in the session, which the cached articles page varies on.
+
+    :param request: the request object
+    :return: a list of the filters, page size, sort order and active filter flag
+    """
+    return [request.session.get(key) for key in ('article_filters', 'article_show', 'article_sort', 'active_filters')]
+
+
 def set_article_session_variables(request, page, filters, show, sort):
     request.session['article_filters'] = filters
     request.session['article_show'] = show
@@ -341,3 +373,200 @@ def create_html_snippet(note):
     html_content = template.render({'note': note})
 
     return html_content
+
+
+def sitemap_chunk_size():
+    return getattr(settings, 'SITEMAP_CHUNK_SIZE', 1000)
+
+
+def sitemap_directory(model_name, object_id):
+    """ Returns the directory that rendered sitemaps for a journal or press are stored in.
+
+    :param model_name: 'journal' or 'press'
+    :param object_id: the pk of the journal or press
+    :return: a path
+    """
+    root = getattr(settings, 'SITEMAP_DIR', join(settings.BASE_DIR, 'files', 'sitemaps'))
+    return join(root, '{0}_{1}'.format(model_name, object_id))
+
+
+def sitemap_articles(journal):
+    return submission_models.Article.objects.filter(date_published__lte=timezone.now(), journal=journal)
+
+
+def sitemap_chunk_range(chunk):
+    """ Articles are split into chunks by fixed pk ranges so the chunk an article belongs to never changes. """
+    size = sitemap_chunk_size()
+    return chunk * size, (chunk + 1) * size
+
+
+def get_sitemap_index(request):
+    """ Returns the sitemap index for the current site, listing the pages sitemap and each chunk of articles.
+
+    :param request: the request object
+    :return: the rendered XML
+    """
+    def render():
+        sitemaps = [{'loc': base_url + reverse('journal_sitemap_pages'), 'lastmod': None}]
+
+        if request.journal:
+            size = sitemap_chunk_size()
+            chunks = {}
+
+            for pk, date_published, date_updated in sitemap_articles(request.journal).values_list(
+                    'pk', 'date_published', 'date_updated').order_by('pk'):
+                modified = max(date_published, date_updated or date_published)
+                chunk = pk // size
+                chunks[chunk] = max(chunks.get(chunk, modified), modified)
+
+            sitemaps.extend({'loc': base_url + reverse('journal_sitemap_articles', kwargs={'chunk': chunk}),
+                             'lastmod': lastmod} for chunk, lastmod in sorted(chunks.items()))
+
+        return render_to_string('journal/sitemap_index.xml', {'sitemaps': sitemaps}, request)
+
+    base_url = request.journal_base_url if request.journal else request.press_base_url
+
+    return _cached_sitemap(request, 'index.xml', render)
+
+
+def get_sitemap_articles(request, chunk):
+    """ Returns the sitemap for one chunk of the current journal's articles.
+
+    :param request: the request object
+    :param chunk: the chunk number
+    :return: the rendered XML, or None if the chunk holds no published articles
+    """
+    def render():
+        start, end = sitemap_chunk_range(chunk)
+        articles = sitemap_articles(request.journal).filter(pk__gte=start, pk__lt=end).select_related(
+            'journal').order_by('pk')
+
+        if not articles:
+            return None
+
+        return render_to_string('journal/sitemap.xml', {'articles': articles}, request)
+
+    return _cached_sitemap(request, 'articles_{0}.xml'.format(chunk), render)
+
+
+def get_sitemap_pages(request):
+    """ Returns the sitemap of CMS pages for the current journal or press.
+
+    :param request: the request object
+    :return: the rendered XML
+    """
+    def render():
+        cms_pages = cms_models.Page.objects.filter(object_id=request.site_type.id,
+                                                   content_type=request.model_content_type)
+        return render_to_string('journal/sitemap.xml', {'cms_pages': cms_pages}, request)
+
+    return _cached_sitemap(request, 'pages.xml', render)
+
+
+def _cached_sitemap(request, name, render):
+    """ Reads a rendered sitemap from disk, rendering and storing it first if it is missing.
+
+    Stored sitemaps are removed when an article or page they list is saved. Articles published with a future date do
+    not appear until that date, so the earliest one is recorded and everything is discarded once it has passed.
+    """
+    directory = sitemap_directory(request.model_content_type.model, request.site_type.pk)
+    path = join(directory, name)
+
+    _expire_sitemaps(directory)
+
+    try:
+        with open(path) as sitemap_file:
+            return sitemap_file.read()
+    except FileNotFoundError:
+        pass
+
+    content = render()
+
+    if content is None:
+        return None
+
+    makedirs(directory, exist_ok=True)
+    _write_atomic(path, content)
+
+    if request.journal:
+        scheduled = submission_models.Article.objects.filter(
+            journal=request.journal,
+            date_published__gt=timezone.now(),
+        ).order_by('date_published').values_list('date_published', flat=True).first()
+
+        if scheduled:
+            _set_sitemap_expiry(directory, scheduled.timestamp())
+
+    return content
+
+
+def _write_atomic(path, content):
+    temp_path = '{0}.{1}.tmp'.format(path, uuid4().hex)
+
+    with open(temp_path, 'w') as temp_file:
+        temp_file.write(content)
+
+    os.replace(temp_path, path)
+
+
+def _expire_sitemaps(directory):
+    try:
+        with open(join(directory, 'expires')) as expires_file:
+            expires = float(expires_file.read())
+    except (FileNotFoundError, ValueError):
+        return
+
+    if expires <= time.time():
+        clear_sitemaps(directory)
+
+
+def _set_sitemap_expiry(directory, expires):
+    try:
+        with open(join(directory, 'expires')) as expires_file:
+            if float(expires_file.read()) <= expires:
+                return
+    except (FileNotFoundError, ValueError):
+        pass
+
+    _write_atomic(join(directory, 'expires'), str(expires))
+
+
+def clear_sitemaps(directory, names=None):
+    """ Removes stored sitemaps so that they are rendered again on the next request.
+
+    :param directory: the sitemap directory of a journal or press
+    :param names: the sitemap file names to remove, or None to remove all of them
+    :return: None
+    """
+    if names is None:
+        try:
+            names = [name for name in listdir(directory) if not name.endswith('.tmp')]
+        except FileNotFoundError:
+            return
+
+    for name in names:
+        try:
+            os.remove(join(directory, name))
+        except FileNotFoundError:
+            pass
+
+
+def invalidate_article_sitemap(article):
+    """ Removes the stored sitemap chunk holding an article, and the index that lists it. Called on save.
+
+    :param article: an Article with a pk
+    :return: None
+    """
+    if article.journal_id:
+        clear_sitemaps(sitemap_directory('journal', article.journal_id),
+                       ['index.xml', 'articles_{0}.xml'.format(article.pk // sitemap_chunk_size())])
+
+
+def invalidate_page_sitemap(page):
+    """ Removes the stored sitemap of CMS pages for the journal or press a page belongs to. Called on save.
+
+    :param page: a cms Page
+    :return: None
+    """
+    if page.content_type_id and page.object_id:
+        clear_sitemaps(sitemap_directory(page.content_type.model, page.object_id), ['pages.xml'])
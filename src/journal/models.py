@@ -7,12 +7,16 @@ import collections
 import uuid
 import os
 
+from django.core.cache import cache as django_cache
 from django.db import models
+from django.db.models import OuterRef, Subquery
 from django.utils import timezone
 from django.conf import settings
 from django.core.files.storage import FileSystemStorage
 from django.urls import reverse
+from django.utils.translation import get_language
 
+from core import page_cache
 from utils.function_cache import cache
 from utils import setting_handler
 from submission import models as submission_models
@@ -95,6 +99,10 @@ class Journal(models.Model):
     def __str__(self):
         return u'{0}: {1}'.format(self.code, self.domain)
 
+    def save(self, *args, **kwargs):
+        super(Journal, self).save(*args, **kwargs)
+        page_cache.bump_content_version(self.pk)
+
     @staticmethod
     def override_cover(request, absolute=True):
         if request.journal.press_image_override:
@@ -334,52 +342,102 @@ class Issue(models.Model):
 
     @property
     def manage_issue_list(self):
-        articles = self.articles.all()
-
-        ordered_list = list()
-        for article in articles:
-            ordered_list.append({'article': article, 'order': self.get_article_order(article)})
+        articles = self.with_article_order(self.articles.all())
 
-        return sorted(ordered_list, key=itemgetter('order'))
+        return sorted([{'article': article, 'order': article.issue_order or 0} for article in articles],
+                      key=itemgetter('order'))
 
     @property
     def issue_articles(self):
         # this property should be used to display article ToCs since it enforces visibility of Published items
-        articles = self.articles.filter(stage=submission_models.STAGE_PUBLISHED)
+        articles = self.with_article_order(self.articles.filter(stage=submission_models.STAGE_PUBLISHED))
 
-        ordered_list = list()
-        for article in articles:
-            ordered_list.append({'article': article, 'order': self.get_article_order(article)})
+        return sorted([{'article': article, 'order': article.issue_order or 0} for article in articles],
+                      key=itemgetter('order'))
 
-        return sorted(ordered_list, key=itemgetter('order'))
+    def with_article_order(self, articles):
+        """ Annotates articles with their ArticleOrdering in this issue, as issue_order, which is None if unordered.
+
+        :param articles: a queryset of Articles
+        :return: the annotated queryset
+        """
+        return articles.annotate(issue_order=Subquery(
+            ArticleOrdering.objects.filter(issue=self, article=OuterRef('pk')).values('order')[:1]))
 
     def structure(self, articles):
+        """ Groups articles by section in table of contents order.
+
+        Sections with a SectionOrdering come first, then the rest in the order their first article appears. Articles
+        with an ArticleOrdering come first, then the rest in the order given.
+
+        :param articles: a queryset of Articles in this issue
+        :return: an OrderedDict of section display name to a list of Articles
+        """
         structure = collections.OrderedDict()
+        section_names = {}
+
+        def section_name(section):
+            if section.pk not in section_names:
+                section_names[section.pk] = section.issue_display()
+
+            return section_names[section.pk]
 
         # first add any sections that are explicitly ordered within this issue
-        ordered_sections = SectionOrdering.objects.filter(issue=self).order_by('order')
+        ordered_sections = SectionOrdering.objects.filter(issue=self).select_related('section').order_by('order')
 
         for ordered_section in ordered_sections:
-            if ordered_section.section.issue_display() not in structure:
-                structure[ordered_section.section.issue_display()] = []
-
-        # now add any articles that are explicitly ordered
-        ordered_articles = ArticleOrdering.objects.filter(issue=self).order_by('order')
-        for article_object in ordered_articles:
-            if article_object.article.section.issue_display() not in structure:
-                structure[article_object.article.section.issue_display()] = []
-            if article_object.article not in structure[article_object.article.section.issue_display()]:
-                structure[article_object.article.section.issue_display()].append(article_object.article)
-
-        # now add any remaining articles
+            structure.setdefault(section_name(ordered_section.section), [])
+
+        # then the articles, explicitly ordered ones first; sorted() is stable so the rest keep their given order
+        articles = sorted(self.with_article_order(articles),
+                          key=lambda article: (article.issue_order is None, article.issue_order or 0))
+
         for article_object in articles:
-            if article_object.section.issue_display() not in structure:
-                structure[article_object.section.issue_display()] = []
-            if article_object not in structure[article_object.section.issue_display()]:
-                structure[article_object.section.issue_display()].append(article_object)
+            structure.setdefault(section_name(article_object.section), []).append(article_object)
+
+        return structure
+
+    def toc_articles(self):
+        return self.articles.all().order_by('section', 'page_numbers').select_related(
+            'section', 'thumbnail_image_file', 'primary_issue').prefetch_related(
+            'authors', 'frozenauthor_set', 'manuscript_files')
+
+    def table_of_contents(self):
+        """ Returns the structure of this issue's articles from the cache, building it if needed.
+
+        The cache is invalidated by Issue.invalidate_toc whenever articles are added, removed, reordered or saved.
+
+        :return: an OrderedDict of section display name to a list of Articles
+        """
+        key = 'issue_toc_{0}_{1}_{2}'.format(self.pk, Issue.toc_version(self.pk), get_language())
+        structure = django_cache.get(key)
+
+        if structure is None:
+            structure = self.structure(self.toc_articles())
+            django_cache.set(key, structure, getattr(settings, 'ISSUE_TOC_CACHE_TIMEOUT', 3600))
 
         return structure
 
+    @staticmethod
+    def toc_version(issue_id):
+        key = 'issue_toc_version_{0}'.format(issue_id)
+        version = django_cache.get(key)
+
+        if version is None:
+            django_cache.add(key, uuid.uuid4().hex, None)
+            version = django_cache.get(key)
+
+        return version
+
+    @staticmethod
+    def invalidate_toc(*issue_ids):
+        """ Discards the cached tables of contents of the given issues, in every language.
+
+        :param issue_ids: Issue primary keys
+        :return: None
+        """
+        django_cache.delete_many(['issue_toc_version_{0}'.format(issue_id) for issue_id in issue_ids])
+
     @property
     def article_pks(self):
         return [article.pk for article in self.articles.all()]
@@ -399,6 +457,11 @@ class Issue(models.Model):
         orderings = [ordering.order for ordering in ArticleOrdering.objects.filter(issue=self)]
         return max(orderings) + 1 if orderings else 0
 
+    def save(self, *args, **kwargs):
+        super(Issue, self).save(*args, **kwargs)
+        Issue.invalidate_toc(self.pk)
+        page_cache.bump_content_version(self.journal_id)
+
     def __str__(self):
         return u'{0}: {1} {2} ({3})'.format(self.volume, self.issue, self.issue_title, self.date.year)
 
@@ -411,6 +474,16 @@ class SectionOrdering(models.Model):
     issue = models.ForeignKey(Issue)
     order = models.PositiveIntegerField(default=1)
 
+    def save(self, *args, **kwargs):
+        super(SectionOrdering, self).save(*args, **kwargs)
+        Issue.invalidate_toc(self.issue_id)
+        page_cache.bump_content_version(self.issue.journal_id)
+
+    def delete(self, *args, **kwargs):
+        Issue.invalidate_toc(self.issue_id)
+        page_cache.bump_content_version(self.issue.journal_id)
+        return super(SectionOrdering, self).delete(*args, **kwargs)
+
     def __str__(self):
         return "{0}: {1}, {2}".format(self.order, self.issue.issue_title, self.section)
 
@@ -423,6 +496,16 @@ class ArticleOrdering(models.Model):
     class Meta:
         unique_together = ('article', 'issue')
 
+    def save(self, *args, **kwargs):
+        super(ArticleOrdering, self).save(*args, **kwargs)
+        Issue.invalidate_toc(self.issue_id)
+        page_cache.bump_content_version(self.issue.journal_id)
+
+    def delete(self, *args, **kwargs):
+        Issue.invalidate_toc(self.issue_id)
+        page_cache.bump_content_version(self.issue.journal_id)
+        return super(ArticleOrdering, self).delete(*args, **kwargs)
+
     def __str__(self):
         return "{0}: {1}, {2}".format(self.order, self.issue.issue_title, self.article.title)
 
@@ -0,0 +1,276 @@
+__copyright__ = "Copyright 2017 Birkbeck, University of London"
+__author__ = "Martin Paul Eve & Andy Byers"
+__license__ = "AGPL v3"
+__maintainer__ = "Birkbeck Centre for Technology and Publishing"
+
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from bs4 import BeautifulSoup
+from django.conf import settings
+from django.utils import timezone
+
+from core import models as core_models
+from submission import models as submission_models
+
+# Column weights for ranking with bm25, in the order the columns are declared.
+COLUMN_WEIGHTS = (10.0, 5.0, 4.0, 4.0, 2.0, 1.0)
+TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+_local = threading.local()
+
+
+def search_enabled():
+    return getattr(settings, 'SEARCH_INDEX', False)
+
+
+def index_path():
+    default = os.path.join(settings.BASE_DIR, 'files', 'search', 'articles.sqlite3')
+    return getattr(settings, 'SEARCH_INDEX_PATH', default)
+
+
+def get_connection():
+    """ Returns this thread's connection to the SQLite FTS5 article index, creating the index if needed.
+
+    :return: a sqlite3 Connection
+    """
+    path = index_path()
+    connection = getattr(_local, 'connection', None)
+
+    if connection is None or _local.path != path:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        connection = sqlite3.connect(path, timeout=30)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute(
+            'CREATE VIRTUAL TABLE IF NOT EXISTS article_index USING fts5('
+            'title, subtitle, keywords, authors, abstract, body, '
+            'journal UNINDEXED, published UNINDEXED, '
+            "tokenize='unicode61 remove_diacritics 1')"
+        )
+        _local.connection, _local.path = connection, path
+
+    return connection
+
+
+def build_query(search_term):
+    """ Turns free text into an FTS5 query matching every word, treating the last word as a prefix. """
+    tokens = TOKEN_PATTERN.findall(search_term or '')
+
+    if not tokens:
+        return None
+
+    terms = ['"{0}"'.format(token) for token in tokens]
+    terms[-1] += '*'
+
+    return ' '.join(terms)
+
+
+def is_indexable(article):
+    return article.stage == submission_models.STAGE_PUBLISHED and article.date_published is not None
+
+
+def galley_text(article):
+    """ Extracts the text of an article's HTML and XML galleys, using the stored XML renditions where available.
+
+    :param article: the Article
+    :return: a string
+    """
+    text = []
+    galleys = core_models.Galley.objects.filter(
+        article=article,
+        file__mime_type__in=['text/html', 'application/xml', 'text/xml'],
+    ).select_related('file', 'article__journal')
+
+    for galley in galleys:
+        content = galley.file_content()
+
+        if content:
+            text.append(BeautifulSoup(str(content), 'lxml').get_text(' '))
+
+    return ' '.join(text)
+
+
+def index_article(article, body=None):
+    """ Adds or updates an article in the index, or removes it if it is not published.
+
+    :param article: the Article
+    :param body: the article's galley text, or None to keep the text already indexed
+    :return: None
+    """
+    with get_connection() as connection:
+        _write_article(connection, article, body)
+
+
+def update_article(article):
+    """ Indexes an article as it is saved, queueing a cron task to try again if the index cannot be written, eg. because
+    it is locked, so that the save itself still succeeds.
+
+    :param article: the Article
+    :return: None
+    """
+    try:
+        index_article(article)
+    except sqlite3.Error as e:
+        print('Error indexing article {0}, queued for retry: {1}'.format(article.pk, e))
+        from cron import models as cron_models
+        cron_models.CronTask.add_search_index_task(article.pk)
+
+
+def drop_article(article_pk):
+    """ Removes a deleted article from the index, queueing a cron task to try again if the index cannot be written.
+
+    :param article_pk: the pk of the Article
+    :return: None
+    """
+    try:
+        remove_article(article_pk)
+    except sqlite3.Error as e:
+        print('Error removing article {0} from the index, queued for retry: {1}'.format(article_pk, e))
+        from cron import models as cron_models
+        cron_models.CronTask.add_search_index_task(article_pk)
+
+
+def _write_article(connection, article, body):
+    if not is_indexable(article):
+        connection.execute('DELETE FROM article_index WHERE rowid = ?', (article.pk,))
+        return
+
+    if body is None:
+        row = connection.execute('SELECT body FROM article_index WHERE rowid = ?', (article.pk,)).fetchone()
+        body = row[0] if row else ''
+
+    _write_row(connection, _article_row(article, body))
+
+
+def _article_row(article, body):
+    # everything that needs the main database is read here, before any index transaction is opened
+    authors = ' '.join(author.full_name() for author in article.frozenauthor_set.all())
+    keywords = ' '.join(keyword.word for keyword in article.keywords.all())
+
+    return (article.pk, article.title or '', article.subtitle or '', keywords, authors,
+            BeautifulSoup(article.abstract or '', 'lxml').get_text(' '), body, article.journal_id,
+            article.date_published.timestamp())
+
+
+def _write_row(connection, row):
+    connection.execute('DELETE FROM article_index WHERE rowid = ?', (row[0],))
+    connection.execute(
+        'INSERT INTO article_index (rowid, title, subtitle, keywords, authors, abstract, body, journal, published) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        row,
+    )
+
+
+def remove_article(article_pk):
+    with get_connection() as connection:
+        connection.execute('DELETE FROM article_index WHERE rowid = ?', (article_pk,))
+
+
+def rebuild_index(articles, with_body=True, chunk_size=None):
+    """ Indexes the given articles from scratch, dropping anything else in the index.
+
+    Galley text and metadata are gathered outside of any index transaction, and rows are written in short transactions
+    of chunk_size articles, so articles saved during a rebuild can still update the index. Entries are replaced in
+    place and stale ones are only removed at the end, so searches carry on against the old index meanwhile.
+
+    :param articles: a queryset of Articles
+    :param with_body: whether to extract galley text
+    :param chunk_size: articles written per transaction, defaults to SEARCH_INDEX_CHUNK_SIZE
+    :return: the number of articles indexed
+    """
+    chunk_size = chunk_size or getattr(settings, 'SEARCH_INDEX_CHUNK_SIZE', 100)
+    connection = get_connection()
+    indexed = []
+    chunk = []
+
+    def write_chunk():
+        with connection:
+            for row in chunk:
+                _write_row(connection, row)
+
+        del chunk[:]
+
+    for article in articles.select_related('journal').iterator():
+        if is_indexable(article):
+            chunk.append(_article_row(article, galley_text(article) if with_body else ''))
+            indexed.append(article.pk)
+
+            if len(chunk) >= chunk_size:
+                write_chunk()
+
+    write_chunk()
+
+    with connection:
+        connection.execute('CREATE TEMP TABLE IF NOT EXISTS rebuilt (pk INTEGER PRIMARY KEY)')
+        connection.execute('DELETE FROM rebuilt')
+        connection.executemany('INSERT INTO rebuilt (pk) VALUES (?)', ((pk,) for pk in indexed))
+        connection.execute('DELETE FROM article_index WHERE rowid NOT IN (SELECT pk FROM rebuilt)')
+        connection.execute('DELETE FROM rebuilt')
+
+    with connection:
+        connection.execute("INSERT INTO article_index (article_index) VALUES ('optimize')")
+
+    return len(indexed)
+
+
+class SearchResults(object):
+    """ A ranked search of the index that can be handed to a Paginator.
+
+    Counting and slicing each run one indexed query, and a slice returns the matching Articles in rank order.
+    """
+
+    def __init__(self, search_term, journal=None):
+        self.query = build_query(search_term)
+        self.journal = journal
+        self._count = None
+
+    def _where(self):
+        clauses = ['article_index MATCH ?', 'published <= ?']
+        params = [self.query, time.time()]
+
+        if self.journal:
+            clauses.append('journal = ?')
+            params.append(self.journal.pk)
+
+        return ' AND '.join(clauses), params
+
+    def count(self):
+        if self._count is None:
+            if not self.query:
+                self._count = 0
+            else:
+                where, params = self._where()
+                self._count = get_connection().execute(
+                    'SELECT count(*) FROM article_index WHERE {0}'.format(where), params).fetchone()[0]
+
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+
+        if not self.query:
+            return []
+
+        start = key.start or 0
+        limit = -1 if key.stop is None else key.stop - start
+        where, params = self._where()
+        rows = get_connection().execute(
+            'SELECT rowid FROM article_index WHERE {0} ORDER BY bm25(article_index, {1}) LIMIT ? OFFSET ?'.format(
+                where, ', '.join(str(weight) for weight in COLUMN_WEIGHTS)),
+            params + [limit, start],
+        ).fetchall()
+
+        pks = [row[0] for row in rows]
+        articles = submission_models.Article.objects.filter(
+            pk__in=pks,
+            date_published__lte=timezone.now(),
+        ).select_related('journal').in_bulk()
+
+        return [articles[pk] for pk in pks if pk in articles]
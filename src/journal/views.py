@@ -24,9 +24,9 @@ from django.utils.translation import ugettext_lazy as _
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 
-from cms import models as cms_models
-from core import files, models as core_models, plugin_loader
-from journal import logic, models, issue_forms, forms
+from core import files, models as core_models, page_cache, plugin_loader
+from cron import models as cron_models
+from journal import logic, models, issue_forms, forms, search as search_index
 from journal.logic import list_galleys
 from metrics.logic import store_article_access
 from review import forms as review_forms
@@ -39,6 +39,7 @@ from utils import models as utils_models, shared
 
 
 @has_journal
+@page_cache.cache_public_page()
 def home(request):
     """ Renders a journal homepage.
 
@@ -48,25 +49,31 @@ def home(request):
     issues_objects = models.Issue.objects.filter(journal=request.journal)
     sections = submission_models.Section.objects.filter(journal=request.journal)
 
-    homepage_elements = core_models.HomepageElement.objects.filter(content_type=request.model_content_type,
-                                                                   object_id=request.journal.pk,
-                                                                   active=True).order_by('sequence')
+    def homepage_context():
+        homepage_elements = core_models.HomepageElement.objects.filter(content_type=request.model_content_type,
+                                                                       object_id=request.journal.pk,
+                                                                       active=True).order_by('sequence')
+        element_contexts = {'homepage_elements': list(homepage_elements)}
+
+        # call all registered plugin block hooks to get relevant contexts
+        for hook in settings.PLUGIN_HOOKS.get('yield_homepage_element_context', []):
+            hook_module = plugin_loader.import_module(hook.get('module'))
+            function = getattr(hook_module, hook.get('function'))
+            element_context = function(request, homepage_elements)
+
+            for k, v in element_context.items():
+                element_contexts[k] = v
+
+        return element_contexts
 
     template = 'journal/index.html'
     context = {
-        'homepage_elements': homepage_elements,
         'issues': issues_objects,
         'sections': sections,
     }
 
-    # call all registered plugin block hooks to get relevant contexts
-    for hook in settings.PLUGIN_HOOKS.get('yield_homepage_element_context', []):
-        hook_module = plugin_loader.import_module(hook.get('module'))
-        function = getattr(hook_module, hook.get('function'))
-        element_context = function(request, homepage_elements)
-
-        for k, v in element_context.items():
-            context[k] = v
+    # the element contexts are the same for every visitor, so logged in users are served them from the cache too
+    context.update(page_cache.cached_fragment(request, 'homepage_elements', homepage_context))
 
     return render(request, template, context)
 
@@ -93,6 +100,7 @@ def serve_journal_cover(request):
 
 
 @has_journal
+@page_cache.cache_public_page(vary_on=logic.article_session_variables)
 def articles(request):
     """ Renders the list of articles in the journal.
 
@@ -140,6 +148,7 @@ def articles(request):
 
 
 @has_journal
+@page_cache.cache_public_page()
 def issues(request):
     """ Renders the list of issues in the journal.
 
@@ -161,6 +170,7 @@ def current_issue(request, show_sidebar=True):
 
 
 @has_journal
+@page_cache.cache_public_page()
 def issue(request, issue_id, show_sidebar=True):
     """ Renders a specific issue in the journal.
 
@@ -170,18 +180,13 @@ def issue(request, issue_id, show_sidebar=True):
     :return: a rendered template of this issue
     """
     issue_object = get_object_or_404(models.Issue, pk=issue_id, journal=request.journal, issue_type='Issue')
-    articles = issue_object.articles.all().order_by('section',
-                                                    'page_numbers').prefetch_related('authors',
-                                                                                     'manuscript_files').select_related(
-        'section')
-
     issue_objects = models.Issue.objects.filter(journal=request.journal, issue_type='Issue')
 
     template = 'journal/issue.html'
     context = {
         'issue': issue_object,
         'issues': issue_objects,
-        'structure': issue_object.structure(articles),
+        'structure': issue_object.table_of_contents(),
         'show_sidebar': show_sidebar
     }
 
@@ -189,6 +194,7 @@ def issue(request, issue_id, show_sidebar=True):
 
 
 @has_journal
+@page_cache.cache_public_page()
 def collections(request):
     """
     Displays a list of collection Issues.
@@ -207,6 +213,7 @@ def collections(request):
 
 
 @has_journal
+@page_cache.cache_public_page()
 def collection(request, collection_id, show_sidebar=True):
     """
     Displays a single collection.
@@ -219,14 +226,11 @@ def collection(request, collection_id, show_sidebar=True):
     collection = get_object_or_404(models.Issue, journal=request.journal, issue_type='Collection', pk=collection_id)
     collections = models.Issue.objects.filter(journal=request.journal, issue_type='Collection')
 
-    articles = collection.articles.all().order_by(
-        'section', 'page_numbers').prefetch_related('authors', 'manuscript_files').select_related('section')
-
     template = 'journal/issue.html'
     context = {
         'issue': collection,
         'issues': collections,
-        'structure': collection.structure(articles),
+        'structure': collection.table_of_contents(),
         'show_sidebar': show_sidebar,
         'collection': True,
     }
@@ -252,6 +256,22 @@ def article(request, identifier_type, identifier):
                      level='Info', actor=None, target=article_object)
     """
 
+    # accesses are recorded before the page cache is consulted so that cached views are still counted
+    store_article_access(request, article_object, 'view')
+
+    return page_cache.cached_response(
+        request, lambda: render_article(request, article_object, identifier_type, identifier))
+
+
+def render_article(request, article_object, identifier_type, identifier):
+    """ Renders the article page.
+
+    :param request: the request associated with this call
+    :param article_object: the Article to render
+    :param identifier_type: the identifier type
+    :param identifier: the identifier
+    :return: a rendered template of the article
+    """
     content = None
     galleys = article_object.galley_set.all()
 
@@ -268,8 +288,6 @@ def article(request, identifier_type, identifier):
         article_object.large_image_file.uuid_filename = "carousel1.png"
         article_object.large_image_file.is_remote = True
 
-    store_article_access(request, article_object, 'view')
-
     template = 'journal/article.html'
     context = {
         'article': article_object,
@@ -416,6 +434,9 @@ def replace_article_file(request, identifier_type, identifier, file_id):
             uploaded_file = request.FILES.get('replacement-file')
             files.overwrite_file(uploaded_file, article_to_replace, file_to_replace)
 
+            if file_to_replace.is_galley:
+                cron_models.CronTask.add_galley_render_task(article_to_replace)
+
         return redirect(request.GET.get('return', 'core_dashboard'))
 
     template = "journal/replace_file.html"
@@ -673,6 +694,7 @@ def publish_article(request, article_id):
                 article.date_published = timezone.now()
 
             article.save()
+            cron_models.CronTask.add_galley_render_task(article)
             return redirect(reverse('publish_article', kwargs={'article_id': article.pk}))
 
     template = 'journal/publish_article.html'
@@ -739,6 +761,8 @@ def manage_issues(request, issue_id=None, event=None):
             article_id = request.GET.get('article')
             article = get_object_or_404(submission_models.Article, pk=article_id, pk__in=issue.article_pks)
             issue.articles.remove(article)
+            models.Issue.invalidate_toc(issue.pk)
+            page_cache.bump_content_version(issue.journal_id)
             return redirect(reverse('manage_issues_id', kwargs={'issue_id': issue.pk}))
 
     if request.POST:
@@ -799,6 +823,8 @@ def issue_add_article(request, issue_id):
         article = get_object_or_404(submission_models.Article, pk=article_id)
         models.ArticleOrdering.objects.create(article=article, issue=issue, order=issue.next_order())
         issue.articles.add(article)
+        models.Issue.invalidate_toc(issue.pk)
+        page_cache.bump_content_version(issue.journal_id)
         return redirect(reverse('manage_issues_id', kwargs={'issue_id': issue.pk}))
 
     template = 'journal/manage/issue_add_article.html'
@@ -864,7 +890,12 @@ def issue_order(request):
     if request.POST:
         ids = [int(_id) for _id in request.POST.getlist('issues[]')]
 
+        for issue in issues:
+            if issue.pk in ids:
+                issue.order = ids.index(issue.pk)
+                issue.save()
 
+    return HttpResponse('Thanks')
 
 
 @csrf_exempt
@@ -1071,16 +1102,39 @@ def editorial_team(request, group_id=None):
 
 
 def sitemap(request):
-    articles = submission_models.Article.objects.filter(date_published__lte=timezone.now(), journal=request.journal)
-    cms_pages = cms_models.Page.objects.filter(object_id=request.site_type.id, content_type=request.model_content_type)
+    """ Serves the sitemap index, which points to a sitemap of CMS pages and one for each chunk of articles.
 
-    template = 'journal/sitemap.xml'
+    :param request: the request associated with this call
+    :return: an XML response
+    """
+    return HttpResponse(logic.get_sitemap_index(request), content_type="application/xml")
 
-    context = {
-        'articles': articles,
-        'cms_pages': cms_pages,
-    }
-    return render(request, template, context, content_type="application/xml")
+
+def sitemap_articles(request, chunk):
+    """ Serves the sitemap for one chunk of the journal's published articles.
+
+    :param request: the request associated with this call
+    :param chunk: the chunk number
+    :return: an XML response
+    """
+    if not request.journal:
+        raise Http404()
+
+    content = logic.get_sitemap_articles(request, int(chunk))
+
+    if content is None:
+        raise Http404()
+
+    return HttpResponse(content, content_type="application/xml")
+
+
+def sitemap_pages(request):
+    """ Serves the sitemap of CMS pages for the journal or press.
+
+    :param request: the request associated with this call
+    :return: an XML response
+    """
+    return HttpResponse(logic.get_sitemap_pages(request), content_type="application/xml")
 
 
 def search(request):
@@ -1093,7 +1147,18 @@ def search(request):
         request.session['article_search'] = search_term
         return redirect(reverse('search'))
 
-    if request.session.get('article_search'):
+    if request.session.get('article_search') and search_index.search_enabled():
+        search_term = request.session.get('article_search')
+        paginator = Paginator(search_index.SearchResults(search_term, journal=request.journal), 25)
+
+        try:
+            articles = paginator.page(request.GET.get('page', 1))
+        except PageNotAnInteger:
+            articles = paginator.page(1)
+        except EmptyPage:
+            articles = paginator.page(paginator.num_pages)
+
+    elif request.session.get('article_search'):
         search_term = request.session.get('article_search')
 
         article_search = submission_models.Article.objects.filter(
@@ -2,3 +2,126 @@ __copyright__ = "Copyright 2017 Birkbeck, University of London"
 __author__ = "Martin Paul Eve & Andy Byers"
 __license__ = "AGPL v3"
 __maintainer__ = "Birkbeck Centre for Technology and Publishing"
+
+from collections import defaultdict
+
+from django.contrib.contenttypes.models import ContentType
+
+from core import models as core_models
+from review import models as review_models
+from submission import models as submission_models
+from utils import workflow_tasks
+
+
+def open_tasks(user):
+    """ Loads a user's open tasks with the articles they point to.
+
+    Task objects are always articles (see core.models.Task.destroyer), so they are fetched in one query and attached to
+    their tasks rather than resolved one at a time through the GenericForeignKey.
+
+    :param user: an Account object
+    :return: a list of Task objects
+    """
+    tasks = list(core_models.Task.objects.filter(assignees=user, completed__isnull=True))
+    article_type = ContentType.objects.get_for_model(submission_models.Article)
+    article_ids = {task.object_id for task in tasks if task.content_type_id == article_type.pk}
+    articles = submission_models.Article.objects.select_related('section').in_bulk(article_ids)
+
+    for task in tasks:
+        if task.content_type_id == article_type.pk and task.object_id in articles:
+            task.object = articles[task.object_id]
+
+    return tasks
+
+
+def review_state(articles):
+    """ Loads what the select reviewers classification needs to know about a set of articles, keyed by article pk.
+
+    :param articles: a list of Article objects
+    :return: a dictionary of article pks to dictionaries of active_reviews, completed_reviews_with_decision and
+    open_tasks, matching Article.active_reviews, Article.completed_reviews_with_decision and the article's open tasks
+    """
+    article_ids = [article.pk for article in articles]
+    state = {pk: {'active_reviews': [], 'completed_reviews_with_decision': [], 'open_tasks': []}
+             for pk in article_ids}
+
+    current_rounds = {}
+    # rounds are ordered by descending round_number, so the first seen for each article is its current round
+    for review_round in review_models.ReviewRound.objects.filter(article__in=article_ids):
+        current_rounds.setdefault(review_round.article_id, review_round.pk)
+
+    for review in review_models.ReviewAssignment.objects.filter(article__in=article_ids, date_declined__isnull=True):
+        if not review.is_complete:
+            state[review.article_id]['active_reviews'].append(review)
+        elif review.review_round_id == current_rounds.get(review.article_id) and review.decision != 'withdrawn':
+            state[review.article_id]['completed_reviews_with_decision'].append(review)
+
+    for task in core_models.Task.objects.filter(
+            content_type=ContentType.objects.get_for_model(submission_models.Article),
+            object_id__in=article_ids,
+            completed__isnull=True):
+        state[task.object_id]['open_tasks'].append(task)
+
+    return state
+
+
+def needs_reviewers(task, article, state):
+    """ Decides whether a select reviewers task should be shown.
+
+    :param task: the select reviewers Task
+    :param article: the task's Article
+    :param state: the article's entry from review_state
+    :return: a boolean
+    """
+    required = article.section.number_of_reviewers
+    active_reviews = state['active_reviews']
+    completed_reviews_with_decision = state['completed_reviews_with_decision']
+
+    # if there are fewer than the minimum number of reviewers assigned, show task
+    if required > len(active_reviews) + len(completed_reviews_with_decision):
+        return True
+
+    # if any of the reviews themselves are overdue, show task
+    if any(review.is_late for review in active_reviews):
+        return True
+
+    # if any reviewers have not responded to an overdue review request, show task
+    if any(related_task.is_late and related_task.pk != task.pk for related_task in state['open_tasks']):
+        return True
+
+    # if the minimum number of reviews for this article are complete, show task
+    return len(completed_reviews_with_decision) >= required
+
+
+def classify_tasks(tasks):
+    """ Groups open tasks by workflow stage for the kanban home page.
+
+    The reviews and tasks of every article awaiting reviewers are loaded in bulk, so classification takes a fixed
+    number of queries however many tasks there are.
+
+    :param tasks: a list of Task objects from open_tasks
+    :return: a dictionary of lists of tasks keyed on their kanban context names
+    """
+    classified = defaultdict(list)
+    select_reviewers = []
+
+    for task in tasks:
+        if task.title == workflow_tasks.DO_REVIEW_TITLE:
+            classified['reviewer_request_tasks'].append(task)
+        elif task.title == workflow_tasks.PERFORM_REVIEW_TITLE:
+            classified['reviewer_perform_tasks'].append(task)
+        elif task.title == workflow_tasks.ASSIGN_EDITORS_TITLE:
+            classified['editor_assignment_tasks'].append(task)
+        elif task.title == workflow_tasks.SELECT_REVIEWERS_TITLE and isinstance(task.object,
+                                                                                submission_models.Article):
+            select_reviewers.append(task)
+
+    state = review_state([task.object for task in select_reviewers])
+
+    for task in select_reviewers:
+        # TODO: this task needs to be hidden while waiting for author revisions
+        if needs_reviewers(task, task.object, state[task.object.pk]):
+            classified['reviewer_assignment_tasks'].append(task)
+
+    return {key: classified[key] for key in ('editor_assignment_tasks', 'reviewer_assignment_tasks',
+                                             'reviewer_request_tasks', 'reviewer_perform_tasks')}
@@ -0,0 +1,117 @@
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core import models as core_models
+from journal import models as journal_models
+from kanban import logic
+from review import models as review_models
+from submission import models as submission_models
+from utils import workflow_tasks
+
+
+class RollbackBenchmark(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    """
+    A management command that builds a task backlog and reports the cost of classifying it for the kanban home page.
+    """
+
+    help = "Builds a realistic open task backlog for an editor and reports the queries and time taken to classify it."
+
+    def add_arguments(self, parser):
+        """ Adds arguments to Django's management command-line parser.
+
+        :param parser: the parser to which the required arguments will be added
+        :return: None
+        """
+        parser.add_argument('journal_code')
+        parser.add_argument('editor_email')
+        parser.add_argument('--articles', type=int, default=300)
+        parser.add_argument('--reviews', type=int, default=3, help='The most review assignments per article.')
+
+    def handle(self, *args, **options):
+        """ Builds the backlog, classifies it and rolls everything back.
+
+        :param args: None
+        :param options: journal_code, editor_email, articles and reviews
+        :return: None
+        """
+        journal = journal_models.Journal.objects.get(code=options.get('journal_code'))
+        editor = core_models.Account.objects.get(email=options.get('editor_email'))
+
+        try:
+            with transaction.atomic():
+                self.build_backlog(journal, editor, options.get('articles'), options.get('reviews'))
+
+                with CaptureQueriesContext(connection) as context:
+                    start = time.time()
+                    classified = logic.classify_tasks(logic.open_tasks(editor))
+                    elapsed = time.time() - start
+
+                for key, tasks in sorted(classified.items()):
+                    print('{0}: {1}'.format(key, len(tasks)))
+
+                print('Classified in {0} queries and {1:.3f}s'.format(len(context.captured_queries), elapsed))
+                raise RollbackBenchmark()
+        except RollbackBenchmark:
+            pass
+
+    @staticmethod
+    def build_backlog(journal, editor, article_count, max_reviews):
+        """ Creates articles under review, each with a select reviewers task for the editor, review rounds, a mix of
+        active, late and completed reviews, review request tasks for the reviewers and some other editorial tasks.
+        """
+        section = submission_models.Section.objects.filter(journal=journal).first()
+        form = review_models.ReviewForm.objects.filter(journal=journal).first()
+
+        if not section or not form:
+            raise CommandError('The journal needs at least one section and one review form.')
+
+        article_type = ContentType.objects.get_for_model(submission_models.Article)
+        today = timezone.now()
+        titles = [workflow_tasks.ASSIGN_EDITORS_TITLE, workflow_tasks.DO_REVIEW_TITLE,
+                  workflow_tasks.PERFORM_REVIEW_TITLE]
+
+        for index in range(article_count):
+            article = submission_models.Article.objects.create(journal=journal, section=section,
+                                                               title='Kanban benchmark article {0}'.format(index),
+                                                               stage=submission_models.STAGE_UNDER_REVIEW)
+            review_round = review_models.ReviewRound.objects.create(article=article, round_number=1)
+
+            for _ in range(random.randint(0, max_reviews)):
+                complete = random.random() < 0.3
+                review_models.ReviewAssignment.objects.create(
+                    article=article, editor=editor, form=form, review_round=review_round,
+                    date_due=(today + timedelta(days=random.randint(-10, 20))).date(),
+                    is_complete=complete, decision='accept' if complete else None)
+
+                reviewer_task = core_models.Task.objects.create(content_type=article_type, object_id=article.pk,
+                                                                title=workflow_tasks.DO_REVIEW_TITLE,
+                                                                description='Benchmark review request',
+                                                                due=today + timedelta(days=random.randint(-5, 10)))
+                if complete:
+                    reviewer_task.completed = today
+                    reviewer_task.save()
+
+            tasks = [core_models.Task.objects.create(content_type=article_type, object_id=article.pk,
+                                                     title=workflow_tasks.SELECT_REVIEWERS_TITLE,
+                                                     description='Benchmark reviewer selection',
+                                                     due=today + timedelta(days=7))]
+
+            if random.random() < 0.5:
+                tasks.append(core_models.Task.objects.create(content_type=article_type, object_id=article.pk,
+                                                             title=random.choice(titles),
+                                                             description='Benchmark editorial task',
+                                                             due=today + timedelta(days=random.randint(-5, 10))))
+
+            for task in tasks:
+                task.assignees.add(editor)
@@ -18,9 +18,16 @@ class HistoricArticleAccessAdmin(admin.ModelAdmin):
     list_display = ('article', 'views', 'downloads')
 
 
+class MonthlyArticleAccessAdmin(admin.ModelAdmin):
+    list_display = ('article', 'month', 'type', 'galley_type', 'count')
+    list_filter = ('type', 'galley_type')
+
+
 admin_list = [
     (models.ArticleAccess, ArticleAccessAdmin),
     (models.HistoricArticleAccess, HistoricArticleAccessAdmin),
+    (models.MonthlyArticleAccess, MonthlyArticleAccessAdmin),
+    (models.AccessRollupWatermark,),
 ]
 
 [admin.site.register(*t) for t in admin_list]
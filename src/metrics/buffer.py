@@ -0,0 +1,243 @@
+__copyright__ = "Copyright 2017 Birkbeck, University of London"
+__author__ = "Martin Paul Eve & Andy Byers"
+__license__ = "AGPL v3"
+__maintainer__ = "Birkbeck Centre for Technology and Publishing"
+
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from datetime import timedelta
+from uuid import uuid4
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from metrics import models
+from utils.write_buffer import WriteBuffer, write_objects
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    """ Returns this process's access buffer, or None if buffering is disabled by METRICS_ACCESS_BUFFER.
+
+    :return: an ArticleAccessBuffer or None
+    """
+    global _buffer
+
+    mode = getattr(settings, 'METRICS_ACCESS_BUFFER', None)
+
+    if not mode:
+        return None
+
+    with _buffer_lock:
+        if _buffer is None:
+            spool_dir = None
+
+            if mode == 'file':
+                spool_dir = getattr(settings, 'METRICS_ACCESS_BUFFER_DIR',
+                                    os.path.join(settings.BASE_DIR, 'files', 'access_buffer'))
+
+            _buffer = ArticleAccessBuffer(
+                flush_size=getattr(settings, 'METRICS_ACCESS_BUFFER_SIZE', 500),
+                flush_interval=getattr(settings, 'METRICS_ACCESS_BUFFER_INTERVAL', 10),
+                spool_dir=spool_dir,
+            )
+            atexit.register(_buffer.flush)
+
+    return _buffer
+
+
+class ArticleAccessBuffer(WriteBuffer):
+    """ Holds ArticleAccess records in memory, or in a local spool file, and writes them in batches.
+
+    Repeat accesses are deduplicated against a sliding window held in memory, matching the database check made by
+    metrics.logic.record_article_access. Deduplication is per process, so an identifier that hits two workers within
+    the window is counted by each of them.
+    """
+    name = 'article accesses'
+    thread_name = 'article-access-buffer'
+
+    def __init__(self, flush_size=500, flush_interval=10, window=30, spool_dir=None, max_attempts=3):
+        """
+        :param flush_size: the number of buffered accesses that triggers a flush
+        :param flush_interval: seconds between timed flushes, or None to flush only on size and at exit
+        :param window: seconds within which a repeat access by the same identifier is not counted
+        :param spool_dir: a directory to spool accesses to, or None to hold them in memory
+        :param max_attempts: the number of failed writes after which an access is dropped
+        """
+        super(ArticleAccessBuffer, self).__init__(flush_size=flush_size, flush_interval=flush_interval,
+                                                  max_attempts=max_attempts)
+        self.window = timedelta(seconds=window)
+        self.spool_dir = spool_dir
+
+        self.recent = {}
+        self.spooled = 0
+
+    def get_model(self):
+        return models.ArticleAccess
+
+    def describe(self, access):
+        return describe_access(access)
+
+    def record(self, article, access_type, identifier, galley_type):
+        """ Buffers an access unless the identifier made the same kind of access within the window.
+
+        :param article: the Article being accessed
+        :param access_type: 'view' or 'download'
+        :param identifier: the counter tracking id or IP address of the reader
+        :param galley_type: the galley label, or 'view'
+        :return: an unsaved ArticleAccess
+        """
+        now = timezone.now()
+        key = (identifier, access_type, galley_type)
+
+        with self.lock:
+            self._check_process()
+            seen = self.recent.get(key)
+
+            if seen and seen[0] >= now - self.window:
+                # slide the window and refresh the access, which is only written if it has not been flushed yet
+                seen[0] = now
+                seen[1].accessed = now
+                return seen[1]
+
+            access = models.ArticleAccess(article=article, type=access_type, identifier=identifier,
+                                          galley_type=galley_type, accessed=now)
+            self.recent[key] = [now, access]
+
+            if self.spool_dir:
+                self._spool(access)
+                buffered = self.spooled
+            else:
+                self.pending.append(access)
+                buffered = len(self.pending)
+
+        self._flush_when_full(buffered)
+
+        return access
+
+    def _take_pending(self):
+        cutoff = timezone.now() - self.window
+        self.recent = {key: seen for key, seen in self.recent.items() if seen[0] >= cutoff}
+
+        if self.spool_dir:
+            self._rotate_spool()
+
+        return super(ArticleAccessBuffer, self)._take_pending()
+
+    def _write_pending(self, pending):
+        if self.spool_dir:
+            return flush_spool_files(self.spool_dir, '{0}-*.pending'.format(os.getpid()), self.max_attempts)
+
+        return super(ArticleAccessBuffer, self)._write_pending(pending)
+
+    def _reset_process(self):
+        super(ArticleAccessBuffer, self)._reset_process()
+        self.spooled = 0
+
+        if self.spool_dir:
+            os.makedirs(self.spool_dir, exist_ok=True)
+
+    def _spool_path(self):
+        return os.path.join(self.spool_dir, '{0}.jsonl'.format(os.getpid()))
+
+    def _spool(self, access):
+        # The file is reopened for each write so that recover_spool_files can safely claim an idle spool.
+        with open(self._spool_path(), 'a') as spool_file:
+            spool_file.write(spool_line(access))
+
+        self.spooled += 1
+
+    def _rotate_spool(self):
+        self.spooled = 0
+
+        try:
+            os.rename(self._spool_path(),
+                      os.path.join(self.spool_dir, '{0}-{1}.pending'.format(os.getpid(), uuid4().hex)))
+        except FileNotFoundError:
+            pass
+
+
+def recover_spool_files(spool_dir, idle_seconds=300):
+    """ Marks spool files that have not been written to recently, eg. by a crashed worker, as ready to flush.
+
+    :param spool_dir: the spool directory
+    :param idle_seconds: how long a spool file must have been idle before it is treated as abandoned
+    :return: None
+    """
+    for path in glob.glob(os.path.join(spool_dir, '*.jsonl')):
+        if os.path.getmtime(path) < time.time() - idle_seconds:
+            os.rename(path, '{0}-{1}.pending'.format(path[:-len('.jsonl')], uuid4().hex))
+
+
+def describe_access(access):
+    return 'access to article {0}'.format(access.article_id)
+
+
+def spool_line(access):
+    return json.dumps({
+        'article': access.article_id,
+        'type': access.type,
+        'identifier': access.identifier,
+        'galley_type': access.galley_type,
+        'accessed': access.accessed.isoformat(),
+        'flush_attempts': getattr(access, 'flush_attempts', 0),
+    }) + '\n'
+
+
+def flush_spool_files(spool_dir, pattern='*.pending', max_attempts=3):
+    """ Writes the accesses in spooled files to the database.
+
+    Each file is claimed with an atomic rename before it is read so that concurrent flushes never load it twice.
+    Accesses that cannot be written are spooled to a new pending file, with their failed attempts, to be retried.
+
+    :param spool_dir: the spool directory
+    :param pattern: a glob pattern of pending spool files to flush
+    :param max_attempts: the number of failed writes after which an access is dropped
+    :return: the number of accesses written
+    """
+    written = 0
+
+    for path in glob.glob(os.path.join(spool_dir, pattern)):
+        claimed = '{0}.flushing'.format(path[:-len('.pending')])
+
+        try:
+            os.rename(path, claimed)
+        except FileNotFoundError:
+            continue
+
+        with open(claimed) as spool_file:
+            accesses = []
+
+            for line in spool_file:
+                if not line.strip():
+                    continue
+
+                row = json.loads(line)
+                access = models.ArticleAccess(article_id=row['article'], type=row['type'],
+                                              identifier=row['identifier'], galley_type=row['galley_type'],
+                                              accessed=parse_datetime(row['accessed']))
+                access.flush_attempts = row.get('flush_attempts', 0)
+                accesses.append(access)
+
+        flushed, failed = write_objects(models.ArticleAccess, accesses, max_attempts, describe_access)
+
+        if failed:
+            # written as .tmp and renamed so that no flush can claim a partly written file
+            retry_path = os.path.join(spool_dir, '{0}-{1}'.format(os.getpid(), uuid4().hex))
+
+            with open(retry_path + '.tmp', 'w') as retry_file:
+                retry_file.writelines(spool_line(access) for access in failed)
+
+            os.rename(retry_path + '.tmp', retry_path + '.pending')
+
+        os.remove(claimed)
+        written += flushed
+
+    return written
@@ -4,19 +4,37 @@ __license__ = "AGPL v3"
 __maintainer__ = "Birkbeck Centre for Technology and Publishing"
 
 import calendar
+import os
+from collections import Counter
 from datetime import timedelta
+from dateutil.relativedelta import relativedelta
 from user_agents import parse as parse_ua_string
 
+from django.conf import settings
+from django.core import serializers
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Max, Min, Sum, Value, When
 from django.utils import timezone
 
-from metrics import models
+from metrics import buffer, models
 from utils import shared
 from utils.function_cache import cache
 
 
 @cache(300)
 def get_press_totals(start_date, end_date, report_months, compat=False, do_yop=False):
-    from submission import models as submission_models
+    """ Builds press and per-journal COUNTER totals for the given reporting period.
+
+    Accesses are counted in the database, grouped by journal and access type with one conditional count per report
+    month, so the cost of a report depends on the number of months rather than the number of articles or accesses.
+
+    :param start_date: the start of the reporting period
+    :param end_date: the end of the reporting period
+    :param report_months: a list of datetimes, one per month in the report
+    :param compat: whether months with no accesses are reported as 0 (pycounter compatibility) rather than blank
+    :param do_yop: whether to calculate year of publication totals for COUNTER journal report 5
+    :return: a tuple of total accesses, views, downloads, a dict of press month totals and a list of journal dicts
+    """
     from journal import models as journal_models
 
     view_access_count = 0
@@ -26,10 +44,16 @@ def get_press_totals(start_date, end_date, report_months, compat=False, do_yop=F
 
     press_months = {}
 
-    year_of_publication = {}
+    months = [month_key(date) for date in report_months]
+
+    for month in months:
+        press_months[month] = ''
 
-    for date in report_months:
-        press_months['{0}-{1}'.format(date.strftime('%b'), date.year)] = ''
+    if getattr(settings, 'METRICS_ACCESS_ROLLUP', False):
+        journal_counts = get_journal_rollup_counts(start_date, end_date, report_months)
+    else:
+        journal_counts = get_journal_access_counts(start_date, end_date, report_months)
+    journal_yops = get_journal_year_of_publication_totals() if do_yop else {}
 
     for journal_object in journal_models.Journal.objects.all():
 
@@ -47,14 +71,11 @@ def get_press_totals(start_date, end_date, report_months, compat=False, do_yop=F
         # easiest way to do this is simply to count backwards 19 years as the theoretical maximum
         journal['year_of_publication'] = {}
 
-        year = timezone.now().year
-
-        for year_counter in range(year, year - 19, -1):
-            year_of_publication[year] = ''
-
-        for date in report_months:
-            month = '{0}-{1}'.format(date.strftime('%b'), date.year)
+        if do_yop:
+            journal['year_of_publication'] = journal_yops.get(journal_object.pk,
+                                                              {year: '' for year in year_of_publication_range()})
 
+        for month in months:
             # setting these to zero for now for compat with pycounter
             # the spec says they should be set to "" so we may need to change that back
             # logic to handle this is included below
@@ -67,89 +88,46 @@ def get_press_totals(start_date, end_date, report_months, compat=False, do_yop=F
                 journal['{0}-views'.format(month)] = ''
                 journal['{0}-downloads'.format(month)] = ''
 
-        articles = submission_models.Article.objects.filter(journal=journal_object)
-
-        # if we're doing a year-of-publication for JR5 purposes, then run this section, which is pretty DB intensive
-        if do_yop:
-            for article in articles:
-                views = get_article_views(article)
-                downloads = get_article_downloads(article)
-
-                if article.date_published.year in year_of_publication:
-                    if year_of_publication[article.date_published.year] == '':
-                        year_of_publication[article.date_published.year] = 0
-
-                    if journal['year_of_publication'][article.date_published.year] == '':
-                        journal['year_of_publication'][article.date_published.year] = 0
-
-                year_of_publication[article.date_published.year] += views + downloads
-                journal['year_of_publication'][article.date_published.year] += views + downloads
-
-        for article in articles:
-            views = models.ArticleAccess.objects.filter(type='view', article=article,
-                                                        accessed__range=[start_date, end_date])
-
-            downloads = models.ArticleAccess.objects.filter(type='download', article=article,
-                                                            accessed__range=[start_date, end_date])
-
-            view_count = views.count()
-            download_count = downloads.count()
-
-            # total views and downloads
-            journal['total'] += view_count + download_count
+        for access_type, suffix in (('view', 'views'), ('download', 'downloads')):
+            row = journal_counts.get((journal_object.pk, access_type))
 
-            # total views
-            journal['total_views'] += view_count
+            if not row:
+                continue
 
-            # total downloads
-            journal['total_downloads'] += download_count
+            journal['total'] += row['total']
+            journal['total_{0}'.format(suffix)] += row['total']
 
-            # add the totals to the press totals
-            view_access_count += view_count
-            download_access_count += download_count
-
-            for view_object in views:
-                # get the date for this access
-                access_date = '{0}-{1}'.format(view_object.accessed.strftime('%b'), view_object.accessed.year)
-
-                # we have to handle this like this since data for months already collected must be blank, not zero
-                if journal[access_date] == '':
-                    journal[access_date] = 0
-
-                if press_months[access_date] == '':
-                    press_months[access_date] = 0
-
-                if journal['{0}-views'.format(access_date)] == '':
-                    journal['{0}-views'.format(access_date)] = 0
+            if access_type == 'view':
+                view_access_count += row['total']
+            else:
+                download_access_count += row['total']
 
-                journal[access_date] += 1
-                journal['{0}-views'.format(access_date)] += 1
-                press_months[access_date] += 1
+            for index, month in enumerate(months):
+                count = row['month_{0}'.format(index)]
 
-            for download_object in downloads:
-                # get the date for this access
-                access_date = '{0}-{1}'.format(download_object.accessed.strftime('%b'), download_object.accessed.year)
+                if not count:
+                    continue
 
                 # we have to handle this like this since data for months already collected must be blank, not zero
-                if journal[access_date] == '':
-                    journal[access_date] = 0
+                if journal[month] == '':
+                    journal[month] = 0
 
-                if press_months[access_date] == '':
-                    press_months[access_date] = 0
+                if press_months[month] == '':
+                    press_months[month] = 0
 
-                if journal['{0}-downloads'.format(access_date)] == '':
-                    journal['{0}-downloads'.format(access_date)] = 0
+                if journal['{0}-{1}'.format(month, suffix)] == '':
+                    journal['{0}-{1}'.format(month, suffix)] = 0
 
-                journal[access_date] += 1
-                journal['{0}-downloads'.format(access_date)] += 1
-                press_months[access_date] += 1
+                journal[month] += count
+                journal['{0}-{1}'.format(month, suffix)] += count
+                press_months[month] += count
 
         for date in report_months:
             # add to "reporting_periods":
             # a start date
             # an end date
             # a total number of views
-            month = '{0}-{1}'.format(date.strftime('%b'), date.year)
+            month = month_key(date)
             journal['reporting_periods'].append(('{0}-01'.format(date.strftime('%Y-%m')),
                                                  '{0}-{1}'.format(date.strftime('%Y-%m'),
                                                                   calendar.monthrange(date.year, date.month)[1]),
@@ -162,6 +140,213 @@ def get_press_totals(start_date, end_date, report_months, compat=False, do_yop=F
     return view_access_count + download_access_count, view_access_count, download_access_count, press_months, journals
 
 
+def month_key(date):
+    return '{0}-{1}'.format(date.strftime('%b'), date.year)
+
+
+def year_of_publication_range():
+    year = timezone.now().year
+    return range(year, year - 19, -1)
+
+
+def first_day_of_month(date):
+    return date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def get_journal_access_counts(start_date, end_date, report_months, after_access=0):
+    """ Counts accesses in a reporting period grouped by journal and access type.
+
+    Each row carries a 'total' and one 'month_<index>' count per entry in report_months. Month boundaries are
+    calculated here rather than with a database date truncation so the buckets match the report's timezone exactly.
+
+    :param start_date: the start of the reporting period
+    :param end_date: the end of the reporting period
+    :param report_months: a list of datetimes, one per month in the report
+    :param after_access: only count ArticleAccess rows with a pk greater than this
+    :return: a dict of (journal pk, access type) to count rows
+    """
+    month_counts = {}
+
+    for index, date in enumerate(report_months):
+        first_day = first_day_of_month(date)
+        month_counts['month_{0}'.format(index)] = Count(
+            Case(
+                When(accessed__gte=first_day, accessed__lt=first_day + relativedelta(months=1), then=Value(1)),
+                output_field=IntegerField(),
+            )
+        )
+
+    rows = models.ArticleAccess.objects.filter(
+        pk__gt=after_access,
+        accessed__range=[start_date, end_date],
+    ).values(
+        'article__journal', 'type',
+    ).annotate(
+        total=Count('pk'),
+        **month_counts
+    ).order_by()
+
+    return {(row['article__journal'], row['type']): row for row in rows}
+
+
+def get_journal_rollup_counts(start_date, end_date, report_months):
+    """ Counts accesses grouped by journal and access type from the MonthlyArticleAccess rollup.
+
+    Rows newer than the rollup watermark are counted from ArticleAccess so reports stay current between rollups. The
+    rollup is monthly, so the first and last months of the period are counted in full.
+
+    :param start_date: the start of the reporting period
+    :param end_date: the end of the reporting period
+    :param report_months: a list of datetimes, one per month in the report
+    :return: a dict of (journal pk, access type) to count rows, as returned by get_journal_access_counts
+    """
+    watermark = models.AccessRollupWatermark.current()
+    month_counts = {}
+
+    for index, date in enumerate(report_months):
+        month_counts['month_{0}'.format(index)] = Sum(
+            Case(
+                When(month=first_day_of_month(date).date(), then=F('count')),
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+        )
+
+    rows = models.MonthlyArticleAccess.objects.filter(
+        month__gte=first_day_of_month(start_date).date(),
+        month__lte=end_date.date(),
+    ).values(
+        'article__journal', 'type',
+    ).annotate(
+        total=Sum('count'),
+        **month_counts
+    ).order_by()
+
+    counts = {(row['article__journal'], row['type']): row for row in rows}
+    recent_counts = get_journal_access_counts(start_date, end_date, report_months,
+                                              after_access=watermark.last_access)
+
+    for key, recent_row in recent_counts.items():
+        if key not in counts:
+            counts[key] = recent_row
+            continue
+
+        for field in ['total'] + list(month_counts):
+            counts[key][field] = (counts[key][field] or 0) + recent_row[field]
+
+    return counts
+
+
+def roll_up_article_accesses(chunk_size=10000):
+    """ Counts ArticleAccess rows newer than the rollup watermark into MonthlyArticleAccess.
+
+    Primary keys are not guaranteed to become visible in order, so a row with a lower pk may still be uncommitted when
+    a higher one is counted, and would then sit below the watermark forever. The scan therefore stops short of the
+    first row accessed within the last METRICS_ACCESS_ROLLUP_LAG minutes, and rows from there on are left to a later
+    run once every earlier insert has had time to commit.
+
+    Each chunk is applied in its own transaction along with the watermark, which is locked so that concurrent runs
+    cannot count the same rows twice.
+
+    :param chunk_size: the number of ArticleAccess rows to process per transaction
+    :return: the number of ArticleAccess rows processed
+    """
+    watermark = models.AccessRollupWatermark.current()
+    cutoff = timezone.now() - timedelta(minutes=getattr(settings, 'METRICS_ACCESS_ROLLUP_LAG', 10))
+    new_accesses = models.ArticleAccess.objects.filter(pk__gt=watermark.last_access)
+
+    first_recent = new_accesses.filter(accessed__gte=cutoff).aggregate(first_recent=Min('pk'))['first_recent']
+
+    if first_recent is None:
+        last_access = new_accesses.aggregate(last_access=Max('pk'))['last_access'] or 0
+    else:
+        last_access = first_recent - 1
+
+    processed = 0
+
+    while True:
+        with transaction.atomic():
+            watermark = models.AccessRollupWatermark.objects.select_for_update().get(pk=1)
+
+            accesses = list(models.ArticleAccess.objects.filter(
+                pk__gt=watermark.last_access,
+                pk__lte=last_access,
+            ).order_by('pk').values_list('pk', 'article', 'accessed', 'type', 'galley_type')[:chunk_size])
+
+            if not accesses:
+                return processed
+
+            buckets = Counter()
+
+            for pk, article, accessed, access_type, galley_type in accesses:
+                month = timezone.localtime(accessed).date().replace(day=1)
+                buckets[(article, month, access_type, galley_type)] += 1
+
+            existing = models.MonthlyArticleAccess.objects.filter(
+                article__in={key[0] for key in buckets},
+                month__in={key[1] for key in buckets},
+            ).values_list('pk', 'article', 'month', 'type', 'galley_type')
+            existing = {tuple(row[1:]): row[0] for row in existing}
+
+            new_rows = []
+
+            for key, count in buckets.items():
+                if key in existing:
+                    models.MonthlyArticleAccess.objects.filter(pk=existing[key]).update(count=F('count') + count)
+                else:
+                    article, month, access_type, galley_type = key
+                    new_rows.append(models.MonthlyArticleAccess(article_id=article, month=month, type=access_type,
+                                                                galley_type=galley_type, count=count))
+
+            models.MonthlyArticleAccess.objects.bulk_create(new_rows)
+
+            watermark.last_access = accesses[-1][0]
+            watermark.save()
+
+        processed += len(accesses)
+
+
+def get_journal_year_of_publication_totals():
+    """ Sums all-time views and downloads, including historic accesses, by journal and article publication year.
+
+    :return: a dict of journal pk to a dict of year to total, with years that have no published articles left blank
+    """
+    from submission import models as submission_models
+
+    years = year_of_publication_range()
+    article_totals = {}
+
+    access_rows = models.ArticleAccess.objects.filter(
+        type__in=['view', 'download'],
+    ).values('article').annotate(total=Count('pk')).order_by()
+
+    for row in access_rows:
+        article_totals[row['article']] = row['total']
+
+    for row in models.HistoricArticleAccess.objects.values('article', 'views', 'downloads'):
+        article_totals[row['article']] = article_totals.get(row['article'], 0) + row['views'] + row['downloads']
+
+    journal_yops = {}
+
+    articles = submission_models.Article.objects.filter(
+        date_published__isnull=False,
+    ).values('pk', 'journal', 'date_published').order_by()
+
+    for article in articles:
+        yops = journal_yops.setdefault(article['journal'], {year: '' for year in years})
+        year = article['date_published'].year
+
+        if year not in yops:
+            continue
+
+        if yops[year] == '':
+            yops[year] = 0
+
+        yops[year] += article_totals.get(article['pk'], 0)
+
+    return journal_yops
+
+
 def get_article_views(article):
     historic_record, created = models.HistoricArticleAccess.objects.get_or_create(article=article)
     view_access_count = models.ArticleAccess.objects.filter(type='view', article=article).count()
@@ -185,6 +370,118 @@ class ArticleMetrics:
         self.downloads = get_article_downloads(article)
 
 
+def _adjust_historic_accesses(totals, sign):
+    """ Adds (or with sign=-1, removes) per-article view and download totals to HistoricArticleAccess rows.
+
+    Articles with the same deltas are updated together, so a chunk costs one UPDATE per distinct delta pair.
+
+    :param totals: a dict of article pk to a (views, downloads) tuple
+    :param sign: 1 to add the totals or -1 to remove them
+    :return: None
+    """
+    existing = set(models.HistoricArticleAccess.objects.filter(
+        article__in=totals.keys(),
+    ).values_list('article', flat=True))
+
+    models.HistoricArticleAccess.objects.bulk_create(
+        [models.HistoricArticleAccess(article_id=article) for article in totals if article not in existing]
+    )
+
+    articles_by_delta = {}
+
+    for article, delta in totals.items():
+        articles_by_delta.setdefault(delta, []).append(article)
+
+    for (views, downloads), articles in articles_by_delta.items():
+        models.HistoricArticleAccess.objects.filter(article__in=articles).update(
+            views=F('views') + sign * views,
+            downloads=F('downloads') + sign * downloads,
+        )
+
+
+def _access_totals(accesses):
+    totals = {}
+
+    for article, access_type, count in accesses:
+        views, downloads = totals.get(article, (0, 0))
+
+        if access_type == 'view':
+            views += count
+        elif access_type == 'download':
+            downloads += count
+
+        totals[article] = (views, downloads)
+
+    return totals
+
+
+def move_accesses_to_historic(date_to_tidy, chunk_size=10000, dump_path=None):
+    """ Moves ArticleAccess rows accessed on or before a date into HistoricArticleAccess totals.
+
+    Rows are processed in pk order, one transaction per chunk: the per-article totals are counted in the database,
+    applied with bulk updates and the rows deleted in a single statement.
+
+    :param date_to_tidy: accesses on or before this datetime are moved
+    :param chunk_size: the number of accesses to move per transaction
+    :param dump_path: a directory to write each chunk to as a JSON fixture before it is deleted, or None
+    :return: the number of accesses moved
+    """
+    moved = 0
+
+    while True:
+        with transaction.atomic():
+            pks = list(models.ArticleAccess.objects.filter(
+                accessed__lte=date_to_tidy,
+            ).order_by('pk').values_list('pk', flat=True)[:chunk_size])
+
+            if not pks:
+                return moved
+
+            chunk = models.ArticleAccess.objects.filter(pk__in=pks)
+
+            if dump_path:
+                file_path = os.path.join(dump_path, 'article_accesses_{0}.json'.format(pks[0]))
+                with open(file_path, 'w') as dump_file:
+                    serializers.serialize('json', chunk.order_by('pk').iterator(), stream=dump_file, indent=4)
+
+            totals = _access_totals(chunk.values_list('article', 'type').annotate(count=Count('pk')).order_by())
+            _adjust_historic_accesses(totals, 1)
+            chunk.delete()
+
+        moved += len(pks)
+
+
+def reload_dumped_accesses(file_paths):
+    """ Restores ArticleAccess rows from dumps written by move_accesses_to_historic and removes their historic totals.
+
+    Each file is restored in its own transaction. Accesses that already exist are skipped, so a dump can safely be
+    reloaded twice.
+
+    :param file_paths: a list of JSON fixture paths
+    :return: the number of accesses restored
+    """
+    restored = 0
+
+    for file_path in file_paths:
+        with open(file_path) as dump_file:
+            accesses = [obj.object for obj in serializers.deserialize('json', dump_file)]
+
+        with transaction.atomic():
+            existing = set(models.ArticleAccess.objects.filter(
+                pk__in=[access.pk for access in accesses],
+            ).values_list('pk', flat=True))
+            accesses = [access for access in accesses if access.pk not in existing]
+
+            models.ArticleAccess.objects.bulk_create(accesses, batch_size=1000)
+            _adjust_historic_accesses(
+                _access_totals((access.article_id, access.type, 1) for access in accesses), -1
+            )
+
+        restored += len(accesses)
+
+    return restored
+
+
 def store_article_access(request, article, access_type, galley_type='view'):
 
     user_agent = parse_ua_string(request.META.get('HTTP_USER_AGENT', None))
@@ -192,40 +489,57 @@ def store_article_access(request, article, access_type, galley_type='view'):
     identifier = counter_tracking_id if counter_tracking_id else shared.get_ip_address(request)
 
     if user_agent and not user_agent.is_bot:
+        access_buffer = buffer.get_buffer()
 
-        # check if the current IP has accessed this article recently.
-        time_to_check = timezone.now() - timedelta(seconds=30)
-        check = models.ArticleAccess.objects.filter(identifier=identifier,
-                                                    accessed__gte=time_to_check,
-                                                    type=access_type,
-                                                    galley_type=galley_type).count()
+        if access_buffer:
+            return access_buffer.record(article, access_type, identifier, galley_type)
 
-        if not check:
+        return record_article_access(article, access_type, identifier, galley_type)
 
-            new_access = models.ArticleAccess.objects.create(
-                article=article,
-                type=access_type,
-                identifier=identifier,
-                galley_type=galley_type
-            )
+    else:
 
-            return new_access
+        return None
 
-        else:
-            # get the most recent access attempt and reset its accessed to now.
-            access = models.ArticleAccess.objects.filter(identifier=identifier,
-                                                         accessed__gte=time_to_check,
-                                                         type=access_type,
-                                                         galley_type=galley_type).order_by('-accessed')[0]
 
-            if access:
-                access.accessed = timezone.now()
-                access.save()
+def record_article_access(article, access_type, identifier, galley_type):
+    """ Writes an access straight to the database unless the identifier made the same access in the last 30 seconds.
 
-                return access
+    :param article: the Article being accessed
+    :param access_type: 'view' or 'download'
+    :param identifier: the counter tracking id or IP address of the reader
+    :param galley_type: the galley label, or 'view'
+    :return: the new or refreshed ArticleAccess
+    """
+    # check if the current IP has accessed this article recently.
+    time_to_check = timezone.now() - timedelta(seconds=30)
+    check = models.ArticleAccess.objects.filter(identifier=identifier,
+                                                accessed__gte=time_to_check,
+                                                type=access_type,
+                                                galley_type=galley_type).count()
+
+    if not check:
+
+        new_access = models.ArticleAccess.objects.create(
+            article=article,
+            type=access_type,
+            identifier=identifier,
+            galley_type=galley_type
+        )
+
+        return new_access
 
-            else:
-                return None
     else:
+        # get the most recent access attempt and reset its accessed to now.
+        access = models.ArticleAccess.objects.filter(identifier=identifier,
+                                                     accessed__gte=time_to_check,
+                                                     type=access_type,
+                                                     galley_type=galley_type).order_by('-accessed')[0]
 
-        return None
+        if access:
+            access.accessed = timezone.now()
+            access.save()
+
+            return access
+
+        else:
+            return None
@@ -0,0 +1,77 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from metrics import buffer, logic
+from submission import models as submission_models
+
+
+class RollbackBenchmark(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    """
+    A management command that compares the throughput of direct and buffered article access recording.
+    """
+
+    help = "Records simulated article accesses directly and through the access buffer and reports throughput."
+
+    def add_arguments(self, parser):
+        """ Adds arguments to Django's management command-line parser.
+
+        :param parser: the parser to which the required arguments will be added
+        :return: None
+        """
+        parser.add_argument('--accesses', type=int, default=5000)
+        parser.add_argument('--readers', type=int, default=500)
+        parser.add_argument('--flush_size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        """Times both write paths. Nothing is kept: each run is rolled back.
+
+        :param args: None
+        :param options: accesses, readers and flush_size
+        :return: None
+        """
+        articles = list(submission_models.Article.objects.filter(stage=submission_models.STAGE_PUBLISHED)[:100])
+
+        if not articles:
+            print('At least one published article is required.')
+            return
+
+        accesses = [(random.choice(articles), random.choice(['view', 'download']),
+                     'benchmark-{0}'.format(random.randrange(options.get('readers'))))
+                    for _ in range(options.get('accesses'))]
+
+        access_buffer = buffer.ArticleAccessBuffer(flush_size=options.get('flush_size'), flush_interval=None)
+
+        def direct():
+            for article, access_type, identifier in accesses:
+                logic.record_article_access(article, access_type, identifier, 'benchmark')
+
+        def buffered():
+            for article, access_type, identifier in accesses:
+                access_buffer.record(article, access_type, identifier, 'benchmark')
+            access_buffer.flush()
+
+        for label, run in (('direct', direct), ('buffered', buffered)):
+            elapsed = self.time_and_roll_back(run)
+            print('{0}: {1} accesses in {2:.2f}s ({3:.0f}/s)'.format(
+                label, len(accesses), elapsed, len(accesses) / elapsed))
+
+    @staticmethod
+    def time_and_roll_back(run):
+        start = time.time()
+
+        try:
+            with transaction.atomic():
+                run()
+                elapsed = time.time() - start
+                raise RollbackBenchmark()
+        except RollbackBenchmark:
+            pass
+
+        return elapsed
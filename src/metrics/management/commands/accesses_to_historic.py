@@ -4,9 +4,8 @@ from datetime import timedelta
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 from django.conf import settings
-from django.core import serializers
 
-from metrics import models
+from metrics import logic
 
 
 class Command(BaseCommand):
@@ -23,31 +22,26 @@ class Command(BaseCommand):
         :return: None
         """
         parser.add_argument('--dump_data', action='store_true', default=False)
+        parser.add_argument('--chunk_size', type=int, default=10000)
 
     def handle(self, *args, **options):
         """Tidies up access records into historic accesses after 24 months has passed (COUNTER).
 
         :param args: None
-        :param options: None
+        :param options: dump_data, whether to write the tidied accesses to disk, and chunk_size
         :return: None
         """
         date_to_tidy = timezone.now() - timedelta(weeks=104)
+        path = None
 
-        article_accesses = models.ArticleAccess.objects.filter(accessed__lte=date_to_tidy)
-
-        if options.get('dump_data') and article_accesses:
+        if options.get('dump_data'):
             path = os.path.join(settings.BASE_DIR, 'files', 'data_backup', date_to_tidy.strftime('%Y-%m-%d %H:%M'))
             if not os.path.exists(path):
                 os.makedirs(path)
-            with open(os.path.join(path, 'article_accesses.json'), 'w+') as f:
-                data = serializers.serialize("json", article_accesses, indent=4)
-                f.write(data)
 
-        for access in article_accesses:
+        moved = logic.move_accesses_to_historic(date_to_tidy, chunk_size=options.get('chunk_size'), dump_path=path)
 
-            if access.type == 'view':
-                access.article.historicarticleaccess.add_one_view()
-            elif access.type == 'download':
-                access.article.historicarticleaccess.add_one_download()
+        if path and not moved:
+            os.rmdir(path)
 
-            access.delete()
+        print('Moved {0} article accesses to historic totals.'.format(moved))
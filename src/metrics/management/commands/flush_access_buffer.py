@@ -0,0 +1,41 @@
+import os
+
+from django.core.management.base import BaseCommand
+from django.conf import settings
+
+from metrics import buffer
+
+
+class Command(BaseCommand):
+    """
+    A management command that writes spooled article accesses left behind by worker processes to the database.
+    """
+
+    help = "Flushes spooled ArticleAccess records, including those abandoned by crashed workers."
+
+    def add_arguments(self, parser):
+        """ Adds arguments to Django's management command-line parser.
+
+        :param parser: the parser to which the required arguments will be added
+        :return: None
+        """
+        parser.add_argument('--idle_seconds', type=int, default=300)
+
+    def handle(self, *args, **options):
+        """Flushes spooled access records.
+
+        :param args: None
+        :param options: idle_seconds, how long a worker's spool must be idle before it is claimed
+        :return: None
+        """
+        spool_dir = getattr(settings, 'METRICS_ACCESS_BUFFER_DIR',
+                            os.path.join(settings.BASE_DIR, 'files', 'access_buffer'))
+
+        if not os.path.exists(spool_dir):
+            print('No access spool found at {0}.'.format(spool_dir))
+            return
+
+        buffer.recover_spool_files(spool_dir, idle_seconds=options.get('idle_seconds'))
+        written = buffer.flush_spool_files(spool_dir)
+
+        print('Wrote {0} spooled article accesses.'.format(written))
@@ -1,8 +1,10 @@
+import glob
 import os
 
 from django.core.management.base import BaseCommand
 from django.conf import settings
-from django.core import serializers
+
+from metrics import logic
 
 
 class Command(BaseCommand):
@@ -24,23 +26,18 @@ class Command(BaseCommand):
         """Reloads a dumped access list and removes the totals from the historic views.
 
         :param args: None
-        :param options: None
+        :param options: file, the name of the dump folder in files/data_backup
         :return: None
         """
 
-        file_path = os.path.join(settings.BASE_DIR,
-                                 'files',
-                                 'data_backup',
-                                 options.get('file'),
-                                 'article_accesses.json')
+        folder = os.path.join(settings.BASE_DIR,
+                              'files',
+                              'data_backup',
+                              options.get('file'))
 
-        with open(file_path) as file:
-            data = file.read()
+        # dumps are written in chunks, older dumps are a single article_accesses.json
+        file_paths = sorted(glob.glob(os.path.join(folder, 'article_accesses*.json')))
 
-        for obj in serializers.deserialize("json", data):
-            obj.save()
+        restored = logic.reload_dumped_accesses(file_paths)
 
-            if obj.object.type == 'view':
-                obj.object.article.historicarticleaccess.remove_one_view()
-            elif obj.object.type == 'download':
-                obj.object.article.historicarticleaccess.remove_one_download()
+        print('Restored {0} article accesses.'.format(restored))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from metrics import logic
+
+
+class Command(BaseCommand):
+    """
+    A management command that counts new ArticleAccess rows into the monthly access rollup used by COUNTER reports.
+    """
+
+    help = "Counts ArticleAccess rows newer than the rollup watermark into MonthlyArticleAccess."
+
+    def add_arguments(self, parser):
+        """ Adds arguments to Django's management command-line parser.
+
+        :param parser: the parser to which the required arguments will be added
+        :return: None
+        """
+        parser.add_argument('--chunk_size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        """Counts new access records into the monthly rollup.
+
+        :param args: None
+        :param options: chunk_size, the number of access rows to process per transaction
+        :return: None
+        """
+        processed = logic.roll_up_article_accesses(chunk_size=options.get('chunk_size'))
+        print('Rolled up {0} article accesses.'.format(processed))
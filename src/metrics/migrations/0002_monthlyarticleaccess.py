@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('submission', '0001_initial'),
+        ('metrics', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccessRollupWatermark',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_access', models.PositiveIntegerField(default=0)),
+                ('date_updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MonthlyArticleAccess',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='The first day of the month these accesses were made in.')),
+                ('type', models.CharField(choices=[('download', 'Download'), ('view', 'View')], max_length=20)),
+                ('galley_type', models.CharField(max_length=200)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('article', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='submission.Article')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='monthlyarticleaccess',
+            unique_together=set([('article', 'month', 'type', 'galley_type')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='monthlyarticleaccess',
+            index_together=set([('month', 'type')]),
+        ),
+    ]
@@ -52,3 +52,34 @@ class HistoricArticleAccess(models.Model):
         downloads = self.downloads
         self.downloads = downloads - 1
         self.save()
+
+
+class MonthlyArticleAccess(models.Model):
+    """ A rollup of ArticleAccess rows counted by article, calendar month, access type and galley type. """
+    article = models.ForeignKey('submission.Article')
+    month = models.DateField(help_text='The first day of the month these accesses were made in.')
+    type = models.CharField(max_length=20, choices=access_choices())
+    galley_type = models.CharField(max_length=200)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('article', 'month', 'type', 'galley_type')
+        index_together = ('month', 'type')
+
+    def __str__(self):
+        return 'Article {0}, {1} {2}s in {3:%b-%Y}: {4}'.format(self.article_id, self.galley_type, self.type,
+                                                                self.month, self.count)
+
+
+class AccessRollupWatermark(models.Model):
+    """ Records the highest ArticleAccess pk that has been counted into MonthlyArticleAccess. """
+    last_access = models.PositiveIntegerField(default=0)
+    date_updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return 'Accesses rolled up to {0} at {1}'.format(self.last_access, self.date_updated)
+
+    @staticmethod
+    def current():
+        watermark, created = AccessRollupWatermark.objects.get_or_create(pk=1)
+        return watermark
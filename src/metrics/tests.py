@@ -0,0 +1,146 @@
+__copyright__ = "Copyright 2017 Birkbeck, University of London"
+__author__ = "Martin Paul Eve & Andy Byers"
+__license__ = "AGPL v3"
+__maintainer__ = "Birkbeck Centre for Technology and Publishing"
+from dateutil.rrule import rrule, MONTHLY
+
+from django.core.cache import cache
+from django.db.models import Sum
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core import models as core_models
+from journal import models as journal_models
+from metrics import logic, models
+from submission import models as submission_models
+
+
+class MetricsTests(TestCase):
+
+    @staticmethod
+    def create_access(article, access_type, accessed):
+        models.ArticleAccess(article=article, type=access_type, identifier='test', galley_type='view',
+                             accessed=accessed).save()
+
+    @staticmethod
+    def date(year, month, day):
+        return timezone.datetime(year, month, day, tzinfo=timezone.utc)
+
+    def setUp(self):
+        """
+        Setup the test environment.
+        :return: None
+        """
+        # get_press_totals is cached on its arguments so clear anything left over from a previous test
+        cache.clear()
+
+        self.journal_one = journal_models.Journal(code="TST", domain="testserver")
+        self.journal_one.save()
+
+        self.journal_two = journal_models.Journal(code="TSA", domain="journal2.localhost")
+        self.journal_two.save()
+
+        self.user = core_models.Account.objects.create_user(email="metricsuser@martineve.com",
+                                                            username="metricsuser@martineve.com")
+
+        self.article_one = submission_models.Article(owner=self.user, title="A Test Article",
+                                                     abstract="An abstract",
+                                                     stage=submission_models.STAGE_PUBLISHED,
+                                                     date_published=self.date(2016, 6, 1),
+                                                     journal_id=self.journal_one.id)
+        self.article_one.save()
+
+        self.article_two = submission_models.Article(owner=self.user, title="A Second Test Article",
+                                                     abstract="An abstract",
+                                                     stage=submission_models.STAGE_PUBLISHED,
+                                                     date_published=self.date(2017, 2, 1),
+                                                     journal_id=self.journal_two.id)
+        self.article_two.save()
+
+        self.create_access(self.article_one, 'view', self.date(2017, 1, 3))
+        self.create_access(self.article_one, 'view', self.date(2017, 1, 31))
+        self.create_access(self.article_one, 'download', self.date(2017, 3, 15))
+        self.create_access(self.article_one, 'view', self.date(2016, 12, 31))
+        self.create_access(self.article_two, 'download', self.date(2017, 2, 2))
+
+        models.HistoricArticleAccess(article=self.article_one, views=5, downloads=1).save()
+
+        self.start_date = self.date(2017, 1, 1)
+        self.end_date = self.date(2017, 3, 31)
+        self.report_months = [dt for dt in rrule(MONTHLY, dtstart=self.start_date, until=self.end_date)]
+
+    def test_press_totals_match_per_article_counts(self):
+        total, views, downloads, press_months, journals = logic.get_press_totals(self.start_date, self.end_date,
+                                                                                 self.report_months)
+
+        self.assertEqual((total, views, downloads), (4, 2, 2))
+        self.assertEqual(press_months, {'Jan-2017': 2, 'Feb-2017': 1, 'Mar-2017': 1})
+
+        journal_one = [journal for journal in journals if journal['journal'] == self.journal_one][0]
+        journal_two = [journal for journal in journals if journal['journal'] == self.journal_two][0]
+
+        self.assertEqual((journal_one['total'], journal_one['total_views'], journal_one['total_downloads']),
+                         (3, 2, 1))
+        self.assertEqual((journal_one['Jan-2017'], journal_one['Jan-2017-views'], journal_one['Jan-2017-downloads']),
+                         (2, 2, ''))
+        self.assertEqual((journal_one['Feb-2017'], journal_one['Feb-2017-views'], journal_one['Feb-2017-downloads']),
+                         ('', '', ''))
+        self.assertEqual((journal_one['Mar-2017'], journal_one['Mar-2017-views'], journal_one['Mar-2017-downloads']),
+                         (1, '', 1))
+        self.assertEqual(journal_one['reporting_periods'], [('2017-01-01', '2017-01-31', 2, 2, ''),
+                                                            ('2017-02-01', '2017-02-28', '', '', ''),
+                                                            ('2017-03-01', '2017-03-31', 1, '', 1)])
+        self.assertEqual(journal_one['year_of_publication'], {})
+
+        self.assertEqual((journal_two['total'], journal_two['Feb-2017'], journal_two['Feb-2017-downloads']),
+                         (1, 1, 1))
+
+    def test_press_totals_compat_reports_empty_months_as_zero(self):
+        journals = logic.get_press_totals(self.start_date, self.end_date, self.report_months, compat=True)[4]
+        journal_two = [journal for journal in journals if journal['journal'] == self.journal_two][0]
+
+        self.assertEqual(journal_two['reporting_periods'], [('2017-01-01', '2017-01-31', 0, 0, 0),
+                                                            ('2017-02-01', '2017-02-28', 1, 0, 1),
+                                                            ('2017-03-01', '2017-03-31', 0, 0, 0)])
+
+    def test_year_of_publication_matches_article_metrics(self):
+        journals = logic.get_press_totals(self.start_date, self.end_date, self.report_months, do_yop=True)[4]
+        journal_one = [journal for journal in journals if journal['journal'] == self.journal_one][0]
+        journal_two = [journal for journal in journals if journal['journal'] == self.journal_two][0]
+
+        article_one_metrics = logic.ArticleMetrics(self.article_one)
+        article_two_metrics = logic.ArticleMetrics(self.article_two)
+
+        self.assertEqual(journal_one['year_of_publication'][2016],
+                         article_one_metrics.views + article_one_metrics.downloads)
+        self.assertEqual(journal_two['year_of_publication'][2017],
+                         article_two_metrics.views + article_two_metrics.downloads)
+        self.assertEqual(journal_one['year_of_publication'][2017], '')
+
+    def test_rollup_counts_match_raw_counts(self):
+        raw = logic.get_press_totals(self.start_date, self.end_date, self.report_months)
+        cache.clear()
+
+        self.assertEqual(logic.roll_up_article_accesses(chunk_size=2), 5)
+        # accesses recorded after the rollup has run are still counted from the raw table
+        self.create_access(self.article_two, 'view', self.date(2017, 2, 3))
+
+        with override_settings(METRICS_ACCESS_ROLLUP=True):
+            rolled_up = logic.get_press_totals(self.start_date, self.end_date, self.report_months)
+
+        self.assertEqual(rolled_up[0], raw[0] + 1)
+        self.assertEqual(rolled_up[3], {'Jan-2017': 2, 'Feb-2017': 2, 'Mar-2017': 1})
+        self.assertEqual(logic.roll_up_article_accesses(), 1)
+
+    def test_rollup_leaves_recent_accesses_for_a_later_run(self):
+        now = timezone.now()
+        self.create_access(self.article_one, 'view', now)
+        self.create_access(self.article_one, 'view', now - timezone.timedelta(hours=1))
+
+        # the older access was written after the recent one, so it waits with it until the lag has passed
+        self.assertEqual(logic.roll_up_article_accesses(), 5)
+        self.assertEqual(models.MonthlyArticleAccess.objects.filter(article=self.article_one).aggregate(
+            total=Sum('count'))['total'], 4)
+
+        with override_settings(METRICS_ACCESS_ROLLUP_LAG=0):
+            self.assertEqual(logic.roll_up_article_accesses(), 2)
@@ -11,7 +11,7 @@ from django.conf import settings
 from django.db import models
 from django.core.files.storage import FileSystemStorage
 
-from core import models as core_models
+from core import models as core_models, page_cache
 
 
 fs = FileSystemStorage(location=settings.MEDIA_ROOT)
@@ -60,6 +60,10 @@ class Press(models.Model):
     def __str__(self):
         return u'%s' % self.name
 
+    def save(self, *args, **kwargs):
+        super(Press, self).save(*args, **kwargs)
+        page_cache.bump_content_version()
+
     def __repr__(self):
         return u'%s' % self.name
 
@@ -10,6 +10,7 @@ from django.urls import reverse
 from production import models
 from core import files, models as core_models
 from copyediting import models as copyediting_models
+from cron import models as cron_models
 from utils import render_template
 
 
@@ -60,6 +61,7 @@ def replace_galley_file(article, request, galley, uploaded_file):
         new_file.save()
         galley.file = new_file
         galley.save()
+        cron_models.CronTask.add_galley_render_task(article)
     else:
         messages.add_message(request, messages.WARNING, 'No file was selected.')
 
@@ -44,6 +44,22 @@ class TypesetTask(models.Model):
 
     editor_reviewed = models.BooleanField(default=False)
 
+    def save(self, *args, **kwargs):
+        super(TypesetTask, self).save(*args, **kwargs)
+        self.invalidate_dashboard_counts()
+
+    def delete(self, *args, **kwargs):
+        self.invalidate_dashboard_counts()
+        return super(TypesetTask, self).delete(*args, **kwargs)
+
+    def invalidate_dashboard_counts(self):
+        from core import dashboard
+        journal_id = ProductionAssignment.objects.filter(
+            pk=self.assignment_id).values_list('article__journal_id', flat=True).first()
+
+        if journal_id:
+            dashboard.invalidate_journal_counts(journal_id)
+
     @property
     def is_active(self):
         if self.assigned and not self.completed:
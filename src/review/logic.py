@@ -5,6 +5,10 @@ __maintainer__ = "Birkbeck Centre for Technology and Publishing"
 from datetime import timedelta
 from uuid import uuid4
 
+from django.conf import settings
+from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.db.models import Avg, Count, FloatField, IntegerField, DateTimeField, Max, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
 from django.urls import reverse
 from django.utils import timezone
 from django.contrib import messages
@@ -16,12 +20,73 @@ from events import logic as event_logic
 from submission import models as submission_models
 
 
-def get_reviewers(article, request=None):
-    review_assignments = article.reviewassignment_set.filter(review_round=article.current_review_round_object())
-    reviewers = [review.reviewer.pk for review in review_assignments]
-    reviewers.append(request.user.pk)
+def get_reviewers(article, request=None, search=None):
+    """ Returns the journal's reviewers who are not already reviewing the article's current round, with their average
+    rating, active review count and last completed review annotated in the same query.
 
-    return core_models.AccountRole.objects.filter(role__slug='reviewer').exclude(user__pk__in=reviewers)
+    :param article: the Article needing reviewers
+    :param request: the request object, whose user is never offered as a reviewer
+    :param search: an optional term matched against names, email addresses and interests
+    :return: a queryset of Accounts
+    """
+    current_reviewers = models.ReviewAssignment.objects.filter(
+        article=article, review_round=article.current_review_round_object(), reviewer__isnull=False
+    ).values('reviewer')
+
+    reviewers = core_models.Account.objects.filter(
+        pk__in=core_models.AccountRole.objects.filter(journal=request.journal, role__slug='reviewer').values('user')
+    ).exclude(pk__in=current_reviewers).exclude(pk=request.user.pk)
+
+    ratings = models.ReviewerRating.objects.filter(assignment__reviewer=OuterRef('pk'))
+    active_reviews = models.ReviewAssignment.objects.filter(reviewer=OuterRef('pk'), is_complete=False)
+    completed_reviews = models.ReviewAssignment.objects.filter(reviewer=OuterRef('pk'), is_complete=True)
+
+    return search_accounts(reviewers, search).annotate(
+        average_score=Coalesce(reviewer_subquery(ratings, 'assignment__reviewer', Avg('rating'), FloatField()),
+                               Value(0), output_field=FloatField()),
+        active_review_count=Coalesce(reviewer_subquery(active_reviews, 'reviewer', Count('pk'), IntegerField()),
+                                     Value(0), output_field=IntegerField()),
+        last_review_date=reviewer_subquery(completed_reviews, 'reviewer', Max('date_complete'), DateTimeField()),
+    ).prefetch_related('interest').order_by('last_name', 'first_name', 'pk')
+
+
+def reviewer_subquery(queryset, reviewer_field, aggregate, output_field):
+    # grouping on the reviewer column aggregates each reviewer's rows into the single value a Subquery needs
+    return Subquery(queryset.order_by().values(reviewer_field).annotate(value=aggregate).values('value'),
+                    output_field=output_field)
+
+
+def search_accounts(accounts, search):
+    """ Filters accounts by a term found in their names, email address or interests.
+
+    :param accounts: a queryset of Accounts
+    :param search: the search term, or None for no filtering
+    :return: a queryset of Accounts
+    """
+    if not search:
+        return accounts
+
+    interested = core_models.Account.interest.through.objects.filter(interest__name__icontains=search)
+
+    return accounts.filter(Q(first_name__icontains=search) | Q(last_name__icontains=search) |
+                           Q(email__icontains=search) | Q(pk__in=interested.values('account')))
+
+
+def paginate_accounts(accounts, page):
+    """ Returns a page of accounts, REVIEWER_CANDIDATES_PAGE_SIZE at a time.
+
+    :param accounts: a queryset of Accounts
+    :param page: the requested page number
+    :return: a Page of Accounts
+    """
+    paginator = Paginator(accounts, getattr(settings, 'REVIEWER_CANDIDATES_PAGE_SIZE', 25))
+
+    try:
+        return paginator.page(page)
+    except PageNotAnInteger:
+        return paginator.page(1)
+    except EmptyPage:
+        return paginator.page(paginator.num_pages)
 
 
 def get_assignment_content(request, article, editor, assignment):
@@ -247,7 +312,15 @@ def handle_reviewer_form(request, new_reviewer_form):
     messages.add_message(request, messages.INFO, 'A new account has been created.')
 
 
-def get_enrollable_users(request):
-    account_roles = core_models.AccountRole.objects.filter(journal=request.journal, role__slug='reviewer')
-    users_with_role = [assignment.user.pk for assignment in account_roles]
-    return core_models.Account.objects.all().order_by('last_name').exclude(pk__in=users_with_role)
+def get_enrollable_users(request, search=None):
+    """ Returns the accounts that are not yet reviewers for the journal.
+
+    :param request: the request object
+    :param search: an optional term matched against names, email addresses and interests
+    :return: a queryset of Accounts
+    """
+    users_with_role = core_models.AccountRole.objects.filter(journal=request.journal,
+                                                             role__slug='reviewer').values('user')
+    accounts = core_models.Account.objects.exclude(pk__in=users_with_role)
+
+    return search_accounts(accounts, search).prefetch_related('interest').order_by('last_name', 'first_name', 'pk')
@@ -597,10 +597,12 @@ def add_review_assignment(request, article_id):
     article = get_object_or_404(submission_models.Article, pk=article_id)
     form = forms.ReviewAssignmentForm(journal=request.journal)
     new_reviewer_form = core_forms.QuickUserForm()
-    reviewers = logic.get_reviewers(article, request)
-    user_list = logic.get_enrollable_users(request)
+    reviewers = logic.paginate_accounts(logic.get_reviewers(article, request, request.GET.get('search')),
+                                        request.GET.get('page', 1))
+    user_list = logic.paginate_accounts(logic.get_enrollable_users(request, request.GET.get('enroll_search')),
+                                        request.GET.get('enroll_page', 1))
 
-    modal = None
+    modal = 'enroll' if 'enroll_search' in request.GET or 'enroll_page' in request.GET else None
 
     if request.POST:
 
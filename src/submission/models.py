@@ -605,13 +605,56 @@ class Article(models.Model):
             return 'Submission Complete'
 
     def save(self, *args, **kwargs):
+        in_sitemap = self.date_published is not None
+        stage_changed = self.pk is None
+
         if self.pk is not None:
             current_object = Article.objects.get(pk=self.pk)
+            in_sitemap = in_sitemap or current_object.date_published is not None
             if current_object.stage != self.stage:
+                stage_changed = True
                 ArticleStageLog.objects.create(article=self, stage_from=current_object.stage,
                                                stage_to=self.stage)
         super(Article, self).save(*args, **kwargs)
 
+        if stage_changed and self.journal_id:
+            from core import dashboard
+            dashboard.invalidate_journal_counts(self.journal_id)
+
+        issue_ids = list(self.issues.values_list('pk', flat=True))
+
+        if issue_ids:
+            from journal import models as journal_models
+            journal_models.Issue.invalidate_toc(*issue_ids)
+
+        if in_sitemap:
+            from core import page_cache
+            from journal import logic as journal_logic, search
+            journal_logic.invalidate_article_sitemap(self)
+            page_cache.bump_content_version(self.journal_id)
+
+            if search.search_enabled():
+                search.update_article(self)
+
+    def delete(self, *args, **kwargs):
+        from core import dashboard
+        from journal import models as journal_models
+        journal_models.Issue.invalidate_toc(*self.issues.values_list('pk', flat=True))
+
+        if self.journal_id:
+            dashboard.invalidate_journal_counts(self.journal_id)
+
+        if self.date_published:
+            from core import page_cache
+            from journal import logic as journal_logic, search
+            journal_logic.invalidate_article_sitemap(self)
+            page_cache.bump_content_version(self.journal_id)
+
+            if search.search_enabled():
+                search.drop_article(self.pk)
+
+        return super(Article, self).delete(*args, **kwargs)
+
     def production_managers(self):
         return [assignment.production_manager for assignment in self.productionassignment_set.all()]
 
@@ -776,7 +819,8 @@ class Article(models.Model):
             author.snapshot_self(article)
 
     def frozen_authors(self):
-        return FrozenAuthor.objects.filter(article=self)
+        # the reverse accessor uses prefetch_related('frozenauthor_set') where a listing has set it up
+        return self.frozenauthor_set.all()
 
     def editor_override(self, editor):
         check = review_models.EditorOverride.objects.filter(article=self, editor=editor)
@@ -19,6 +19,7 @@ admin_list = [
     (models.PluginSetting,),
     (models.PluginSettingValue, SettingValueAdmin),
     (models.ImportCacheEntry,),
+    (models.OAIHarvestCheckpoint,),
 ]
 
 [admin.site.register(*t) for t in admin_list]
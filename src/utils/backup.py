@@ -0,0 +1,447 @@
+__copyright__ = "Copyright 2017 Birkbeck, University of London"
+__author__ = "Martin Paul Eve & Andy Byers"
+__license__ = "AGPL v3"
+__maintainer__ = "Birkbeck Centre for Technology and Publishing"
+
+import fnmatch
+import gzip
+import hashlib
+import io
+import json
+import os
+import shutil
+import tarfile
+from contextlib import closing, contextmanager
+from uuid import uuid4
+
+from django.apps import apps
+from django.conf import settings
+from django.core import serializers
+from django.core.management.color import no_style
+from django.db import connection, router, transaction
+
+BACKUP_PREFIX = 'backups/'
+MANIFEST = 'manifest.json'
+FILES_ARCHIVE = 'files.tar.gz'
+DATABASE_EXPORT = 'database.jsonl.gz'
+BACKUP_ROOTS = ('files', 'media')
+
+# Directories, relative to the base directory, that are not backed up: scratch space, and data that is derived from
+# the database or from other files and rebuilt when missing. Their contents change constantly, and the search index
+# may be mid-write, so copying them would bloat every incremental backup without making it any more complete.
+BACKUP_EXCLUDE = (
+    'files/temp',
+    'media/temp',
+    'files/search',
+    'files/import_cache',
+    'files/sitemaps',
+    'files/access_buffer',
+    'files/articles/*/rendered',
+)
+
+
+def get_store():
+    """ Returns the store configured by BACKUP_TYPE.
+
+    :return: an S3Store or DirectoryStore
+    """
+    if settings.BACKUP_TYPE == 's3':
+        return S3Store(
+            bucket_name=settings.S3_BUCKET_NAME,
+            host=settings.S3_HOST,
+            access_key=settings.S3_ACCESS_KEY,
+            secret_key=settings.S3_SECRET_KEY,
+            port=getattr(settings, 'S3_PORT', None),
+            secure=getattr(settings, 'S3_SECURE', True),
+            part_size=getattr(settings, 'BACKUP_PART_SIZE', 8 * 1024 * 1024),
+        )
+
+    return DirectoryStore(settings.BACKUP_DIR)
+
+
+class DirectoryStore(object):
+    """ Stores backups in a local directory, eg. a mounted volume. """
+
+    def __init__(self, path):
+        self.path = path
+
+    def _path(self, name):
+        return os.path.join(self.path, *name.split('/'))
+
+    @contextmanager
+    def writer(self, name):
+        """ Yields a file to write an object to, which only appears under its name once it is complete.
+
+        :param name: the object name
+        :return: a binary file object
+        """
+        path = self._path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = '{0}.{1}.tmp'.format(path, uuid4())
+
+        try:
+            with open(temp_path, 'wb') as f:
+                yield f
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def reader(self, name):
+        return open(self._path(name), 'rb')
+
+    def list(self, prefix):
+        names = []
+
+        for root, dirs, files in os.walk(self._path(prefix)):
+            for file_name in files:
+                if not file_name.endswith('.tmp'):
+                    names.append(os.path.relpath(os.path.join(root, file_name), self.path).replace(os.sep, '/'))
+
+        return names
+
+
+class S3Store(object):
+    """ Stores backups in a bucket on S3 or any S3-compatible endpoint, uploading objects in parts as they are written.
+    """
+
+    def __init__(self, bucket_name, host, access_key, secret_key, port=None, secure=True, part_size=8 * 1024 * 1024):
+        import boto
+        from boto.s3.connection import OrdinaryCallingFormat
+
+        # path-style addressing works with AWS and with stand-ins such as MinIO
+        self.connection = boto.connect_s3(aws_access_key_id=access_key, aws_secret_access_key=secret_key, host=host,
+                                          port=port, is_secure=secure, calling_format=OrdinaryCallingFormat())
+        self.bucket = self.connection.get_bucket(bucket_name)
+        self.part_size = part_size
+
+    @contextmanager
+    def writer(self, name):
+        """ Yields a file-like object whose contents are sent as a multipart upload. The upload is cancelled if the
+        block raises.
+
+        :param name: the object name
+        :return: a MultipartWriter
+        """
+        writer = MultipartWriter(self.bucket.initiate_multipart_upload(name), self.part_size)
+
+        try:
+            yield writer
+        except BaseException:
+            writer.upload.cancel_upload()
+            raise
+
+        writer.complete()
+
+    def reader(self, name):
+        key = self.bucket.get_key(name)
+
+        if key is None:
+            raise FileNotFoundError(name)
+
+        return closing(key)
+
+    def list(self, prefix):
+        return [key.name for key in self.bucket.list(prefix=prefix)]
+
+
+class MultipartWriter(object):
+    """ Buffers writes and uploads them part_size bytes at a time. S3 requires every part but the last to be at least
+    5MB. """
+
+    def __init__(self, upload, part_size):
+        self.upload = upload
+        self.part_size = part_size
+        self.buffer = io.BytesIO()
+        self.parts = 0
+
+    def write(self, data):
+        self.buffer.write(data)
+
+        if self.buffer.tell() >= self.part_size:
+            self._upload_part()
+
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def _upload_part(self):
+        self.parts += 1
+        self.buffer.seek(0)
+        self.upload.upload_part_from_file(self.buffer, self.parts)
+        self.buffer = io.BytesIO()
+
+    def complete(self):
+        if self.buffer.tell() or not self.parts:
+            self._upload_part()
+
+        self.upload.complete_upload()
+
+
+def file_hash(path):
+    sha = hashlib.sha256()
+
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(chunk)
+
+    return sha.hexdigest()
+
+
+def relative_path(path, base_dir):
+    return os.path.relpath(path, base_dir).replace(os.sep, '/')
+
+
+def scan_files(base_dir, roots=BACKUP_ROOTS, exclude=BACKUP_EXCLUDE):
+    """ Lists the files to back up, skipping excluded directories.
+
+    :param base_dir: the directory the roots are relative to
+    :param roots: a list of directory names
+    :param exclude: a list of glob patterns of directories, relative to base_dir, to skip
+    :return: a dictionary of relative path to os.stat result
+    """
+    found = {}
+
+    for root in roots:
+        for directory, dirs, files in os.walk(os.path.join(base_dir, root)):
+            dirs[:] = [name for name in dirs if not any(
+                fnmatch.fnmatchcase(relative_path(os.path.join(directory, name), base_dir), pattern)
+                for pattern in exclude)]
+
+            for file_name in files:
+                path = os.path.join(directory, file_name)
+
+                if os.path.isfile(path):
+                    found[relative_path(path, base_dir)] = os.stat(path)
+
+    return found
+
+
+def latest_manifest(store, before=None):
+    """ Loads the manifest of the most recent complete backup.
+
+    :param store: a backup store
+    :param before: only consider backups older than this name
+    :return: a tuple of the backup name and its manifest, or (None, {})
+    """
+    names = sorted(name.split('/')[1] for name in store.list(BACKUP_PREFIX) if name.endswith('/' + MANIFEST))
+
+    if before:
+        names = [name for name in names if name < before]
+
+    if not names:
+        return None, {}
+
+    return names[-1], load_manifest(store, names[-1])
+
+
+def load_manifest(store, name):
+    with store.reader(backup_object(name, MANIFEST)) as f:
+        return json.loads(f.read().decode('utf-8'))
+
+
+def backup_object(name, object_name):
+    return '{0}{1}/{2}'.format(BACKUP_PREFIX, name, object_name)
+
+
+def backup_files(store, name, base_dir, previous=None, full=False):
+    """ Archives the files that have changed since the previous backup and writes this backup's manifest entries.
+
+    Files whose size and modification time match the previous manifest are not read at all. Other files are hashed and
+    only added to this backup's archive if no earlier backup already holds the same content, so a touched or copied
+    file costs nothing to store. The archive is compressed and streamed straight to the store.
+
+    :param store: a backup store
+    :param name: the name of this backup
+    :param base_dir: the directory holding the backup roots
+    :param previous: the previous backup's manifest
+    :param full: store every file in this backup's archive
+    :return: the manifest, a dictionary of relative path to file entry
+    """
+    previous = {} if full else (previous or {})
+    archived = {entry['sha256']: entry for entry in previous.values()}
+    manifest = {}
+
+    with store.writer(backup_object(name, FILES_ARCHIVE)) as writer, tarfile.open(fileobj=writer, mode='w|gz') as tar:
+        for path, stat in sorted(scan_files(base_dir).items()):
+            entry = previous.get(path)
+
+            if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+                manifest[path] = entry
+                continue
+
+            sha256 = file_hash(os.path.join(base_dir, path))
+            existing = archived.get(sha256)
+
+            if existing:
+                manifest[path] = dict(existing, size=stat.st_size, mtime=stat.st_mtime)
+                continue
+
+            print('Archiving {0}'.format(path))
+            tar.add(os.path.join(base_dir, path), arcname=path, recursive=False)
+            manifest[path] = archived[sha256] = {
+                'size': stat.st_size,
+                'mtime': stat.st_mtime,
+                'sha256': sha256,
+                'archive': name,
+                'member': path,
+            }
+
+    return manifest
+
+
+def dumpable_models():
+    """ Lists models in dependency order, as dumpdata does.
+
+    :return: a list of model classes
+    """
+    app_list = [(app_config, None) for app_config in apps.get_app_configs() if app_config.models_module is not None]
+
+    return [model for model in serializers.sort_dependencies(app_list)
+            if not model._meta.proxy and router.allow_migrate_model(connection.alias, model)]
+
+
+def backup_database(store, name, chunk_size=None):
+    """ Exports every table in chunks of primary keys, writing one JSON list of objects per line of a gzipped stream.
+
+    :param store: a backup store
+    :param name: the name of this backup
+    :param chunk_size: the number of objects serialized at a time
+    :return: the number of objects exported
+    """
+    chunk_size = chunk_size or getattr(settings, 'BACKUP_DB_CHUNK_SIZE', 1000)
+    exported = 0
+
+    with store.writer(backup_object(name, DATABASE_EXPORT)) as writer, \
+            gzip.GzipFile(fileobj=writer, mode='wb') as export:
+        for model in dumpable_models():
+            print('Exporting {0}'.format(model._meta.label))
+            queryset = model._base_manager.order_by('pk')
+            last_pk = None
+
+            while True:
+                chunk = queryset.filter(pk__gt=last_pk) if last_pk is not None else queryset
+                chunk = list(chunk[:chunk_size])
+
+                if not chunk:
+                    break
+
+                export.write(serializers.serialize('json', chunk).encode('utf-8') + b'\n')
+                exported += len(chunk)
+                last_pk = chunk[-1].pk
+
+    return exported
+
+
+def run_backup(store, name, base_dir=None, full=False, database=True):
+    """ Makes a backup. The manifest is written last, so a backup that fails part way is never used as the base for
+    the next one or offered for restore.
+
+    :param store: a backup store
+    :param name: the name of this backup, which should sort after earlier backups
+    :param base_dir: the directory holding the backup roots
+    :param full: archive every file rather than only those changed since the previous backup
+    :param database: whether to export the database
+    :return: the manifest
+    """
+    base_dir = base_dir or settings.BASE_DIR
+    previous_name, previous = latest_manifest(store, before=name)
+
+    if previous_name and not full:
+        print('Backing up changes since {0}'.format(previous_name))
+
+    files = backup_files(store, name, base_dir, previous.get('files'), full=full)
+    manifest = {'name': name, 'files': files, 'database': None}
+
+    if database:
+        backup_database(store, name)
+        manifest['database'] = name
+
+    with store.writer(backup_object(name, MANIFEST)) as writer:
+        writer.write(json.dumps(manifest).encode('utf-8'))
+
+    return manifest
+
+
+def restore_files(store, manifest, base_dir):
+    """ Restores the files listed in a manifest, reading each archive that holds any of them once, in a single pass.
+
+    Files already on disk with the right content are left alone.
+
+    :param store: a backup store
+    :param manifest: the manifest of the backup to restore
+    :param base_dir: the directory to restore into
+    :return: the number of files written
+    """
+    wanted = {}
+
+    for path, entry in manifest['files'].items():
+        target = os.path.join(base_dir, *path.split('/'))
+
+        if os.path.isfile(target) and os.path.getsize(target) == entry['size'] and file_hash(target) == entry['sha256']:
+            continue
+
+        wanted.setdefault(entry['archive'], {}).setdefault(entry['member'], []).append(target)
+
+    written = 0
+
+    for archive, members in sorted(wanted.items()):
+        with store.reader(backup_object(archive, FILES_ARCHIVE)) as reader, \
+                tarfile.open(fileobj=reader, mode='r|gz') as tar:
+            for member in tar:
+                if member.name not in members:
+                    continue
+
+                first, others = members[member.name][0], members[member.name][1:]
+                restore_file(tar.extractfile(member), first, base_dir)
+
+                # paths with the same content share an archive member, so the rest are copied from the first
+                for target in others:
+                    with open(first, 'rb') as source:
+                        restore_file(source, target, base_dir)
+
+                written += len(members[member.name])
+
+    return written
+
+
+def restore_file(source, target, base_dir):
+    print('Restoring {0}'.format(os.path.relpath(target, base_dir)))
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    temp_path = '{0}.{1}.tmp'.format(target, uuid4())
+
+    with open(temp_path, 'wb') as f:
+        shutil.copyfileobj(source, f)
+
+    os.replace(temp_path, target)
+
+
+def restore_database(store, name):
+    """ Loads a database export, one chunk at a time, in a single transaction.
+
+    :param store: a backup store
+    :param name: the name of the backup holding the export
+    :return: the number of objects loaded
+    """
+    loaded = 0
+    models = set()
+
+    with store.reader(backup_object(name, DATABASE_EXPORT)) as reader, \
+            gzip.GzipFile(fileobj=reader, mode='rb') as export, \
+            transaction.atomic(), connection.constraint_checks_disabled():
+        for line in export:
+            for obj in serializers.deserialize('json', line.decode('utf-8')):
+                obj.save()
+                models.add(obj.object.__class__)
+                loaded += 1
+
+        # as in loaddata, sequences are reset so that new rows do not collide with restored primary keys
+        sequence_sql = connection.ops.sequence_reset_sql(no_style(), models)
+
+        if sequence_sql:
+            with connection.cursor() as cursor:
+                for sql in sequence_sql:
+                    cursor.execute(sql)
+
+    return loaded
@@ -2,15 +2,21 @@ __copyright__ = "Copyright 2017 Birkbeck, University of London"
 __author__ = "Martin Paul Eve & Andy Byers"
 __license__ = "AGPL v3"
 __maintainer__ = "Birkbeck Centre for Technology and Publishing"
+import queue
+import threading
+
 from submission import models
 from journal import models as journal_models
 from core import models as core_models
+from utils import models as utils_models
 
 import requests
 from requests.packages.urllib3.exceptions import InsecureRequestWarning
 from bs4 import BeautifulSoup
+from django.conf import settings
+from django.db import connection
 from urllib.parse import urlparse
-from utils.importers import up, ojs
+from utils.importers import up, ojs, shared
 
 
 def clear_db(journal):
@@ -108,7 +114,7 @@ def import_journal_metadata(**options):
 def import_oai(**options):
     """ Imports an OAI feed
 
-    :param options: a dictionary containing 'journal_id', 'user_id', 'url' and optionally a 'delete' flag
+    :param options: a dictionary containing 'journal_id', 'user_id', 'url' and optionally 'delete' and 'restart' flags
     :return: None
     """
     requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
@@ -122,39 +128,154 @@ def import_oai(**options):
 
 
 def parse_OAI(journal, options, user, resume=None):
+    """ Harvests an OAI feed page by page and imports its records.
 
-    if resume:
-        verb = '?verb=ListRecords&resumptionToken={0}'.format(resume)
-    else:
-        verb = '?verb=ListRecords&metadataPrefix=oai_dc'
-
-    url = options['url'] + verb
+    A producer thread fetches each page, downloads the article pages it lists into the import cache and queues it,
+    running at most OAI_IMPORT_QUEUE_SIZE pages ahead of the import. The resumption token is checkpointed once a page
+    has been imported, so running the harvest again after a crash picks up from the last complete page.
 
+    :param journal: the journal to import to
+    :param options: a dictionary containing 'url' and optionally a 'restart' flag
+    :param user: the user who will own imported articles
+    :param resume: a resumption token to start from instead of the checkpointed one
+    :return: the OAIHarvestCheckpoint
+    """
+    url = options['url']
     journal_type = identify_journal_type_by_oai(url)
     parsed_uri = urlparse(url)
     domain = '{uri.scheme}://{uri.netloc}/'.format(uri=parsed_uri)
 
-    # note: we're not caching OAI pages as they update regularly
-    page = requests.get(url, verify=False)
-    soup = BeautifulSoup(page.text, "lxml")
-
-    if journal_type == "UP":
-        print("Detected journal type as UP. Processing.")
-        up.import_oai(journal, user, soup, domain)
-    elif journal_type == "OJS":
-        print("Detected journal type as OJS. Processing.")
-        ojs.import_oai(journal, user, soup)
-    else:
+    if journal_type not in ('UP', 'OJS'):
         print("Journal type currently unsupported")
+        return None
+
+    print("Detected journal type as {0}. Processing.".format(journal_type))
+
+    checkpoint, created = utils_models.OAIHarvestCheckpoint.objects.get_or_create(
+        journal=journal, url_hash=utils_models.hash_url(url), defaults={'url': url})
+
+    if resume is None and checkpoint.resumption_token and not checkpoint.complete \
+            and not options.get('restart') and not options.get('delete'):
+        print('Resuming harvest after {0} pages'.format(checkpoint.pages))
+        resume = checkpoint.resumption_token
+    elif resume is None:
+        checkpoint.resumption_token, checkpoint.pages, checkpoint.records = None, 0, 0
+
+    checkpoint.complete = False
+    checkpoint.save()
+
+    pages = queue.Queue(maxsize=getattr(settings, 'OAI_IMPORT_QUEUE_SIZE', 2))
+    stop = threading.Event()
+    producer = threading.Thread(target=harvest_pages, args=(url, journal_type, resume, pages, stop),
+                                name='oai-harvester', daemon=True)
+    producer.start()
+
+    try:
+        while True:
+            page = pages.get()
+
+            if page is None:
+                break
+            elif isinstance(page, Exception):
+                raise page
+
+            soup, resume = page
+
+            if journal_type == "UP":
+                up.import_oai(journal, user, soup, domain)
+            else:
+                ojs.import_oai(journal, user, soup)
+
+            checkpoint.resumption_token = resume
+            checkpoint.pages += 1
+            checkpoint.records += len(oai_record_urls(soup, journal_type))
+            checkpoint.complete = not resume
+            checkpoint.save()
+
+            if resume:
+                print('Executing resumeToken')
+    finally:
+        stop.set()
+        producer.join()
+
+    return checkpoint
+
+
+def harvest_pages(url, journal_type, resume, pages, stop):
+    """ Fetches OAI pages in order, following resumption tokens, and puts them on a queue for import.
+
+    Each queued item is a tuple of the page's BeautifulSoup object and its resumption token. None is queued after the
+    last page, or the exception if harvesting fails.
+
+    :param url: the URL to the OAI feed
+    :param journal_type: the type of journal, as returned by identify_journal_type_by_oai
+    :param resume: a resumption token to start from, or None to start at the beginning
+    :param pages: a bounded Queue
+    :param stop: an Event set when the importer no longer wants pages
+    :return: None
+    """
+    try:
+        while True:
+            if resume:
+                verb = '?verb=ListRecords&resumptionToken={0}'.format(resume)
+            else:
+                verb = '?verb=ListRecords&metadataPrefix=oai_dc'
+
+            # note: we're not caching OAI pages as they update regularly
+            page = requests.get(url + verb, verify=False)
+            soup = BeautifulSoup(page.text, "lxml")
+
+            shared.prefetch(oai_record_urls(soup, journal_type))
+
+            # see if there is a resumption token
+            resume = soup.find('resumptiontoken')
+            resume = resume.getText() if resume else None
+
+            if not put_page(pages, (soup, resume), stop) or not resume:
+                break
+
+        put_page(pages, None, stop)
+    except Exception as e:
+        put_page(pages, e, stop)
+    finally:
+        connection.close()
+
+
+def put_page(pages, page, stop):
+    """ Puts a page on the queue, waiting for space unless the importer has stopped.
+
+    :param pages: a bounded Queue
+    :param page: the item to queue
+    :param stop: an Event set when the importer no longer wants pages
+    :return: True if the page was queued
+    """
+    while not stop.is_set():
+        try:
+            pages.put(page, timeout=1)
+            return True
+        except queue.Full:
+            continue
+
+    return False
+
+
+def oai_record_urls(soup, journal_type):
+    """ Lists the article URLs on a page of an OAI feed.
+
+    :param soup: the BeautifulSoup object of the OAI page
+    :param journal_type: the type of journal, as returned by identify_journal_type_by_oai
+    :return: a list of URLs
+    """
+    urls = []
 
-    # see if there is a resumption token
-    resume = soup.find('resumptiontoken')
+    for identifier in soup.findAll('dc:identifier'):
+        url = identifier.contents[0]
 
-    if resume:
-        resume = resume.getText()
+        if journal_type == "UP":
+            # matches the /jms rewrite made by up.import_oai
+            url = url.replace('/jms', '')
 
-    if resume and resume != '':
-        print('Executing resumeToken')
-        parse_OAI(journal, options, user, resume=resume)
+        if url.startswith('http'):
+            urls.append(url)
 
-    return soup
+    return urls
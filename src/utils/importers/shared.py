@@ -1,4 +1,7 @@
 import os
+import shutil
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from urllib.parse import urlparse
 from uuid import uuid4
@@ -6,6 +9,7 @@ from uuid import uuid4
 import requests
 from bs4 import BeautifulSoup
 from django.conf import settings
+from django.db import connection
 from django.urls import reverse
 from django.utils import timezone
 
@@ -39,8 +43,10 @@ def fetch_images_and_rewrite_xml_paths(base, root, contents, article, user):
         'graphic': 'xlink:href'
     }
 
-    # iterate over all found elements
-    for element, attribute in elements. items():
+    # collect the URL of every found element before downloading anything
+    found = []
+
+    for element, attribute in elements.items():
         images = soup.findAll(element)
 
         # iterate over all found elements of each type in the elements dictionary
@@ -56,22 +62,28 @@ def fetch_images_and_rewrite_xml_paths(base, root, contents, article, user):
                 if not url.startswith('/') and not url.startswith('http'):
                     url_to_use = root.replace('/article/view', '/articles') + '/' + url
 
-                # download the image file
-                filename, mime = fetch_file(base, url_to_use, root, '', article, user, handle_images=False)
+                found.append((url, url_to_use))
+
+    # download the images concurrently so that fetch_file below reads each one from the import cache
+    prefetch([url_to_use if url_to_use.startswith('http') else base + url_to_use for url, url_to_use in found])
+
+    for url, url_to_use in found:
+        # download the image file
+        filename, mime = fetch_file(base, url_to_use, root, '', article, user, handle_images=False)
 
-                # determine the MIME type and slice the first open bracket and everything after the comma off
-                mime = mime.split(',')[0][1:].replace("'", "")
+        # determine the MIME type and slice the first open bracket and everything after the comma off
+        mime = mime.split(',')[0][1:].replace("'", "")
 
-                # store this image in the database affiliated with the new article
-                new_file = add_file(mime, '', 'Galley image', user, filename, article, False)
-                absolute_new_filename = reverse('article_file_download',
-                                                kwargs={'identifier_type': 'id', 'identifier': article.id,
-                                                        'file_id': new_file.id})
+        # store this image in the database affiliated with the new article
+        new_file = add_file(mime, '', 'Galley image', user, filename, article, False)
+        absolute_new_filename = reverse('article_file_download',
+                                        kwargs={'identifier_type': 'id', 'identifier': article.id,
+                                                'file_id': new_file.id})
 
-                # rewrite the HTML or XML contents to point to the new image filename (a reverse lookup of
-                # article_file_download)
-                print('Replacing image URL {0} with {1}'.format(url, absolute_new_filename))
-                contents = str(contents).replace(url, absolute_new_filename)
+        # rewrite the HTML or XML contents to point to the new image filename (a reverse lookup of
+        # article_file_download)
+        print('Replacing image URL {0} with {1}'.format(url, absolute_new_filename))
+        contents = str(contents).replace(url, absolute_new_filename)
 
     return contents
 
@@ -95,6 +107,38 @@ def parse_date(date_string, is_iso):
         return timezone.now()
 
 
+def prefetch(urls, workers=None):
+    """ Downloads remote files into the import cache concurrently, so that later fetches are read from disk.
+
+    Failures are only reported here: the serial fetch that follows retries the URL and raises as it always has.
+
+    :param urls: a list of full URLs
+    :param workers: the number of simultaneous downloads, defaulting to the IMPORT_FETCH_WORKERS setting
+    :return: None
+    """
+    urls = list(OrderedDict.fromkeys(urls))
+    cached = set(utils_models.ImportCacheEntry.objects.filter(
+        url_hash__in=[utils_models.hash_url(url) for url in urls]).values_list('url', flat=True))
+    missing = [url for url in urls if url not in cached]
+
+    if not missing:
+        return
+
+    workers = workers or getattr(settings, 'IMPORT_FETCH_WORKERS', 8)
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(missing))) as executor:
+        list(executor.map(_prefetch_url, missing))
+
+
+def _prefetch_url(url):
+    try:
+        utils_models.ImportCacheEntry.get_or_fetch(url=url)
+    except Exception as e:
+        print('Error prefetching {0}: {1}'.format(url, e))
+    finally:
+        connection.close()
+
+
 def fetch_file(base, url, root, extension, article, user, handle_images=False):
     """ Download a remote file and store in the database affiliated to a specific article
 
@@ -117,7 +161,8 @@ def fetch_file(base, url, root, extension, article, user, handle_images=False):
     print('Fetching {0}'.format(url))
 
     # imitate headers from a browser to avoid being blocked on some installs
-    resp, mime = utils_models.ImportCacheEntry.fetch(url=url)
+    entry = utils_models.ImportCacheEntry.get_or_fetch(url=url)
+    mime = entry.mime_type
 
     # set the filename to a unique UUID4 identifier with the passed file extension
     filename = '{0}.{1}'.format(uuid4(), extension)
@@ -131,15 +176,19 @@ def fetch_file(base, url, root, extension, article, user, handle_images=False):
 
     # intercept the request if we need to parse this as HTML or XML with images to rewrite
     if handle_images:
-        resp = resp.decode()
-        resp = fetch_images_and_rewrite_xml_paths(base, root, resp, article, user)
+        with entry.open() as cached:
+            resp = cached.read().decode()
 
-    if isinstance(resp, str):
-        resp = bytes(resp, 'utf-8')
+        resp = fetch_images_and_rewrite_xml_paths(base, root, resp, article, user)
 
-    with open(os.path.join(path, filename), 'wb') as f:
-        print("Writing file {0} as binary".format(os.path.join(path, filename)))
-        f.write(resp)
+        with open(os.path.join(path, filename), 'wb') as f:
+            print("Writing file {0} as binary".format(os.path.join(path, filename)))
+            f.write(bytes(resp, 'utf-8'))
+    else:
+        # copy the cached file across in chunks rather than reading it into memory
+        with entry.open() as cached, open(os.path.join(path, filename), 'wb') as f:
+            print("Writing file {0} as binary".format(os.path.join(path, filename)))
+            shutil.copyfileobj(cached, f)
 
     # return the filename and MIME type
     return filename, mime
@@ -264,8 +313,8 @@ def fetch_page(url):
     :return: a BeautifulSoup object
     """
     requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
-    resp, mime = utils_models.ImportCacheEntry.fetch(url=url)
-    return BeautifulSoup(resp, 'lxml-xml')
+    with utils_models.ImportCacheEntry.get_or_fetch(url=url).open() as cached:
+        return BeautifulSoup(cached, 'lxml-xml')
 
 
 def extract_and_check_doi(soup_object):
@@ -501,6 +550,9 @@ def set_article_galleys(domain, galleys, article, url, user):
     :param user: the user who should own the new file
     :return: None
     """
+    prefetch([galley if galley.startswith('http') else domain + galley
+              for galley_name, galley in galleys.items() if galley and galley_name in ('PDF', 'XML')])
+
     for galley_name, galley in galleys.items():
         if galley:
             if galley_name == 'PDF' or galley_name == 'XML':
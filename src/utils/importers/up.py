@@ -1,4 +1,5 @@
 import re
+import shutil
 
 import requests
 from bs4 import BeautifulSoup
@@ -213,7 +214,7 @@ def import_issue_images(journal, user, url):
         img_url = base_url + soup.find(src=pattern)['src']
         print("Fetching {0}".format(img_url))
 
-        resp, mime = utils_models.ImportCacheEntry.fetch(url=img_url)
+        entry = utils_models.ImportCacheEntry.get_or_fetch(url=img_url)
 
         path = os.path.join(core.settings.BASE_DIR, 'files', 'journals', str(journal.id))
 
@@ -221,8 +222,8 @@ def import_issue_images(journal, user, url):
 
         path = os.path.join(path, 'volume{0}_issue_{0}.graphic'.format(issue.volume, issue.issue))
 
-        with open(path, 'wb') as f:
-            f.write(resp)
+        with entry.open() as cached, open(path, 'wb') as f:
+            shutil.copyfileobj(cached, f)
 
         with open(path, 'rb') as f:
             issue.cover_image.save(path, File(f))
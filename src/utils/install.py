@@ -15,6 +15,7 @@ from utils import setting_handler
 from submission import models as submission_models
 
 
+@setting_handler.deferred_invalidation()
 def update_settings(journal_object, management_command=False, overwrite_with_defaults=False):
     """ Updates or creates the settings for a journal from journal_defaults.json.
 
@@ -63,6 +64,7 @@ def update_settings(journal_object, management_command=False, overwrite_with_def
                 print('Parsed setting {0}'.format(item['setting'].get('name')))
 
 
+@setting_handler.deferred_invalidation()
 def update_emails(journal_object, management_command=False):
     """
     Updates email settings with new versions.
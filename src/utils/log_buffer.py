@@ -0,0 +1,61 @@
+__copyright__ = "Copyright 2017 Birkbeck, University of London"
+__author__ = "Martin Paul Eve & Andy Byers"
+__license__ = "AGPL v3"
+__maintainer__ = "Birkbeck Centre for Technology and Publishing"
+
+import atexit
+import threading
+
+from django.conf import settings
+
+from utils.write_buffer import WriteBuffer
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    """ Returns this process's log entry buffer, or None if buffering is disabled by LOG_ENTRY_BUFFER.
+
+    :return: a LogEntryBuffer or None
+    """
+    global _buffer
+
+    if not getattr(settings, 'LOG_ENTRY_BUFFER', True):
+        return None
+
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = LogEntryBuffer(
+                flush_size=getattr(settings, 'LOG_ENTRY_BUFFER_SIZE', 200),
+                flush_interval=getattr(settings, 'LOG_ENTRY_BUFFER_INTERVAL', 5),
+            )
+            atexit.register(_buffer.flush)
+
+    return _buffer
+
+
+def flush():
+    """ Writes any buffered log entries. Called at the end of each request so that a request's entries can be seen by
+    the next one.
+
+    :return: the number of entries written
+    """
+    log_buffer = get_buffer()
+
+    return log_buffer.flush() if log_buffer else 0
+
+
+class LogEntryBuffer(WriteBuffer):
+    """ Holds unsaved LogEntry objects in memory and writes them in batches with bulk_create.
+    """
+    name = 'log entries'
+    thread_name = 'log-entry-buffer'
+
+    def get_model(self):
+        from utils import models
+
+        return models.LogEntry
+
+    def describe(self, entry):
+        return 'log entry "{0}"'.format(entry.description)
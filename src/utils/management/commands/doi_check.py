@@ -1,13 +1,9 @@
-import requests
+import json
+from datetime import timedelta
 
 from django.core.management.base import BaseCommand
-from django.utils import timezone
 
-from journal import models as journal_models
-from cron import models as cron_models
-from submission import models as submission_models
-from identifiers import models as ident_models
-from utils import setting_handler
+from identifiers import models as ident_models, resolver
 
 
 class Command(BaseCommand):
@@ -15,52 +11,52 @@ class Command(BaseCommand):
     Checks that DOIs resolve correctly.
     """
 
-    help = "Deletes duplicate settings."
+    help = "Checks that article DOIs resolve to their articles, recording any that do not as broken."
+
+    def add_arguments(self, parser):
+        """ Adds arguments to Django's management command-line parser.
+
+        :param parser: the parser to which the required arguments will be added
+        :return: None
+        """
+        parser.add_argument('--journal_code', default=None)
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--rate', type=float, default=5, help='Maximum requests per second to any one host.')
+        parser.add_argument('--ttl', type=int, default=7, help='Days for which a successful check is trusted.')
+        parser.add_argument('--force', action='store_true', default=False, help='Check every DOI.')
+        parser.add_argument('--resolver', default=resolver.DOI_RESOLVER)
+        parser.add_argument('--report', default=None, help='A path to write the full report to as JSON.')
 
     def handle(self, *args, **options):
         """Runs through articles and checks their DOIs resolve.
 
         :param args: None
-        :param options: None
+        :param options: journal_code, workers, rate, ttl, force, resolver and report
         :return: None
         """
-        journals = journal_models.Journal.objects.all()
-        request = cron_models.Request()
-
-        for journal in journals:
-            request.secure = setting_handler.get_setting('general', 'is_secure', journal)
-            print('Processing {0}'.format(journal.name))
-            articles = submission_models.Article.objects.filter(journal=journal)
-
-            for article in articles:
-                doi = article.get_identifier('doi', object=True)
+        identifiers = ident_models.Identifier.objects.filter(id_type='doi')
 
-                if doi and doi.is_doi:
-                    print('Article {0} with DOI {1} processing.'.format(article.pk, doi))
+        if options.get('journal_code'):
+            identifiers = identifiers.filter(article__journal__code=options.get('journal_code'))
 
-                    should_resolve_to = "{0}{1}".format(journal.full_url(request), article.local_url)
-                    resolves_to = requests.get(doi.get_doi_url())
+        report = resolver.check_dois(
+            identifiers,
+            resolver=options.get('resolver'),
+            workers=options.get('workers'),
+            rate=options.get('rate'),
+            ttl=timedelta(days=options.get('ttl')),
+            force=options.get('force'),
+        )
 
-                    if not should_resolve_to == resolves_to.url:
-                        print('Failure detected.')
-                        print(should_resolve_to, resolves_to.url)
+        for result in report['broken']:
+            print('Article {article} with DOI {doi} resolves to {resolves_to}, expected {expected}.'.format(**result))
 
-                        o, c = ident_models.BrokenDOI.objects.get_or_create(
-                            identifier=doi,
-                            defaults={'checked': timezone.now(),
-                                      'resolves_to': resolves_to.url,
-                                      'expected_to_resolve_to': should_resolve_to}
-                        )
+        for result in report['errors']:
+            print('Article {article} with DOI {doi} could not be resolved: {error}'.format(**result))
 
-                        if c:
-                            print('This failure is new \n')
-                        else:
-                            print('This failure has previously been detected \n')
-                    else:
-                        try:
-                            ident_models.BrokenDOI.objects.get(identifier=doi).delete()
-                        except ident_models.BrokenDOI.DoesNotExist:
-                            pass
+        print('Checked {0} DOIs, skipped {1} checked recently: {2} ok, {3} broken, {4} errors.'.format(
+            report['checked'], report['skipped'], report['ok'], len(report['broken']), len(report['errors'])))
 
-                else:
-                    print('Article {0} has no DOI, skipping \n'.format(article.pk))
+        if options.get('report'):
+            with open(options.get('report'), 'w') as report_file:
+                json.dump(report, report_file, indent=2)
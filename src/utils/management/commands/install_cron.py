@@ -34,20 +34,26 @@ class Command(BaseCommand):
         tab = CronTab(user=True)
         virtualenv = os.environ.get('VIRTUAL_ENV', None)
 
-        current_job = find_job(tab, "janeway_cron_job")
+        jobs = [
+            ('janeway_cron_job', 'execute_cron_tasks', 10),
+            ('janeway_access_rollup_job', 'roll_up_accesses', 30),
+        ]
 
-        if not current_job:
-            django_command = "{0}/manage.py execute_cron_tasks".format(settings.BASE_DIR)
-            if virtualenv:
-                command = '%s/bin/python3 %s' % (virtualenv, django_command)
-            else:
-                command = '%s' % (django_command)
+        for comment, management_command, minutes in jobs:
+            current_job = find_job(tab, comment)
 
-            cron_job = tab.new(command, comment="janeway_cron_job")
-            cron_job.minute.every(10)
+            if not current_job:
+                django_command = "{0}/manage.py {1}".format(settings.BASE_DIR, management_command)
+                if virtualenv:
+                    command = '%s/bin/python3 %s' % (virtualenv, django_command)
+                else:
+                    command = '%s' % (django_command)
 
-        else:
-            print("This cron job already exists.")
+                cron_job = tab.new(command, comment=comment)
+                cron_job.minute.every(minutes)
+
+            else:
+                print("The {0} cron job already exists.".format(management_command))
 
         if action == 'test':
             print(tab.render())
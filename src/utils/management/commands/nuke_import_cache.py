@@ -1,4 +1,7 @@
+from datetime import timedelta
+
 from django.core.management.base import BaseCommand
+from django.utils import timezone
 
 from utils import models as utils_models
 
@@ -6,15 +9,36 @@ from utils import models as utils_models
 class Command(BaseCommand):
     """ A management command to nuke the current import cache."""
 
-    help = "Nukes the current import cache in its entirety."
+    help = "Nukes the current import cache in its entirety, or evicts entries by age or total size."
+
+    def add_arguments(self, parser):
+        """ Adds arguments to Django's management command-line parser.
+
+        :param parser: the parser to which the required arguments will be added
+        :return: None
+        """
+        parser.add_argument('--older-than', type=int, dest='older_than', default=None,
+                            help='Evict entries that have not been used for this many days')
+        parser.add_argument('--max-size', type=int, dest='max_size', default=None,
+                            help='Evict the least recently used entries until the cache is no larger than this many MB')
 
     def handle(self, *args, **options):
-        """ Deletes all import cache entries in the DB and on disk
+        """ Deletes import cache entries in the DB and on disk
 
         :param args: None
-        :param options: None.
+        :param options: Dictionary containing optional 'older_than' and 'max_size' limits
         :return: None
         """
-        print("Nuking import cache.")
+        if options.get('older_than') is None and options.get('max_size') is None:
+            print("Nuking import cache.")
+            utils_models.ImportCacheEntry.nuke()
+            return
+
+        if options.get('older_than') is not None:
+            cutoff = timezone.now() - timedelta(days=options.get('older_than'))
+            evicted = utils_models.ImportCacheEntry.evict_older_than(cutoff)
+            print("Evicted {0} entries unused for {1} days.".format(evicted, options.get('older_than')))
 
-        utils_models.ImportCacheEntry.nuke()
+        if options.get('max_size') is not None:
+            evicted = utils_models.ImportCacheEntry.evict_to_size(options.get('max_size') * 1024 * 1024)
+            print("Evicted {0} entries to bring the cache under {1} MB.".format(evicted, options.get('max_size')))
@@ -0,0 +1,27 @@
+import requests
+
+from django.core.management.base import BaseCommand
+
+from identifiers import logic as identifier_logic, models as identifier_models
+
+
+class Command(BaseCommand):
+    """Checks Crossref for the status of deposits that have not finished processing."""
+
+    help = "Updates the status of accepted Crossref deposits that have not yet completed."
+
+    def handle(self, *args, **options):
+        """Polls each unfinished deposit.
+
+        :param args: None
+        :param options: None
+        :return: None
+        """
+        deposits = identifier_models.CrossrefDeposit.objects.filter(
+            deposit_id__isnull=False,
+        ).exclude(status__in=['completed', 'failed', 'error']).select_related('journal')
+
+        with requests.Session() as session:
+            for deposit in deposits:
+                status = identifier_logic.poll_crossref_deposit(deposit, session=session)
+                print('Deposit {0}: {1}'.format(deposit.batch_id, status))
@@ -0,0 +1,53 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from journal import logic as journal_logic
+from submission import models as submission_models
+
+
+def render_article(article_id):
+    article = submission_models.Article.objects.select_related('journal').get(pk=article_id)
+    return journal_logic.render_xml_galleys(article)
+
+
+class Command(BaseCommand):
+    """A management command that renders the XML galleys of published articles ahead of time."""
+
+    help = "Renders and stores the HTML for every published article's XML galleys, using a pool of processes."
+
+    def add_arguments(self, parser):
+        """ Adds arguments to Django's management command-line parser.
+
+        :param parser: the parser to which the required arguments will be added
+        :return: None
+        """
+        parser.add_argument('--journal_code', default=None)
+        parser.add_argument('--processes', type=int, default=None,
+                            help='Number of worker processes, defaults to the number of CPUs.')
+
+    def handle(self, *args, **options):
+        """ Renders galleys for published articles, optionally limited to one journal.
+
+        :param args: None
+        :param options: journal_code and processes
+        :return: None
+        """
+        articles = submission_models.Article.objects.filter(
+            stage=submission_models.STAGE_PUBLISHED,
+            galley__file__mime_type__in=['application/xml', 'text/xml'],
+        )
+
+        if options.get('journal_code'):
+            articles = articles.filter(journal__code=options.get('journal_code'))
+
+        article_ids = list(articles.values_list('pk', flat=True).distinct())
+
+        # forked workers must not share this process's database connection
+        connections.close_all()
+
+        with ProcessPoolExecutor(max_workers=options.get('processes')) as executor:
+            rendered = sum(executor.map(render_article, article_ids, chunksize=10))
+
+        print('Rendered {0} galleys for {1} articles.'.format(rendered, len(article_ids)))
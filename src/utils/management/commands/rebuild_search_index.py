@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from journal import search
+from submission import models as submission_models
+
+
+class Command(BaseCommand):
+    """A management command that rebuilds the full-text article search index."""
+
+    help = "Rebuilds the SQLite full-text index of published articles used by the journal search page."
+
+    def add_arguments(self, parser):
+        """ Adds arguments to Django's management command-line parser.
+
+        :param parser: the parser to which the required arguments will be added
+        :return: None
+        """
+        parser.add_argument('--skip_galleys', action='store_true', default=False,
+                            help='Index metadata only, without extracting galley text.')
+
+    def handle(self, *args, **options):
+        """ Rebuilds the index.
+
+        :param args: None
+        :param options: skip_galleys
+        :return: None
+        """
+        articles = submission_models.Article.objects.filter(stage=submission_models.STAGE_PUBLISHED,
+                                                            date_published__isnull=False)
+        count = search.rebuild_index(articles, with_body=not options.get('skip_galleys'))
+
+        print('Indexed {0} articles in {1}.'.format(count, search.index_path()))
@@ -1,14 +1,12 @@
-import time
-
 from django.core.management.base import BaseCommand
 
-from identifiers import logic as identifier_logic
+from identifiers import logic as identifier_logic, models as identifier_models
 from submission import models as submission_models
 from journal import models as journal_models
 
 
 class Command(BaseCommand):
-    """Takes an OAI PMH url and pulls information into Janeway."""
+    """Registers the DOIs of all of a journal's published articles with Crossref in batches."""
 
     help = "Registers all article DOIs with Crossref."
 
@@ -19,31 +17,36 @@ class Command(BaseCommand):
         :return: None
         """
         parser.add_argument('journal_code')
+        parser.add_argument('--chunk_size', type=int, default=100, help='Articles per deposit document.')
+        parser.add_argument('--workers', type=int, default=4, help='Deposits to send at once.')
+        parser.add_argument('--server', default=None, help='A deposit URL to use instead of Crossref.')
 
     def handle(self, *args, **options):
-        """Calls the Crossref registration options
+        """Creates any missing DOIs, then deposits them all with Crossref.
 
         :param args: None
-        :param options: Dictionary containing 'journal_code'
+        :param options: Dictionary containing 'journal_code', 'chunk_size', 'workers' and 'server'
         :return: None
         """
         journal = journal_models.Journal.objects.get(code=options.get('journal_code'))
         articles = submission_models.Article.objects.filter(journal=journal, date_published__isnull=False,
                                                             )
-
-        for article in articles:
-
-            if article.is_published:
-                print('Handling article {0}'.format(article.pk))
-                try:
-                    identifier = article.get_identifier('doi', object=True)
-
-                    if identifier and identifier.is_doi:
-                        identifier.register()
-                    else:
-                        identifier = identifier_logic.generate_crossref_doi_with_pattern(article)
-                        identifier.register()
-                except AttributeError as e:
-                    print('Error {0}'.format(e))
-
-            time.sleep(1)
+        published = [article for article in articles if article.is_published]
+        with_doi = set(identifier_models.Identifier.objects.filter(
+            id_type='doi',
+            article__in=published,
+        ).values_list('article_id', flat=True))
+
+        for article in published:
+            if article.pk not in with_doi:
+                print('Creating DOI for article {0}'.format(article.pk))
+                identifier_logic.generate_crossref_doi_with_pattern(article)
+
+        identifiers = identifier_models.Identifier.objects.filter(id_type='doi', article__in=published)
+        deposits = identifier_logic.register_crossref_batch(journal, identifiers,
+                                                            chunk_size=options.get('chunk_size'),
+                                                            max_workers=options.get('workers'),
+                                                            server=options.get('server'))
+
+        for deposit in deposits:
+            print('Deposit {0}: {1} ({2})'.format(deposit.batch_id, deposit.status, deposit.deposit_id))
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+
+from utils import backup
+
+
+class Command(BaseCommand):
+    """
+    Restores files and the database from a backup made by the backup command.
+    """
+
+    help = "Restores files and the database from a backup, by default the most recent one."
+
+    def add_arguments(self, parser):
+        """ Adds arguments to Django's management command-line parser.
+
+        :param parser: the parser to which the required arguments will be added
+        :return: None
+        """
+        parser.add_argument('name', nargs='?', default=None, help='The backup to restore, eg. 20170901020000')
+        parser.add_argument('--target', default=None,
+                            help='The directory to restore files into, by default BASE_DIR')
+        parser.add_argument('--skip-files', action='store_true', dest='skip_files', default=False)
+        parser.add_argument('--skip-database', action='store_true', dest='skip_database', default=False)
+
+    def handle(self, *args, **options):
+        """ Restores a backup.
+
+        :param args: None
+        :param options: Dictionary containing 'name', 'target' and boolean 'skip_files' and 'skip_database' flags
+        :return: None
+        """
+        store = backup.get_store()
+
+        if options.get('name'):
+            name = options.get('name')
+            manifest = backup.load_manifest(store, name)
+        else:
+            name, manifest = backup.latest_manifest(store)
+
+            if not name:
+                raise CommandError('No complete backups were found.')
+
+        print('Restoring backup {0}'.format(name))
+
+        if not options.get('skip_files'):
+            written = backup.restore_files(store, manifest, options.get('target') or settings.BASE_DIR)
+            print('{0} files restored.'.format(written))
+
+        if not options.get('skip_database'):
+            if not manifest.get('database'):
+                raise CommandError('Backup {0} does not include the database.'.format(name))
+
+            loaded = backup.restore_database(store, manifest['database'])
+            print('{0} objects restored.'.format(loaded))
@@ -23,12 +23,17 @@ class Command(BaseCommand):
                             dest='delete',
                             default=False,
                             help='Delete all articles and non-superusers in the database before import')
+        parser.add_argument('--restart',
+                            action='store_true',
+                            dest='restart',
+                            default=False,
+                            help='Harvest from the first page rather than resuming an interrupted import')
 
     def handle(self, *args, **options):
         """Imports an OAI feed into Janeway.
 
         :param args: None
-        :param options: Dictionary containing 'url', 'journal_id', 'user_id', and a boolean '--delete' flag
+        :param options: Dictionary containing 'url', 'journal_id', 'user_id', and boolean '--delete' and '--restart' flags
         :return: None
         """
         translation.activate('en')
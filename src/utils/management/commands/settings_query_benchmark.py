@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from journal import models as journal_models
+from utils import setting_handler
+
+
+class Command(BaseCommand):
+    """A management command that compares queries per request with and without the settings snapshot cache."""
+
+    help = "Reports the number of database queries per request with the settings snapshot cache off and on."
+
+    def add_arguments(self, parser):
+        """ Adds arguments to Django's management command-line parser.
+
+        :param parser: the parser to which the required arguments will be added
+        :return: None
+        """
+        parser.add_argument('journal_code')
+        parser.add_argument('paths', nargs='*', default=['/'])
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        """ Requests each path against the journal's domain and prints query counts for both modes.
+
+        :param args: None
+        :param options: journal_code, paths and repeat
+        :return: None
+        """
+        journal = journal_models.Journal.objects.get(code=options.get('journal_code'))
+        client = Client(HTTP_HOST=journal.domain)
+
+        for path in options.get('paths'):
+            with override_settings(SETTINGS_SNAPSHOT_CACHE=False):
+                before = self.average_queries(client, path, options.get('repeat'))
+
+            with override_settings(SETTINGS_SNAPSHOT_CACHE=True):
+                setting_handler.invalidate_settings_cache()
+                # Warm the snapshot so the figures reflect steady state rather than the first load.
+                client.get(path)
+                after = self.average_queries(client, path, options.get('repeat'))
+
+            print('{0}: {1:.1f} queries uncached, {2:.1f} queries with snapshot cache'.format(path, before, after))
+
+    @staticmethod
+    def average_queries(client, path, repeat):
+        total = 0
+
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as context:
+                client.get(path)
+            total += len(context.captured_queries)
+
+        return total / repeat
@@ -4,6 +4,9 @@ __license__ = "AGPL v3"
 __maintainer__ = "Birkbeck Centre for Technology and Publishing"
 
 import threading
+
+from utils import log_buffer, setting_handler
+
 _local = threading.local()
 
 
@@ -18,3 +21,29 @@ class ThemeEngineMiddleware(object):
         if hasattr(_local, 'request'):
             del _local.request
         return response
+
+
+class LogEntryBufferMiddleware(object):
+    """ Writes the log entries buffered during a request once it has been handled
+    """
+
+    def process_response(self, request, response):
+        # the request has already been handled, so a failure to write its log entries must not fail the response
+        try:
+            log_buffer.flush()
+        except Exception as e:
+            print('Error flushing log entries: {0}'.format(e))
+
+        return response
+
+
+class SettingsVersionMiddleware(object):
+    """ Reads the shared settings version once per request rather than on every setting lookup
+    """
+
+    def process_request(self, request):
+        setting_handler.begin_request()
+
+    def process_response(self, request, response):
+        setting_handler.end_request()
+        return response
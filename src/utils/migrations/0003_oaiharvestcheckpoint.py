@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0002_auto_20170711_1203'),
+        ('utils', '0002_auto_20170813_1302'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OAIHarvestCheckpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.TextField(max_length=800)),
+                ('url_hash', models.CharField(max_length=64)),
+                ('resumption_token', models.TextField(blank=True, null=True)),
+                ('pages', models.PositiveIntegerField(default=0)),
+                ('records', models.PositiveIntegerField(default=0)),
+                ('complete', models.BooleanField(default=False)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('journal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='journal.Journal')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='oaiharvestcheckpoint',
+            unique_together=set([('journal', 'url_hash')]),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import hashlib
+import os
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def hash_urls(apps, schema_editor):
+    ImportCacheEntry = apps.get_model('utils', 'ImportCacheEntry')
+
+    for entry in ImportCacheEntry.objects.all():
+        entry.url_hash = hashlib.sha256(entry.url.encode('utf-8')).hexdigest()
+
+        if os.path.exists(entry.on_disk):
+            entry.size = os.path.getsize(entry.on_disk)
+
+        entry.save()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('utils', '0003_oaiharvestcheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importcacheentry',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='importcacheentry',
+            name='created',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='importcacheentry',
+            name='last_used',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='importcacheentry',
+            name='size',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='importcacheentry',
+            name='url_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.RunPython(hash_urls, reverse_code=migrations.RunPython.noop),
+    ]
@@ -3,17 +3,19 @@ __author__ = "Martin Paul Eve & Andy Byers"
 __license__ = "AGPL v3"
 __maintainer__ = "Birkbeck Centre for Technology and Publishing"
 
+import hashlib
 import os
 from uuid import uuid4
 import requests
 
 from django.core.serializers import json
 from django.db import models
+from django.utils import timezone
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
 from hvad.models import TranslatableModel, TranslatedFields
 from utils.shared import get_ip_address
-from utils import notify
+from utils import notify, log_buffer
 
 import core.settings as settings
 from requests.packages.urllib3.exceptions import InsecureRequestWarning
@@ -37,7 +39,7 @@ LOG_LEVELS = [
 
 class LogEntry(models.Model):
     types = models.CharField(max_length=255, null=True, blank=True, choices=LOG_TYPES)
-    date = models.DateTimeField(auto_now_add=True)
+    date = models.DateTimeField(default=timezone.now)
     description = models.TextField(null=True, blank=True)
     level = models.CharField(max_length=20, null=True, blank=True, choices=LOG_LEVELS)
     actor = models.ForeignKey('core.Account', null=True, blank=True, related_name='actor', on_delete=models.SET_NULL)
@@ -57,7 +59,10 @@ class LogEntry(models.Model):
         return u'[{0}] {1} - {2}'.format(self.types, self.date, self.description)
 
     def add_entry(types, description, level, actor=None, request=None, target=None):
+        """ Records a log entry. Entries are buffered and written in batches unless LOG_ENTRY_BUFFER is off.
 
+        :return: the LogEntry, which may not have been saved yet
+        """
         if actor is not None and callable(getattr(actor, "is_anonymous", None)):
             if actor.is_anonymous():
                 actor = None
@@ -72,7 +77,12 @@ class LogEntry(models.Model):
             'target': target,
         }
 
-        new_entry = LogEntry.objects.create(**kwargs).save()
+        entry_buffer = log_buffer.get_buffer()
+
+        if entry_buffer:
+            new_entry = entry_buffer.add(LogEntry(**kwargs))
+        else:
+            new_entry = LogEntry.objects.create(**kwargs)
 
         if request and request.journal:
             if request.journal.slack_logging_enabled:
@@ -132,6 +142,17 @@ class PluginSetting(models.Model):
     def __repr__(self):
         return u'%s' % self.name
 
+    def save(self, *args, **kwargs):
+        from utils import setting_handler
+        super(PluginSetting, self).save(*args, **kwargs)
+        setting_handler.invalidate_settings_cache()
+
+    def delete(self, *args, **kwargs):
+        from utils import setting_handler
+        result = super(PluginSetting, self).delete(*args, **kwargs)
+        setting_handler.invalidate_settings_cache()
+        return result
+
 
 class PluginSettingValue(TranslatableModel):
     journal = models.ForeignKey('journal.Journal', blank=True, null=True)
@@ -147,6 +168,17 @@ class PluginSettingValue(TranslatableModel):
     def __str__(self):
         return "[{0}]: {1}".format(self.journal, self.setting.name)
 
+    def save(self, *args, **kwargs):
+        from utils import setting_handler
+        super(PluginSettingValue, self).save(*args, **kwargs)
+        setting_handler.invalidate_settings_cache(self.journal_id)
+
+    def delete(self, *args, **kwargs):
+        from utils import setting_handler
+        result = super(PluginSettingValue, self).delete(*args, **kwargs)
+        setting_handler.invalidate_settings_cache(self.journal_id)
+        return result
+
     @property
     def processed_value(self):
         return self.process_value()
@@ -172,61 +204,192 @@ class PluginSettingValue(TranslatableModel):
             return self.value
 
 
+def import_cache_path():
+    return os.path.join(settings.BASE_DIR, 'files', 'import_cache')
+
+
+def hash_url(url):
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+
 class ImportCacheEntry(models.Model):
+    """ A remote file downloaded during an import.
+
+    Files are stored under the SHA-256 of their content, so URLs that serve the same file share one copy on disk.
+    Entries are looked up by the SHA-256 of their URL, which is indexed.
+    """
     url = models.TextField(max_length=800, blank=False, null=False)
+    url_hash = models.CharField(max_length=64, db_index=True, blank=True)
+    content_hash = models.CharField(max_length=64, db_index=True, blank=True, null=True)
+    size = models.BigIntegerField(blank=True, null=True)
     on_disk = models.TextField(max_length=800, blank=False, null=False)
     mime_type = models.CharField(max_length=200, null=True, blank=True)
+    created = models.DateTimeField(default=timezone.now)
+    last_used = models.DateTimeField(default=timezone.now, db_index=True)
 
     @staticmethod
     def nuke():
-        for cache in ImportCacheEntry.objects.all():
-            os.remove(cache.on_disk)
-            cache.delete()
+        ImportCacheEntry.evict(ImportCacheEntry.objects.all())
 
     @staticmethod
-    def fetch(url):
-        try:
-            cached = ImportCacheEntry.objects.get(url=url)
+    def evict(entries):
+        """ Deletes cache entries, and their files once no other entry shares them.
+
+        :param entries: a queryset or list of ImportCacheEntry objects
+        :return: the number of entries deleted
+        """
+        deleted = 0
+
+        for entry in entries:
+            entry.delete()
+            deleted += 1
+
+            if entry.content_hash and ImportCacheEntry.objects.filter(content_hash=entry.content_hash).exists():
+                continue
+
+            try:
+                os.remove(entry.on_disk)
+            except FileNotFoundError:
+                pass
 
+        return deleted
+
+    @staticmethod
+    def evict_older_than(cutoff):
+        """ Deletes entries that have not been used since the cutoff.
+
+        :param cutoff: a datetime
+        :return: the number of entries deleted
+        """
+        return ImportCacheEntry.evict(ImportCacheEntry.objects.filter(last_used__lt=cutoff))
+
+    @staticmethod
+    def evict_to_size(max_size):
+        """ Deletes the least recently used entries until the files on disk total no more than max_size bytes.
+
+        :param max_size: a size in bytes
+        :return: the number of entries deleted
+        """
+        # entries that share a file are only counted once
+        sizes = {}
+        entries = []
+
+        for entry in ImportCacheEntry.objects.order_by('-last_used'):
+            sizes.setdefault(entry.content_hash or entry.on_disk, entry.size or 0)
+            entries.append(entry)
+
+        total = sum(sizes.values())
+        to_evict = []
+
+        while entries and total > max_size:
+            entry = entries.pop()
+            to_evict.append(entry)
+            key = entry.content_hash or entry.on_disk
+
+            if not any((other.content_hash or other.on_disk) == key for other in entries):
+                total -= sizes[key]
+
+        return ImportCacheEntry.evict(to_evict)
+
+    @staticmethod
+    def get_or_fetch(url):
+        """ Returns the cache entry for a URL, streaming the remote file to disk first if it is not cached.
+
+        :param url: the URL to fetch
+        :return: an ImportCacheEntry
+        """
+        # first() rather than get() as concurrent prefetches of the same URL can leave more than one entry
+        cached = ImportCacheEntry.objects.filter(url_hash=hash_url(url), url=url).first()
+
+        if cached:
             print("[CACHE] Using cached version of {0}".format(url))
+            ImportCacheEntry.objects.filter(pk=cached.pk).update(last_used=timezone.now())
+            return cached
 
-            with open(cached.on_disk, 'rb') as on_disk_file:
-                return on_disk_file.read(), cached.mime_type
+        print("[CACHE] Fetching remote version of {0}".format(url))
 
-        except ImportCacheEntry.DoesNotExist:
-            print("[CACHE] Fetching remote version of {0}".format(url))
+        headers = {
+            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_10_1) AppleWebKit/537.36 (KHTML, like Gecko) '
+                          'Chrome/39.0.2171.95 Safari/537.36'}
 
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_10_1) AppleWebKit/537.36 (KHTML, like Gecko) '
-                              'Chrome/39.0.2171.95 Safari/537.36'}
+        # disable SSL checking
+        requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
 
-            # disable SSL checking
-            requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
+        path = import_cache_path()
+        os.makedirs(path, 0o0775, exist_ok=True)
+        temp_path = os.path.join(path, '{0}.tmp'.format(uuid4()))
+        content_hash = hashlib.sha256()
+        size = 0
 
+        try:
             fetched = requests.get(url, headers=headers, stream=True, verify=False)
+            mime_type = fetched.headers.get('content-type')
 
-            resp = bytes()
-
-            for chunk in fetched.iter_content(chunk_size=512 * 1024):
-                resp += chunk
+            try:
+                with open(temp_path, 'wb') as f:
+                    for chunk in fetched.iter_content(chunk_size=512 * 1024):
+                        content_hash.update(chunk)
+                        size += len(chunk)
+                        f.write(chunk)
+            finally:
+                fetched.close()
+
+            content_hash = content_hash.hexdigest()
+            directory = os.path.join(path, content_hash[:2])
+            os.makedirs(directory, 0o0775, exist_ok=True)
+            on_disk = os.path.join(directory, content_hash)
+
+            if os.path.exists(on_disk):
+                os.remove(temp_path)
+            else:
+                os.replace(temp_path, on_disk)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        return ImportCacheEntry.objects.create(url=url, url_hash=hash_url(url), content_hash=content_hash, size=size,
+                                               mime_type=mime_type, on_disk=on_disk)
 
-            # set the filename to a unique UUID4 identifier with the passed file extension
-            filename = '{0}'.format(uuid4())
+    @staticmethod
+    def fetch(url):
+        """ Returns the contents and MIME type of a URL, from the cache if possible.
 
-            # set the path to save to be the sub-directory for the article
-            path = os.path.join(settings.BASE_DIR, 'files', 'import_cache')
+        This reads the whole file into memory, so large files should be read through get_or_fetch and open instead.
 
-            # create the sub-folders as necessary
-            if not os.path.exists(path):
-                os.makedirs(path, 0o0775)
+        :param url: the URL to fetch
+        :return: a tuple of bytes and the MIME type
+        """
+        entry = ImportCacheEntry.get_or_fetch(url)
 
-            with open(os.path.join(path, filename), 'wb') as f:
-                f.write(resp)
+        with entry.open() as on_disk_file:
+            return on_disk_file.read(), entry.mime_type
 
-            ImportCacheEntry.objects.create(url=url, mime_type=fetched.headers.get('content-type'),
-                                            on_disk=os.path.join(path, filename)).save()
+    def open(self):
+        """ Opens the cached file for reading.
 
-            return resp, fetched.headers.get('content-type')
+        :return: a binary file object
+        """
+        return open(self.on_disk, 'rb')
 
     def __str__(self):
         return self.url
+
+
+class OAIHarvestCheckpoint(models.Model):
+    """ Records how far an OAI-PMH harvest into a journal has got, so that an interrupted import can resume. """
+    journal = models.ForeignKey('journal.Journal')
+    url = models.TextField(max_length=800)
+    url_hash = models.CharField(max_length=64)
+    resumption_token = models.TextField(blank=True, null=True)
+    pages = models.PositiveIntegerField(default=0)
+    records = models.PositiveIntegerField(default=0)
+    complete = models.BooleanField(default=False)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # MySQL cannot put a unique index on a TEXT column, so checkpoints are unique on the hash of their URL
+        unique_together = ('journal', 'url_hash')
+
+    def __str__(self):
+        return '{0}: {1} pages from {2}'.format(self.journal, self.pages, self.url)
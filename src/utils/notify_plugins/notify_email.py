@@ -1,10 +1,14 @@
-from django.core.mail import EmailMultiAlternatives
+from django.core.mail import EmailMultiAlternatives, get_connection
 from django.utils.html import strip_tags
 
 from utils import setting_handler
 
 
 def send_email(subject, to, html, journal, request, bcc=None, cc=None, attachment=None, replyto=None):
+    prepare_email(subject, to, html, journal, request, bcc, cc, attachment, replyto).send()
+
+
+def prepare_email(subject, to, html, journal, request, bcc=None, cc=None, attachment=None, replyto=None):
 
     if journal:
         from_email = setting_handler.get_setting('email', 'from_address', journal).value
@@ -39,7 +43,29 @@ def send_email(subject, to, html, journal, request, bcc=None, cc=None, attachmen
             msg.attach(file.name, file.read(), file.content_type)
             file.close()
 
-    msg.send()
+    return msg
+
+
+def send_prepared_emails(messages):
+    """ Sends a batch of messages from prepare_email over a single connection to the mail server.
+
+    Messages are sent one at a time so that a failure only affects that message.
+
+    :param messages: a list of EmailMultiAlternatives
+    :return: a list of the messages that were sent
+    """
+    sent = []
+    connection = get_connection()
+
+    with connection:
+        for msg in messages:
+            try:
+                if connection.send_messages([msg]):
+                    sent.append(msg)
+            except Exception as e:
+                print('Error sending email to {0}: {1}'.format(', '.join(msg.to), e))
+
+    return sent
 
 
 def notify_hook(**kwargs):
@@ -1,11 +1,158 @@
-import requests
+import atexit
+import os
+import queue
 import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from django.conf import settings
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# responses worth trying again; anything else is the receiver's final answer
+RETRY_CODES = (429, 500, 502, 503, 504)
+
+
+def get_pool():
+    """ Returns this process's webhook pool.
+
+    :return: a WebhookPool
+    """
+    global _pool
+
+    with _pool_lock:
+        if _pool is None:
+            _pool = WebhookPool(
+                workers=getattr(settings, 'WEBHOOK_WORKERS', 4),
+                queue_size=getattr(settings, 'WEBHOOK_QUEUE_SIZE', 1000),
+                queue_timeout=getattr(settings, 'WEBHOOK_QUEUE_TIMEOUT', 5),
+                retries=getattr(settings, 'WEBHOOK_RETRIES', 3),
+                timeout=getattr(settings, 'WEBHOOK_TIMEOUT', 10),
+            )
+            atexit.register(_pool.drain)
+
+    return _pool
+
+
+class WebhookPool(object):
+    """ Posts webhook messages from a fixed number of worker threads sharing one HTTP session.
+
+    Messages wait in a bounded queue. When it is full senders are held for up to queue_timeout seconds, and the message
+    is dropped if no room is made, so a slow or unreachable receiver cannot exhaust threads or memory.
+    """
+
+    def __init__(self, workers=4, queue_size=1000, queue_timeout=5, retries=3, backoff=1, timeout=10):
+        """
+        :param workers: the number of threads posting messages
+        :param queue_size: the most messages waiting to be posted
+        :param queue_timeout: seconds a sender waits for room in a full queue
+        :param retries: the number of times a failed post is retried
+        :param backoff: seconds before the first retry, doubling for each one after
+        :param timeout: seconds to wait for each response
+        """
+        self.workers = workers
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+
+        self.lock = threading.Lock()
+        self.queue = None
+        self.session = None
+        self.pid = None
+
+    def submit(self, url, message, headers=None):
+        """ Queues a message to be posted.
+
+        :param url: the webhook URL
+        :param message: the request body
+        :param headers: a dictionary of request headers
+        :return: True if the message was queued, False if it was dropped
+        """
+        with self.lock:
+            self._check_process()
+
+        try:
+            self.queue.put((url, message, headers), timeout=self.queue_timeout)
+        except queue.Full:
+            print('Webhook queue is full, dropping message to {0}'.format(url))
+            return False
+
+        return True
+
+    def post(self, url, message, headers=None):
+        """ Posts a message, retrying connection errors and server errors with exponential backoff.
+
+        :param url: the webhook URL
+        :param message: the request body
+        :param headers: a dictionary of request headers
+        :return: the last response, or None if every attempt failed to connect
+        """
+        response = None
+
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+
+            try:
+                response = self.session.post(url, data=message, headers=headers, timeout=self.timeout)
+            except requests.RequestException as e:
+                print('Error posting webhook to {0}: {1}'.format(url, e))
+                continue
+
+            if response.status_code not in RETRY_CODES:
+                break
+
+        return response
+
+    def drain(self, timeout=10):
+        """ Waits, up to timeout seconds, for queued messages to be posted, eg. before the process exits.
+
+        :param timeout: the most seconds to wait
+        :return: None
+        """
+        if self.queue is None or self.pid != os.getpid():
+            return
+
+        deadline = time.time() + timeout
+
+        while self.queue.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.1)
+
+    def _check_process(self):
+        # Worker threads and pooled connections do not survive a fork, so each worker process gets its own.
+        if self.pid == os.getpid():
+            return
+
+        self.pid = os.getpid()
+        self.queue = queue.Queue(maxsize=self.queue_size)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.workers, pool_maxsize=self.workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        for index in range(self.workers):
+            threading.Thread(target=self._run, name='webhook-{0}'.format(index), daemon=True).start()
+
+    def _run(self):
+        while True:
+            url, message, headers = self.queue.get()
+
+            try:
+                self.post(url, message, headers)
+            except Exception as e:
+                print('Error posting webhook to {0}: {1}'.format(url, e))
+            finally:
+                self.queue.task_done()
 
 
 def send_message(hook_url, message, headers=None):
-    # this sends a non-blocking post to a web URL
-    hook_thread = threading.Thread(target=requests.post, args=(hook_url, message, headers), kwargs={})
-    hook_thread.start()
+    # this queues a non-blocking post to a web URL
+    get_pool().submit(hook_url, message, headers)
 
 
 def notify_hook(**kwargs):
@@ -23,7 +170,7 @@ def notify_hook(**kwargs):
     # pop the args
     html = kwargs.pop('html', '')
     url = kwargs.pop('url', '')
-    headers = kwargs.pop('headers', '')
+    headers = kwargs.pop('headers', None)
 
     send_message(url, html, headers)
 
@@ -3,11 +3,22 @@ __author__ = "Martin Paul Eve & Andy Byers"
 __license__ = "AGPL v3"
 __maintainer__ = "Birkbeck Centre for Technology and Publishing"
 
+from functools import lru_cache
 
 from django.template import Template, RequestContext, Context
 from utils import setting_handler
 
 
+@lru_cache(maxsize=256)
+def compile_template(source):
+    """ Compiles template source held in a setting, reusing the compiled template while the source is unchanged.
+
+    :param source: the template source
+    :return: a Template
+    """
+    return Template(source)
+
+
 def get_message_content(request, context, template, plugin=False, template_is_setting=False):
     if plugin:
         template = setting_handler.get_plugin_setting(plugin, template, None).value
@@ -25,7 +36,7 @@ def get_message_content(request, context, template, plugin=False, template_is_se
 def get_requestless_content(context, journal, template, group_name='email'):
     template = setting_handler.get_requestless_setting(group_name, template, journal).value
 
-    template = Template(template)
+    template = compile_template(template)
     html_content = template.render(Context(context))
 
     return html_content
@@ -4,16 +4,210 @@ __license__ = "AGPL v3"
 __maintainer__ = "Birkbeck Centre for Technology and Publishing"
 
 import json
+import threading
+from contextlib import contextmanager
+from uuid import uuid4
 
 from django.conf import settings
+from django.core.cache import cache
 from django.utils.translation import get_language
 
 from utils import models
 from core import models as core_models
 
 
+SETTINGS_VERSION_KEY = 'janeway_settings_version'
+
+# Cache backends that are private to each process, with which a version bump cannot reach the other workers.
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+# Per-process snapshots of settings, keyed by (kind, journal pk, language). Each entry records the shared settings
+# version it was loaded under so that a write in any worker invalidates the copies held by every other worker.
+_snapshots = {}
+
+# Per-thread state: the settings version read for the current request, and invalidations held back by
+# deferred_invalidation.
+_local = threading.local()
+
+
+def snapshots_enabled():
+    """ Snapshots are used when SETTINGS_SNAPSHOT_CACHE is True or, when it is None, if the default cache is shared
+    between processes.
+
+    :return: a boolean
+    """
+    enabled = getattr(settings, 'SETTINGS_SNAPSHOT_CACHE', None)
+
+    if enabled is None:
+        return settings.CACHES['default']['BACKEND'] not in LOCAL_CACHE_BACKENDS
+
+    return enabled
+
+
+def begin_request():
+    """ Starts remembering the settings version for the current request, so that the shared cache is read once per
+    request rather than on every lookup. Called by SettingsVersionMiddleware.
+
+    :return: None
+    """
+    _local.in_request = True
+    _local.version = None
+
+
+def end_request():
+    _local.in_request = False
+    _local.version = None
+
+
+def settings_version():
+    """ Returns the shared settings version token, creating one if the cache has been cleared. Within a request the
+    token is only read from the cache once.
+
+    :return: a version string
+    """
+    version = getattr(_local, 'version', None)
+
+    if version is not None:
+        return version
+
+    version = cache.get(SETTINGS_VERSION_KEY)
+
+    if version is None:
+        cache.add(SETTINGS_VERSION_KEY, uuid4().hex, None)
+        version = cache.get(SETTINGS_VERSION_KEY)
+
+    if getattr(_local, 'in_request', False):
+        _local.version = version
+
+    return version
+
+
+def invalidate_settings_cache(journal_id=None):
+    """ Bumps the shared settings version so that every process reloads its settings snapshots, and expires the cached
+    pages of the journal, or of every site when journal_id is None.
+
+    :param journal_id: the pk of the Journal whose settings changed, or None
+    :return: None
+    """
+    _snapshots.clear()
+
+    deferred = getattr(_local, 'deferred', None)
+
+    if deferred is not None:
+        deferred.add(journal_id)
+        return
+
+    version = uuid4().hex
+    cache.set(SETTINGS_VERSION_KEY, version, None)
+
+    if getattr(_local, 'in_request', False):
+        _local.version = version
+
+    # settings are read all over the public pages, so the affected cached pages are stale
+    from core import page_cache
+    page_cache.bump_content_version(journal_id)
+
+
+@contextmanager
+def deferred_invalidation():
+    """ Holds back the invalidations made within the block, eg. by saving many SettingValues in turn, and makes them
+    once when it exits.
+
+    :return: None
+    """
+    if getattr(_local, 'deferred', None) is not None:
+        yield
+        return
+
+    _local.deferred = set()
+
+    try:
+        yield
+    finally:
+        journal_ids, _local.deferred = _local.deferred, None
+
+        if None in journal_ids:
+            invalidate_settings_cache()
+        else:
+            for journal_id in journal_ids:
+                invalidate_settings_cache(journal_id)
+
+
+def _get_snapshot(kind, journal, lang, loader):
+    if not snapshots_enabled():
+        return None
+
+    version = settings_version()
+    key = (kind, journal.pk if journal else None, lang)
+    snapshot = _snapshots.get(key)
+
+    if snapshot is None or snapshot[0] != version:
+        snapshot = (version, loader(journal, lang))
+        _snapshots[key] = snapshot
+
+    return snapshot[1]
+
+
+def _load_setting_definitions(journal, lang):
+    definitions = {}
+
+    for setting in core_models.Setting.objects.select_related('group'):
+        # Duplicate names are stored as None so lookups fall through to the database and raise as they always have.
+        definitions[setting.name] = None if setting.name in definitions else setting
+
+    return definitions
+
+
+def _load_setting_values(journal, lang):
+    values = core_models.SettingValue.objects.language(lang).filter(
+        journal=journal,
+    ).select_related('setting', 'setting__group')
+
+    return {(value.setting.group.name, value.setting.pk): value for value in values}
+
+
+def _load_plugin_setting_definitions(journal, lang):
+    definitions = {}
+
+    for setting in models.PluginSetting.objects.all():
+        key = (setting.plugin_id, setting.name)
+        definitions[key] = None if key in definitions else setting
+
+    return definitions
+
+
+def _load_plugin_setting_values(journal, lang):
+    values = models.PluginSettingValue.objects.language(lang).filter(
+        journal=journal,
+    ).select_related('setting')
+
+    return {(value.setting.plugin_id, value.setting.pk): value for value in values}
+
+
+def _cached_setting(setting_name):
+    definitions = _get_snapshot('settings', None, None, _load_setting_definitions)
+    setting = definitions.get(setting_name) if definitions is not None else None
+
+    if setting is None:
+        setting = core_models.Setting.objects.get(name=setting_name)
+
+    return setting
+
+
+def _cached_setting_value(setting_group, setting, journal, lang):
+    values = _get_snapshot('setting_values', journal, lang, _load_setting_values)
+
+    if values is None:
+        return None
+
+    return values.get((setting_group, setting.pk))
+
+
 def get_setting(setting_group, setting_name, journal, create=False, fallback=False):
-    setting = core_models.Setting.objects.get(name=setting_name)
+    setting = _cached_setting(setting_name)
     lang = get_language() if setting.is_translatable else 'en'
 
     return _get_setting(setting_group, setting, journal, lang, create, fallback)
@@ -21,7 +215,12 @@ def get_setting(setting_group, setting_name, journal, create=False, fallback=Fal
 
 def get_requestless_setting(setting_group, setting, journal):
     lang = settings.LANGUAGE_CODE
-    setting = core_models.Setting.objects.get(name=setting)
+    setting = _cached_setting(setting)
+
+    setting_value = _cached_setting_value(setting_group, setting, journal, lang)
+    if setting_value is not None:
+        return setting_value
+
     setting = core_models.SettingValue.objects.language(lang).get(
         setting__group__name=setting_group,
         setting=setting,
@@ -32,6 +231,15 @@ def get_requestless_setting(setting_group, setting, journal):
 
 
 def _get_setting(setting_group, setting, journal, lang, create, fallback):
+    setting_value = _cached_setting_value(setting_group, setting, journal, lang)
+    if setting_value is not None:
+        return setting_value
+
+    if fallback and lang != settings.LANGUAGE_CODE:
+        setting_value = _cached_setting_value(setting_group, setting, journal, settings.LANGUAGE_CODE)
+        if setting_value is not None:
+            return setting_value
+
     try:
         setting = core_models.SettingValue.objects.language(lang).get(
             setting__group__name=setting_group,
@@ -104,10 +312,33 @@ def save_plugin_setting(plugin, setting_name, value, journal):
     return setting_value
 
 
+def _cached_plugin_setting(plugin, setting_name):
+    definitions = _get_snapshot('plugin_settings', None, None, _load_plugin_setting_definitions)
+
+    if definitions is None:
+        return None
+
+    return definitions.get((plugin.pk, setting_name))
+
+
+def _cached_plugin_setting_value(plugin, setting, journal, lang):
+    values = _get_snapshot('plugin_setting_values', journal, lang, _load_plugin_setting_values)
+
+    if values is None:
+        return None
+
+    return values.get((plugin.pk, setting.pk))
+
+
 def get_plugin_setting(plugin, setting_name, journal, create=False, pretty='', fallback='', types='Text'):
-    if not create:
+    setting = _cached_plugin_setting(plugin, setting_name)
+
+    if create and setting is not None and (setting.pretty_name != pretty or setting.types != types):
+        setting = None
+
+    if setting is None and not create:
         setting = models.PluginSetting.objects.get(name=setting_name, plugin=plugin)
-    else:
+    elif setting is None:
         setting, created = models.PluginSetting.objects.get_or_create(name=setting_name,
                                                                       plugin=plugin,
                                                                       pretty_name=pretty,
@@ -122,6 +353,15 @@ def get_plugin_setting(plugin, setting_name, journal, create=False, pretty='', f
 
 
 def _get_plugin_setting(plugin, setting, journal, lang, create, fallback):
+    setting_value = _cached_plugin_setting_value(plugin, setting, journal, lang)
+    if setting_value is not None:
+        return setting_value
+
+    if fallback and lang != settings.LANGUAGE_CODE:
+        setting_value = _cached_plugin_setting_value(plugin, setting, journal, settings.LANGUAGE_CODE)
+        if setting_value is not None:
+            return setting_value
+
     try:
         setting = models.PluginSettingValue.objects.language(lang).get(
             setting__plugin=plugin,
@@ -150,7 +390,7 @@ def _get_plugin_setting(plugin, setting, journal, lang, create, fallback):
 
 def get_email_subject_setting(setting_group, setting_name, journal, create=False, fallback=False):
     try:
-        setting = core_models.Setting.objects.get(name=setting_name)
+        setting = _cached_setting(setting_name)
         lang = get_language() if setting.is_translatable else 'en'
 
         return _get_setting(setting_group, setting, journal, lang, create, fallback).value
@@ -4,6 +4,8 @@ __license__ = "AGPL v3"
 __maintainer__ = "Birkbeck Centre for Technology and Publishing"
 
 import random
+import threading
+import time
 
 # NB: this module should not import any others in the application. It is a space for communal functions to avoid
 # circular imports and to thereby maintain Python 3.4 compatibility
@@ -30,3 +32,29 @@ def get_ip_address(request):
     else:
         ip = request.META.get('REMOTE_ADDR')  # Real IP address of client Machine
     return ip
+
+
+class RateLimiter(object):
+    """ Spaces out actions sharing a key, such as a journal or a host, so that no more than `rate` start per second.
+
+    The limit applies within one process only.
+    """
+
+    def __init__(self, rate=None):
+        """
+        :param rate: actions per second per key, or None for no limit
+        """
+        self.interval = 1.0 / rate if rate else 0
+        self.lock = threading.Lock()
+        self.next_slot = {}
+
+    def wait(self, key):
+        if not self.interval:
+            return
+
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(key, now))
+            self.next_slot[key] = slot + self.interval
+
+        time.sleep(slot - now)
@@ -0,0 +1,191 @@
+__copyright__ = "Copyright 2017 Birkbeck, University of London"
+__author__ = "Martin Paul Eve & Andy Byers"
+__license__ = "AGPL v3"
+__maintainer__ = "Birkbeck Centre for Technology and Publishing"
+
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+
+from django.test import SimpleTestCase, TestCase
+
+from utils import backup, models
+
+
+class IncrementalBackupTests(SimpleTestCase):
+
+    def setUp(self):
+        self.base_dir = tempfile.mkdtemp()
+        self.store_dir = tempfile.mkdtemp()
+        self.store = backup.DirectoryStore(self.store_dir)
+
+        self.write('files/articles/1/galley.pdf', b'a galley')
+        self.write('media/cover.png', b'a cover')
+        self.write('files/temp/scratch', b'not backed up')
+        self.write('files/search/articles.sqlite3', b'a search index')
+        self.write('files/sitemaps/1/sitemap.xml', b'a sitemap')
+        self.write('files/articles/1/rendered/galley-abc.html', b'a rendered galley')
+
+    def tearDown(self):
+        shutil.rmtree(self.base_dir)
+        shutil.rmtree(self.store_dir)
+
+    def write(self, path, contents, mtime=None):
+        path = os.path.join(self.base_dir, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with open(path, 'wb') as f:
+            f.write(contents)
+
+        if mtime:
+            os.utime(path, (mtime, mtime))
+
+    def archived(self, name):
+        with tarfile.open(os.path.join(self.store_dir, 'backups', name, backup.FILES_ARCHIVE)) as tar:
+            return sorted(tar.getnames())
+
+    def test_only_changed_content_is_archived(self):
+        backup.run_backup(self.store, '20170101000000', base_dir=self.base_dir, database=False)
+        self.assertEqual(self.archived('20170101000000'), ['files/articles/1/galley.pdf', 'media/cover.png'])
+
+        # a touched file with the same content and a copy of an archived file are not stored again
+        self.write('media/cover.png', b'a cover', mtime=1)
+        self.write('files/articles/2/galley.pdf', b'a galley')
+        self.write('files/articles/1/galley.pdf', b'a corrected galley')
+        manifest = backup.run_backup(self.store, '20170102000000', base_dir=self.base_dir, database=False)
+
+        self.assertEqual(self.archived('20170102000000'), ['files/articles/1/galley.pdf'])
+        self.assertEqual(manifest['files']['files/articles/2/galley.pdf']['archive'], '20170101000000')
+        self.assertNotIn('files/temp/scratch', manifest['files'])
+
+    def test_derived_data_is_not_backed_up(self):
+        self.assertEqual(sorted(backup.scan_files(self.base_dir)), ['files/articles/1/galley.pdf', 'media/cover.png'])
+
+    def test_restore_reads_files_from_earlier_archives(self):
+        backup.run_backup(self.store, '20170101000000', base_dir=self.base_dir, database=False)
+        self.write('files/articles/1/galley.pdf', b'a corrected galley')
+        backup.run_backup(self.store, '20170102000000', base_dir=self.base_dir, database=False)
+
+        target = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, target)
+        name, manifest = backup.latest_manifest(self.store)
+
+        self.assertEqual(name, '20170102000000')
+        self.assertEqual(backup.restore_files(self.store, manifest, target), 2)
+
+        with open(os.path.join(target, 'files', 'articles', '1', 'galley.pdf'), 'rb') as f:
+            self.assertEqual(f.read(), b'a corrected galley')
+
+        with open(os.path.join(target, 'media', 'cover.png'), 'rb') as f:
+            self.assertEqual(f.read(), b'a cover')
+
+        # files that are already in place are skipped
+        self.assertEqual(backup.restore_files(self.store, manifest, target), 0)
+
+
+class FakeUpload(object):
+    """ Records the parts of a multipart upload in place of a boto MultiPartUpload. """
+
+    def __init__(self):
+        self.parts = []
+        self.completed = False
+        self.cancelled = False
+
+    def upload_part_from_file(self, fp, part_num):
+        self.parts.append((part_num, fp.read()))
+
+    def complete_upload(self):
+        self.completed = True
+
+    def cancel_upload(self):
+        self.cancelled = True
+
+
+class FakeBucket(object):
+
+    def __init__(self):
+        self.uploads = {}
+
+    def initiate_multipart_upload(self, name):
+        self.uploads[name] = FakeUpload()
+        return self.uploads[name]
+
+
+class MultipartUploadTests(SimpleTestCase):
+
+    def store(self, part_size):
+        # the bucket is swapped for a stand-in, so no connection is made
+        store = backup.S3Store.__new__(backup.S3Store)
+        store.bucket = FakeBucket()
+        store.part_size = part_size
+        return store
+
+    def test_writes_are_uploaded_in_parts(self):
+        upload = FakeUpload()
+        writer = backup.MultipartWriter(upload, part_size=4)
+
+        for data in [b'ab', b'cdef', b'gh', b'i']:
+            writer.write(data)
+
+        writer.complete()
+
+        self.assertEqual(upload.parts, [(1, b'abcdef'), (2, b'ghi')])
+        self.assertTrue(upload.completed)
+
+    def test_an_empty_object_is_uploaded_as_one_part(self):
+        upload = FakeUpload()
+        backup.MultipartWriter(upload, part_size=4).complete()
+
+        self.assertEqual(upload.parts, [(1, b'')])
+
+    def test_streamed_archive_is_uploaded_whole(self):
+        store = self.store(part_size=16)
+
+        with store.writer('backups/test/files.tar.gz') as writer, tarfile.open(fileobj=writer, mode='w|gz') as tar:
+            info = tarfile.TarInfo('files/galley.pdf')
+            contents = os.urandom(100)
+            info.size = len(contents)
+            tar.addfile(info, io.BytesIO(contents))
+
+        upload = store.bucket.uploads['backups/test/files.tar.gz']
+        self.assertTrue(upload.completed)
+        self.assertEqual([number for number, _ in upload.parts], list(range(1, len(upload.parts) + 1)))
+
+        with tarfile.open(fileobj=io.BytesIO(b''.join(part for _, part in upload.parts)), mode='r:gz') as tar:
+            self.assertEqual(tar.extractfile('files/galley.pdf').read(), contents)
+
+    def test_upload_is_cancelled_if_writing_fails(self):
+        store = self.store(part_size=4)
+
+        with self.assertRaises(ValueError):
+            with store.writer('backups/test/database.jsonl.gz') as writer:
+                writer.write(b'some data')
+                raise ValueError()
+
+        upload = store.bucket.uploads['backups/test/database.jsonl.gz']
+        self.assertTrue(upload.cancelled)
+        self.assertFalse(upload.completed)
+
+
+class DatabaseBackupTests(TestCase):
+
+    def setUp(self):
+        self.store_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.store_dir)
+        self.store = backup.DirectoryStore(self.store_dir)
+
+    def test_database_export_round_trip(self):
+        plugins = [models.Plugin.objects.create(name='plugin_{0}'.format(index), version='1.0') for index in range(5)]
+        exported = backup.backup_database(self.store, '20170101000000', chunk_size=2)
+
+        models.Plugin.objects.filter(pk__in=[plugin.pk for plugin in plugins[:3]]).delete()
+        models.Plugin.objects.filter(pk=plugins[3].pk).update(version='2.0')
+
+        self.assertEqual(backup.restore_database(self.store, '20170101000000'), exported)
+        self.assertEqual(list(models.Plugin.objects.filter(name__startswith='plugin_').order_by('pk').values_list(
+            'pk', 'name', 'version')), [(plugin.pk, plugin.name, '1.0') for plugin in plugins])
+
+        # restored primary keys are not handed out again
+        self.assertGreater(models.Plugin.objects.create(name='new_plugin', version='1.0').pk, plugins[-1].pk)
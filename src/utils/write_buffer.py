@@ -0,0 +1,165 @@
+__copyright__ = "Copyright 2017 Birkbeck, University of London"
+__author__ = "Martin Paul Eve & Andy Byers"
+__license__ = "AGPL v3"
+__maintainer__ = "Birkbeck Centre for Technology and Publishing"
+
+import os
+import threading
+
+from django.db import connection, transaction
+
+
+def write_objects(model, objects, max_attempts=3, describe=str):
+    """ Writes unsaved objects with bulk_create, or one at a time if the batch cannot be written, eg. because a row
+    they point to was deleted before the write.
+
+    Objects that still fail have their flush_attempts counted and are returned to be tried again, unless they have
+    failed max_attempts times, in which case they are dropped.
+
+    :param model: the model class of the objects
+    :param objects: a list of unsaved model instances
+    :param max_attempts: the number of failed writes after which an object is dropped
+    :param describe: a callable describing an object for the message printed when it is dropped
+    :return: a tuple of the number of objects written and a list of those to retry
+    """
+    try:
+        with transaction.atomic():
+            model.objects.bulk_create(objects, batch_size=500)
+        return len(objects), []
+    except Exception:
+        pass
+
+    written = 0
+    failed = []
+
+    for obj in objects:
+        try:
+            with transaction.atomic():
+                obj.save()
+            written += 1
+        except Exception as e:
+            obj.flush_attempts = getattr(obj, 'flush_attempts', 0) + 1
+
+            if obj.flush_attempts >= max_attempts:
+                print('Dropping {0} after {1} failed writes: {2}'.format(describe(obj), obj.flush_attempts, e))
+            else:
+                failed.append(obj)
+
+    return written, failed
+
+
+class WriteBuffer(object):
+    """ Holds unsaved model instances in memory and writes them in batches with write_objects.
+
+    Where flush_interval is set each process flushes from its own background thread, otherwise flushes happen when the
+    buffer is full and whenever flush is called. Subclasses give the model, and may override _take_pending and
+    _write_pending to change what a flush writes.
+    """
+    name = 'buffered objects'
+    thread_name = 'write-buffer'
+
+    def __init__(self, flush_size=200, flush_interval=5, max_attempts=3):
+        """
+        :param flush_size: the number of buffered objects that triggers a flush
+        :param flush_interval: seconds between timed flushes, or None to flush only on size and when flush is called
+        :param max_attempts: the number of failed writes after which an object is dropped
+        """
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+
+        self.lock = threading.RLock()
+        self.flush_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.pending = []
+        self.pid = None
+        self.thread = None
+
+    def get_model(self):
+        raise NotImplementedError
+
+    def describe(self, obj):
+        return str(obj)
+
+    def add(self, obj):
+        """ Buffers an unsaved model instance.
+
+        :param obj: a model instance
+        :return: the instance
+        """
+        with self.lock:
+            self._check_process()
+            self.pending.append(obj)
+            buffered = len(self.pending)
+
+        self._flush_when_full(buffered)
+
+        return obj
+
+    def flush(self):
+        """ Writes all buffered objects. Objects that fail are kept for the next flush until they have failed
+        max_attempts times, so a single bad object can neither block the others nor make the buffer grow forever.
+
+        :return: the number of objects written
+        """
+        with self.flush_lock:
+            with self.lock:
+                pending = self._take_pending()
+
+            return self._write_pending(pending)
+
+    def _take_pending(self):
+        pending, self.pending = self.pending, []
+        return pending
+
+    def _write_pending(self, pending):
+        if not pending:
+            return 0
+
+        written, failed = write_objects(self.get_model(), pending, self.max_attempts, self.describe)
+
+        with self.lock:
+            self.pending = failed + self.pending
+
+        return written
+
+    def _flush_when_full(self, buffered):
+        if buffered < self.flush_size:
+            return
+
+        if self.thread:
+            self.wakeup.set()
+            return
+
+        try:
+            self.flush()
+        except Exception as e:
+            # the objects are kept for the next flush rather than failing the caller
+            print('Error flushing {0}: {1}'.format(self.name, e))
+
+    def _reset_process(self):
+        self.pending = []
+
+    def _check_process(self):
+        # The flush thread does not survive a fork, so start one in each worker process.
+        if self.pid == os.getpid():
+            return
+
+        self.pid = os.getpid()
+        self._reset_process()
+
+        if self.flush_interval:
+            self.thread = threading.Thread(target=self._run, name=self.thread_name, daemon=True)
+            self.thread.start()
+
+    def _run(self):
+        while True:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+
+            try:
+                self.flush()
+            except Exception as e:
+                print('Error flushing {0}: {1}'.format(self.name, e))
+            finally:
+                connection.close()